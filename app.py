@@ -3,11 +3,35 @@
 # 支援 Render PostgreSQL 資料庫
 # ==========================================================
 
-from flask import Flask, request, jsonify, session, render_template, redirect
+from flask import Flask, request, jsonify, session, render_template, redirect, url_for, send_file, abort
+import click
+import functools
 import os
+import itertools
+import json
+import mimetypes
+import secrets
+import threading
+import time
 from datetime import datetime
 from werkzeug.utils import secure_filename
-import pandas as pd
+import archive
+import assets
+import catalog
+import course_import
+import course_ops
+import exports
+from catalog import DEGREE_CODES, CATEGORY_KEYWORDS
+import migrations
+import parse_cache
+import passwords
+import provisioning
+import ratelimit
+import seats
+import session_store
+
+# pandas / xlrd / openpyxl 只在匯入 Excel 時才載入 (見 load_pandas)，
+# 避免每個 gunicorn worker 啟動時都要付出載入成本
 
 # 判斷是否使用 PostgreSQL
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -20,15 +44,64 @@ if DATABASE_URL:
     # Render 的 DATABASE_URL 格式可能需要調整
     if DATABASE_URL.startswith('postgres://'):
         DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+    # 唯讀副本 (選用)，多個以逗號分隔
+    REPLICA_URLS = [
+        url.strip().replace('postgres://', 'postgresql://', 1)
+        for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+    ]
 else:
     # 本地 SQLite
     import sqlite3
     USE_POSTGRES = False
     DATABASE = 'database.db'
+    REPLICA_URLS = []
+
+# 副本複寫延遲超過此秒數就改用主資料庫
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+# 副本健康狀態快取秒數 (避免每個請求都查詢延遲)
+REPLICA_CHECK_INTERVAL = 2
+# 使用者寫入後此秒數內的讀取都走主資料庫 (read-your-writes)
+READ_YOUR_WRITES_SECONDS = 10
+
+# 課程搜尋引擎: sql (預設) 或 columnar (記憶體欄式索引，見 catalog.py)
+CATALOG_ENGINE = os.environ.get('CATALOG_ENGINE', 'sql')
+# 相關度排序 (sort=relevance) 預設與最多回傳筆數
+RANKED_SEARCH_LIMIT = 100
+RANKED_SEARCH_MAX_LIMIT = 500
+
+# 使用者列表分頁
+USER_PAGE_SIZE = 50
+USER_PAGE_MAX_SIZE = 200
+USER_SORT_COLUMNS = {'username', 'student_id', 'name', 'department', 'class_name', 'created_at'}
+
+# 批次建立帳號: 名單超過此列數 (或指定 background) 時在背景執行
+USER_IMPORT_SYNC_ROWS = int(os.environ.get('USER_IMPORT_SYNC_ROWS', 1000))
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'ntunhs_course_system_2024_secret_key')
 
+# 位於反向代理 (Render、nginx) 後方時，依 X-Forwarded-For 取得用戶端 IP (流量限制用)
+# 部署設定 gunicorn.conf.py 預設為 1 層；直接對外服務時請設定 PROXY_HOPS=0 (否則 IP 可偽造)
+PROXY_HOPS = int(os.environ.get('PROXY_HOPS', 0))
+if PROXY_HOPS:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+# 伺服器端 session 與個人檔案快取 (見 session_store.py)，所有 worker 共用
+session_backend = session_store.create_store()
+app.session_interface = session_store.ServerSideSessionInterface(session_backend)
+profile_cache = session_store.ProfileCache(session_backend)
+import_jobs = provisioning.ImportJobs(session_backend)
+
+# 靜態資源打包 (精簡、內容雜湊檔名、預先壓縮，見 assets.py)
+asset_manifest = assets.AssetManifest(app.static_folder)
+
+# 流量限制與負載保護 (見 ratelimit.py)；權杖桶與 session 使用同一個儲存後端，RATE_LIMIT_ENABLED=0 時停用
+db_admission = ratelimit.create_admission()
+rate_limiter = ratelimit.RateLimiter(
+    ratelimit.create_buckets(), db_admission, enabled=os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+)
+
 # 檔案上傳設定
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
@@ -42,19 +115,102 @@ if not os.path.exists(UPLOAD_FOLDER):
 # ========================================
 # 資料庫連接函數
 # ========================================
-def get_db():
-    """取得資料庫連接"""
+def get_db(archive_views=False):
+    """
+    取得資料庫連接
+    archive_views: SQLite 連線需要查詢 courses_archive / courses_all 時 ATTACH 封存學期 (見 archive.py)
+    """
     if USE_POSTGRES:
         conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
         return conn
     else:
         conn = sqlite3.connect(DATABASE)
         conn.row_factory = sqlite3.Row
+        if archive_views:
+            archive.attach_archives(conn, archived_semesters())
         return conn
 
-def execute_query(query, params=None, fetch=False, fetchone=False):
-    """執行查詢的通用函數"""
-    conn = get_db()
+# ========================================
+# 唯讀副本路由
+# ========================================
+_replica_cycle = itertools.cycle(range(len(REPLICA_URLS)))
+_replica_status = {}  # 副本索引 -> (檢查時間, 是否可用)
+_replica_lock = threading.Lock()
+
+def _replica_usable(index, conn):
+    """檢查副本複寫延遲 (結果快取 REPLICA_CHECK_INTERVAL 秒)"""
+    status = _replica_status.get(index)
+    if status and time.monotonic() - status[0] < REPLICA_CHECK_INTERVAL:
+        return status[1]
+    
+    cursor = conn.cursor()
+    # WAL 已全部重播時延遲為 0，否則以最後重播的交易時間估算
+    cursor.execute('''
+        SELECT CASE
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag
+    ''')
+    lag = float(cursor.fetchone()['lag'])
+    cursor.close()
+    
+    usable = lag <= REPLICA_MAX_LAG
+    if not usable:
+        print(f"[replica] 副本 {index} 延遲 {lag:.1f} 秒，改用主資料庫")
+    _replica_status[index] = (time.monotonic(), usable)
+    return usable
+
+def get_read_db():
+    """取得唯讀連接 - 輪流使用副本，副本延遲過大或無法連線時改用主資料庫"""
+    if not REPLICA_URLS:
+        return get_db()
+    
+    for _ in range(len(REPLICA_URLS)):
+        with _replica_lock:
+            index = next(_replica_cycle)
+        
+        # 最近檢查過不可用的副本直接跳過
+        status = _replica_status.get(index)
+        if status and not status[1] and time.monotonic() - status[0] < REPLICA_CHECK_INTERVAL:
+            continue
+        
+        try:
+            conn = psycopg2.connect(REPLICA_URLS[index], cursor_factory=RealDictCursor, connect_timeout=2)
+        except psycopg2.Error as e:
+            print(f"[replica] 副本 {index} 連線失敗: {e}")
+            _replica_status[index] = (time.monotonic(), False)
+            continue
+        
+        try:
+            if _replica_usable(index, conn):
+                return conn
+        except psycopg2.Error as e:
+            print(f"[replica] 副本 {index} 延遲檢查失敗: {e}")
+            _replica_status[index] = (time.monotonic(), False)
+        conn.close()
+    
+    return get_db()
+
+def mark_write():
+    """記錄目前使用者剛寫入資料，之後短時間內的讀取改走主資料庫"""
+    session['last_write'] = time.time()
+
+def use_replica():
+    """目前請求是否可以讀副本 (使用者剛寫入過則讀主資料庫)"""
+    return time.time() - session.get('last_write', 0) > READ_YOUR_WRITES_SECONDS
+
+def execute_query(query, params=None, fetch=False, fetchone=False, readonly=False, archive_views=False):
+    """
+    執行查詢的通用函數
+    readonly=True 時可能送到唯讀副本 (見 get_read_db)
+    archive_views=True: 查詢使用 courses_archive / courses_all (見 course_source)
+    耗時 (含取得連線) 記錄到 db_admission，資料庫變慢時開始捨棄瀏覽請求
+    """
+    started = time.perf_counter()
+    if archive_views and not USE_POSTGRES:
+        conn = get_db(archive_views=True)
+    else:
+        conn = get_read_db() if readonly else get_db()
     if USE_POSTGRES:
         cursor = conn.cursor()
         # PostgreSQL 使用 %s 而不是 ?
@@ -69,6 +225,7 @@ def execute_query(query, params=None, fetch=False, fetchone=False):
         conn.commit()
         cursor.close()
         conn.close()
+        db_admission.record(time.perf_counter() - started)
         return result
     else:
         cursor = conn.cursor()
@@ -82,184 +239,78 @@ def execute_query(query, params=None, fetch=False, fetchone=False):
             result = cursor.lastrowid
         conn.commit()
         conn.close()
+        db_admission.record(time.perf_counter() - started)
         return result
 
+def stream_query(query, params=None, readonly=False, archive_views=False, batch_size=1000):
+    """
+    逐批讀取查詢結果，回傳產生 dict 的產生器 (匯出大量資料用，記憶體用量固定)
+    PostgreSQL 使用伺服器端 (named) cursor，SQLite cursor 本身就是逐列讀取
+    查詢與第一批讀取在呼叫時執行: SQL 錯誤在回應開始送出前拋出 (回傳 500，而不是截斷的檔案)
+    """
+    if archive_views and not USE_POSTGRES:
+        conn = get_db(archive_views=True)
+    else:
+        conn = get_read_db() if readonly else get_db()
+    try:
+        if USE_POSTGRES:
+            cursor = conn.cursor(name=f'export_{secrets.token_hex(8)}')
+            cursor.itersize = batch_size
+            cursor.execute(query.replace('?', '%s'), params or ())
+        else:
+            cursor = conn.cursor()
+            cursor.execute(query, params or ())
+        rows = cursor.fetchmany(batch_size)
+    except Exception:
+        conn.close()
+        raise
+    return _iter_rows(conn, cursor, rows, batch_size)
+
+def _iter_rows(conn, cursor, rows, batch_size):
+    """stream_query 的產生器: 先送出已讀取的第一批，再逐批讀取"""
+    try:
+        while rows:
+            for row in rows:
+                yield dict(row)
+            rows = cursor.fetchmany(batch_size)
+        cursor.close()
+    finally:
+        conn.close()
+
+def seed_default_users(conn):
+    """資料庫沒有任何使用者時插入預設帳號，回傳插入筆數"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) as count FROM users')
+    user_count = cursor.fetchone()
+    user_count = user_count['count'] if isinstance(user_count, dict) else user_count[0]
+    
+    if user_count > 0:
+        cursor.close()
+        return 0
+    
+    cursor.execute('''
+        INSERT INTO users (username, password, role, name, student_id, department, avatar)
+        VALUES 
+            ('student1', 'pass123', 'student', '測試學生', 'S001', '護理系', '🐱'),
+            ('admin', 'admin123', 'admin', '系統管理員', 'A001', '資訊中心', '👨‍💼')
+    ''')
+    conn.commit()
+    cursor.close()
+    return 2
+
 def init_db():
-    """初始化資料庫 - 創建表格和添加新欄位"""
-    print("[init_db] 開始初始化資料庫...")
+    """初始化資料庫 - 套用尚未執行的 schema 版本 (見 migrations.py) 並建立預設使用者"""
+    print(f"[init_db] 開始初始化資料庫 ({'PostgreSQL' if USE_POSTGRES else 'SQLite'})...")
     
     try:
         conn = get_db()
-        cursor = conn.cursor()
+        migrations.migrate(conn, USE_POSTGRES, log=lambda msg: print(f"[init_db] {msg}"))
+        if not USE_POSTGRES:
+            archive.consolidate_sqlite(conn, log=lambda msg: print(f"[init_db] {msg}"))
         
-        if USE_POSTGRES:
-            print("[init_db] 使用 PostgreSQL 模式")
-            
-            # PostgreSQL 創建表格
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    role TEXT NOT NULL DEFAULT 'student',
-                    name TEXT DEFAULT '',
-                    student_id TEXT DEFAULT '',
-                    department TEXT DEFAULT '',
-                    class_name TEXT DEFAULT '',
-                    phone TEXT DEFAULT '',
-                    email TEXT DEFAULT '',
-                    avatar TEXT DEFAULT '🐱',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            print("[init_db] users 表創建/檢查完成")
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS courses (
-                    id SERIAL PRIMARY KEY,
-                    semester TEXT NOT NULL,
-                    department TEXT NOT NULL,
-                    grade TEXT,
-                    course_code TEXT NOT NULL,
-                    course_name TEXT NOT NULL,
-                    course_name_en TEXT,
-                    instructor TEXT,
-                    credits REAL,
-                    course_type TEXT,
-                    classroom TEXT,
-                    day_time TEXT,
-                    weekday TEXT,
-                    period TEXT,
-                    capacity INTEGER DEFAULT 60,
-                    enrolled INTEGER DEFAULT 0,
-                    class_group TEXT,
-                    remarks TEXT,
-                    course_summary TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            print("[init_db] courses 表創建/檢查完成")
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS enrollments (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
-                    status TEXT DEFAULT 'enrolled',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            print("[init_db] enrollments 表創建/檢查完成")
-            
-            # 創建索引
-            try:
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_semester ON courses(semester)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_department ON courses(department)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_user ON enrollments(user_id)')
-                conn.commit()
-                print("[init_db] 索引創建完成")
-            except Exception as e:
-                print(f"[init_db] 創建索引時發生錯誤（可能已存在）: {e}")
-                conn.rollback()
-            
-            # 嘗試添加 avatar 欄位（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar TEXT DEFAULT '🐱'")
-                conn.commit()
-            except Exception as e:
-                print(f"[init_db] avatar 欄位可能已存在: {e}")
-                conn.rollback()
-            
-            # 檢查是否需要插入預設使用者
-            cursor.execute('SELECT COUNT(*) FROM users')
-            user_count = cursor.fetchone()
-            if USE_POSTGRES:
-                user_count = user_count['count'] if isinstance(user_count, dict) else user_count[0]
-            else:
-                user_count = user_count[0] if user_count else 0
-            
-            if user_count == 0:
-                print("[init_db] 插入預設使用者...")
-                cursor.execute('''
-                    INSERT INTO users (username, password, role, name, student_id, department, avatar)
-                    VALUES 
-                        ('student1', 'pass123', 'student', '測試學生', 'S001', '護理系', '🐱'),
-                        ('admin', 'admin123', 'admin', '系統管理員', 'A001', '資訊中心', '👨‍💼')
-                ''')
-                conn.commit()
-                print("[init_db] 預設使用者插入完成")
-                
-        else:
-            print("[init_db] 使用 SQLite 模式")
-            # SQLite
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    role TEXT NOT NULL DEFAULT 'student',
-                    name TEXT DEFAULT '',
-                    student_id TEXT DEFAULT '',
-                    department TEXT DEFAULT '',
-                    class_name TEXT DEFAULT '',
-                    phone TEXT DEFAULT '',
-                    email TEXT DEFAULT '',
-                    avatar TEXT DEFAULT '🐱',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS courses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    semester TEXT NOT NULL,
-                    department TEXT NOT NULL,
-                    grade TEXT,
-                    course_code TEXT NOT NULL,
-                    course_name TEXT NOT NULL,
-                    course_name_en TEXT,
-                    instructor TEXT,
-                    credits REAL,
-                    course_type TEXT,
-                    classroom TEXT,
-                    day_time TEXT,
-                    weekday TEXT,
-                    period TEXT,
-                    capacity INTEGER DEFAULT 60,
-                    enrolled INTEGER DEFAULT 0,
-                    class_group TEXT,
-                    remarks TEXT,
-                    course_summary TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS enrollments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    course_id INTEGER NOT NULL,
-                    status TEXT DEFAULT 'enrolled',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (course_id) REFERENCES courses(id)
-                )
-            ''')
-            
-            # 嘗試添加新欄位（SQLite 不支援 IF NOT EXISTS）
-            columns_to_add = ['name', 'student_id', 'department', 'class_name', 'phone', 'email', 'avatar']
-            for col in columns_to_add:
-                try:
-                    default_val = "'🐱'" if col == 'avatar' else "''"
-                    cursor.execute(f"ALTER TABLE users ADD COLUMN {col} TEXT DEFAULT {default_val}")
-                except: 
-                    pass
+        if seed_default_users(conn):
+            print("[init_db] 預設使用者插入完成")
         
-        conn.commit()
-        cursor.close()
         conn.close()
         print("[init_db] 資料庫初始化完成!")
         
@@ -268,9 +319,70 @@ def init_db():
         import traceback
         traceback.print_exc()
 
-# 初始化資料庫
-print("[APP] 應用程式啟動，開始初始化資料庫...")
-init_db()
+# ========================================
+# 資料庫初始化 (啟動時只執行一次，不在 import 時執行)
+# - gunicorn: gunicorn.conf.py 的 on_starting 在 master 中執行一次
+# - 手動: flask --app app init-db
+# - 本地開發: python app.py
+# ========================================
+@app.cli.command('init-db')
+def init_db_command():
+    """建立資料表 (flask --app app init-db)"""
+    init_db()
+
+# ========================================
+# 延遲載入 pandas (只有匯入端點需要)
+# ========================================
+_pd = None
+
+def load_pandas():
+    """第一次使用時才載入 pandas (連同 xlrd/openpyxl 引擎)"""
+    global _pd
+    if _pd is None:
+        print("[APP] 載入 pandas...")
+        import pandas
+        _pd = pandas
+    return _pd
+
+# ========================================
+# 靜態資源 (雜湊檔名，長期快取)
+# ========================================
+@app.context_processor
+def inject_asset_url():
+    """模板中以 asset_url('css/admin.css') 取得打包後的網址"""
+    def asset_url(filename):
+        try:
+            hashed = asset_manifest.lookup(filename)
+        except OSError as e:  # static/dist 無法寫入時使用原始檔案
+            print(f"[assets] 無法打包 {filename}: {e}")
+            hashed = None
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('serve_asset', filename=hashed)
+    return {'asset_url': asset_url}
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """回傳打包後的檔案 (依 Accept-Encoding 選擇預先壓縮的版本)"""
+    resolved = asset_manifest.resolve(filename, request.headers.get('Accept-Encoding', ''))
+    if resolved is None:
+        abort(404)
+    path, encoding = resolved
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True)
+    response.headers.pop('Content-Disposition', None)
+    response.headers['Cache-Control'] = assets.CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.cli.command('build-assets')
+@click.option('--force', is_flag=True, help='重新打包所有檔案')
+def build_assets_command(force):
+    """預先打包靜態資源 (flask --app app build-assets)"""
+    entries = asset_manifest.build(force=force)
+    for filename, entry in sorted(entries.items()):
+        print(f"{filename:<20} -> {entry['path']:<32} {entry['source_bytes']:>7} -> {entry['bytes']:>7} bytes")
 
 # ========================================
 # 路由: 首頁 (登入頁面)
@@ -295,7 +407,7 @@ def student_page():
         return redirect('/')
     if session.get('role') != 'student':
         return redirect('/admin')
-    return render_template('student.html')
+    return render_template('student.html', seat_stream=app.config['SEAT_STREAM'])
 
 # ========================================
 # 路由: 訪客頁面
@@ -319,110 +431,26 @@ def init_database_api():
     
     try:
         conn = get_db()
-        cursor = conn.cursor()
+        results.append("✅ PostgreSQL 連接成功" if USE_POSTGRES else "ℹ️ 使用 SQLite 模式（本地開發）")
         
-        if USE_POSTGRES:
-            results.append("✅ PostgreSQL 連接成功")
-            
-            # 創建 users 表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    role TEXT NOT NULL DEFAULT 'student',
-                    name TEXT DEFAULT '',
-                    student_id TEXT DEFAULT '',
-                    department TEXT DEFAULT '',
-                    class_name TEXT DEFAULT '',
-                    phone TEXT DEFAULT '',
-                    email TEXT DEFAULT '',
-                    avatar TEXT DEFAULT '🐱',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            results.append("✅ users 表創建成功")
-            
-            # 創建 courses 表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS courses (
-                    id SERIAL PRIMARY KEY,
-                    semester TEXT NOT NULL,
-                    department TEXT NOT NULL,
-                    grade TEXT,
-                    course_code TEXT NOT NULL,
-                    course_name TEXT NOT NULL,
-                    course_name_en TEXT,
-                    instructor TEXT,
-                    credits REAL,
-                    course_type TEXT,
-                    classroom TEXT,
-                    day_time TEXT,
-                    weekday TEXT,
-                    period TEXT,
-                    capacity INTEGER DEFAULT 60,
-                    enrolled INTEGER DEFAULT 0,
-                    class_group TEXT,
-                    remarks TEXT,
-                    course_summary TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            results.append("✅ courses 表創建成功")
-            
-            # 創建 enrollments 表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS enrollments (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
-                    status TEXT DEFAULT 'enrolled',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            results.append("✅ enrollments 表創建成功")
-            
-            # 創建索引
-            try:
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_semester ON courses(semester)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_department ON courses(department)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_user ON enrollments(user_id)')
-                conn.commit()
-                results.append("✅ 索引創建成功")
-            except Exception as e:
-                results.append(f"⚠️ 索引可能已存在: {str(e)}")
-                conn.rollback()
-            
-            # 檢查並插入預設使用者
-            cursor.execute('SELECT COUNT(*) as count FROM users')
-            user_count = cursor.fetchone()
-            count = user_count['count'] if isinstance(user_count, dict) else user_count[0]
-            
-            if count == 0:
-                cursor.execute('''
-                    INSERT INTO users (username, password, role, name, student_id, department, avatar)
-                    VALUES 
-                        ('student1', 'pass123', 'student', '測試學生', 'S001', '護理系', '🐱'),
-                        ('admin', 'admin123', 'admin', '系統管理員', 'A001', '資訊中心', '👨‍💼')
-                ''')
-                conn.commit()
-                results.append("✅ 預設使用者創建成功 (student1/pass123, admin/admin123)")
-            else:
-                results.append(f"ℹ️ 已有 {count} 個使用者，跳過創建預設使用者")
-            
-            # 統計資料
-            cursor.execute('SELECT COUNT(*) as count FROM courses')
-            course_count = cursor.fetchone()
-            course_count = course_count['count'] if isinstance(course_count, dict) else course_count[0]
-            results.append(f"📊 目前課程數量: {course_count}")
-            
+        # 套用資料庫版本遷移
+        applied = migrations.migrate(conn, USE_POSTGRES, log=results.append)
+        version = migrations.current_version(conn)
+        if applied:
+            results.append(f"✅ 已套用 {len(applied)} 個版本，目前版本: {version}")
+        
+        # 檢查並插入預設使用者
+        if seed_default_users(conn):
+            results.append("✅ 預設使用者創建成功 (student1/pass123, admin/admin123)")
         else:
-            results.append("ℹ️ 使用 SQLite 模式（本地開發）")
-            init_db()
-            results.append("✅ SQLite 資料庫初始化完成")
+            results.append("ℹ️ 已有使用者，跳過創建預設使用者")
+        
+        # 統計資料
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) as count FROM courses')
+        course_count = cursor.fetchone()
+        course_count = course_count['count'] if isinstance(course_count, dict) else course_count[0]
+        results.append(f"📊 目前課程數量: {course_count}")
         
         cursor.close()
         conn.close()
@@ -499,10 +527,113 @@ def admin_page():
         return redirect('/student')
     return render_template('admin.html')
 
+# ========================================
+# 個人檔案快取
+# ========================================
+def build_profile(user):
+    """由 users 資料列建立個人檔案 (不含密碼)"""
+    return {
+        'id': user['id'],
+        'username': user['username'],
+        'role': user['role'],
+        'name': user.get('name') or user['username'],
+        'student_id': user.get('student_id') or user['username'],
+        'department': user.get('department') or '',
+        'class_name': user.get('class_name') or '',
+        'phone': user.get('phone') or '',
+        'email': user.get('email') or '',
+        'avatar': user.get('avatar') or '🐱'
+    }
+
+def load_profile(user_id):
+    """取得個人檔案 - 優先使用快取，沒有才查詢資料庫"""
+    profile = profile_cache.get(user_id)
+    if profile is not None:
+        return profile
+    
+    user = execute_query(
+        'SELECT id, username, role, name, student_id, department, class_name, phone, email, avatar FROM users WHERE id = ?',
+        (user_id,), fetchone=True
+    )
+    if not user:
+        return None
+    
+    profile = build_profile(user)
+    profile_cache.set(user_id, profile)
+    return profile
+
+def current_user():
+    """目前登入的使用者個人檔案 (未登入時回傳 None)"""
+    if 'user_id' not in session:
+        return None
+    return load_profile(session['user_id'])
+
+# ========================================
+# 錯誤處理: 密碼雜湊佇列已滿
+# ========================================
+@app.errorhandler(passwords.HashPoolBusy)
+def hash_pool_busy(e):
+    """密碼雜湊佇列已滿 (大量同時登入)"""
+    return jsonify({'success': False, 'message': '目前登入人數過多，請稍後再試'}), 503
+
+# ========================================
+# 流量限制 (見 ratelimit.py)
+# ========================================
+# 登入類請求 (登入、忘記密碼) 依 IP + 帳號計算: 同一個 IP 後方 (校園 NAT) 的不同帳號各自有額度，
+# 對同一帳號的嘗試次數仍受限制；另外同一個 IP 的所有嘗試合計扣 login_ip 額度 (較大)，
+# 輪流更換帳號也無法無限制嘗試 (每次嘗試都會計算一次雜湊)
+LOGIN_ACCOUNT_FIELDS = ('username', 'student_id', 'user_id')
+
+def client_key(budget=None):
+    """流量限制的用戶端: 登入者依 user id 計算 (同一帳號的多個分頁共用額度)，未登入時依 IP"""
+    user_id = session.get('user_id')
+    if user_id:
+        return f'user:{user_id}'
+    key = f'ip:{request.remote_addr}'
+    if budget == 'login':
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            account = next((data[field] for field in LOGIN_ACCOUNT_FIELDS if data.get(field)), None)
+            if isinstance(account, (str, int)):
+                key += f':{str(account)[:64]}'
+    return key
+
+def rate_limited(budget):
+    """
+    路由裝飾器: 依 ratelimit.BUDGETS[budget] 限制每個用戶端的請求
+    串流回應 (匯出) 在送出完畢後才釋放准入名額
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if budget == 'login' and 'user_id' not in session:
+                rate_limiter.admit('login_ip', client_key())
+            admission = rate_limiter.admit(budget, client_key(budget))
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                admission.release()
+                raise
+            if response.is_streamed:
+                response.call_on_close(admission.release)
+            else:
+                admission.release()
+            return response
+        return wrapper
+    return decorator
+
+@app.errorhandler(ratelimit.RateLimited)
+def rate_limit_exceeded(e):
+    """超過流量限制或系統忙碌"""
+    response = jsonify({'success': False, 'message': e.message})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
 # ========================================
 # API: 登入
 # ========================================
 @app.route('/api/login', methods=['POST'])
+@rate_limited('login')
 def login():
     """使用者登入"""
     data = request.json
@@ -513,11 +644,27 @@ def login():
         return jsonify({'success': False, 'message': '請輸入帳號和密碼'})
     
     user = execute_query(
-        'SELECT * FROM users WHERE username = ? AND password = ?',
-        (username, password), fetchone=True
+        'SELECT * FROM users WHERE username = ?',
+        (username,), fetchone=True
     )
     
+    # 密碼驗證在雜湊執行緒池執行 (見 passwords.py)
     if user:
+        valid = passwords.verify_password(user['password'], password)
+    else:
+        valid = passwords.verify_missing_user(password)
+    
+    if valid:
+        # 舊的明文密碼或成本不同的雜湊，登入成功時自動轉換
+        if passwords.needs_rehash(user['password']):
+            execute_query(
+                'UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                (passwords.hash_password(password), user['id'], user['password'])
+            )
+        
+        session.clear()
+        session.regenerate()
+        profile_cache.set(user['id'], build_profile(user))
         session['user_id'] = user['id']
         session['username'] = user['username']
         session['role'] = user['role']
@@ -554,27 +701,10 @@ def get_profile():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': '請先登入'})
     
-    user = execute_query(
-        'SELECT id, username, role, name, student_id, department, class_name, phone, email, avatar FROM users WHERE id = ?',
-        (session['user_id'],), fetchone=True
-    )
+    profile = current_user()
     
-    if user:
-        return jsonify({
-            'success': True,
-            'profile': {
-                'id': user['id'],
-                'username': user['username'],
-                'role': user['role'],
-                'name': user.get('name') or user['username'],
-                'student_id': user.get('student_id') or user['username'],
-                'department': user.get('department') or '',
-                'class_name': user.get('class_name') or '',
-                'phone': user.get('phone') or '',
-                'email': user.get('email') or '',
-                'avatar': user.get('avatar') or '🐱'
-            }
-        })
+    if profile:
+        return jsonify({'success': True, 'profile': profile})
     else:
         return jsonify({'success': False, 'message': '找不到使用者'})
 
@@ -603,6 +733,7 @@ def update_profile():
             'UPDATE users SET phone = ?, email = ? WHERE id = ?',
             (phone, email, session['user_id'])
         )
+    profile_cache.invalidate(session['user_id'])
     
     return jsonify({'success': True, 'message': '更新成功'})
 
@@ -631,13 +762,14 @@ def change_password():
         (session['user_id'],), fetchone=True
     )
     
-    if user['password'] != old_password:
+    if not passwords.verify_password(user['password'], old_password):
         return jsonify({'success': False, 'message': '舊密碼錯誤'})
     
     execute_query(
         'UPDATE users SET password = ? WHERE id = ?',
-        (new_password, session['user_id'])
+        (passwords.hash_password(new_password), session['user_id'])
     )
+    profile_cache.invalidate(session['user_id'])
     
     return jsonify({'success': True, 'message': '密碼變更成功'})
 
@@ -645,6 +777,7 @@ def change_password():
 # API: 忘記密碼 - 驗證身份
 # ========================================
 @app.route('/api/forgot-password/verify', methods=['POST'])
+@rate_limited('login')
 def forgot_password_verify():
     """忘記密碼 - 驗證ID/學號和電話"""
     data = request.json
@@ -674,6 +807,7 @@ def forgot_password_verify():
 # API: 忘記密碼 - 重設密碼
 # ========================================
 @app.route('/api/forgot-password/reset', methods=['POST'])
+@rate_limited('login')
 def forgot_password_reset():
     """忘記密碼 - 重設密碼"""
     data = request.json
@@ -689,81 +823,87 @@ def forgot_password_reset():
     
     execute_query(
         'UPDATE users SET password = ? WHERE id = ?',
-        (new_password, user_id)
+        (passwords.hash_password(new_password), user_id)
     )
+    profile_cache.invalidate(user_id)
     
     return jsonify({'success': True, 'message': '密碼重設成功，請重新登入'})
 
 # ========================================
-# API: 取得系所列表
+# 課程查詢條件 (同步與非同步路由共用，見 async_app.py)
 # ========================================
-@app.route('/api/departments', methods=['GET'])
-def get_departments():
-    """取得所有系所"""
-    departments = execute_query(
-        'SELECT DISTINCT department FROM courses WHERE department IS NOT NULL ORDER BY department',
-        fetch=True
-    )
-    
-    dept_list = [d['department'] for d in departments]
-    
-    # 如果資料庫中沒有課程，提供預設系所列表
-    if not dept_list:
-        dept_list = [
-            '護理系',
-            '護理系博士班',
-            '護理系碩士班',
-            '高齡健康照護系',
-            '長期照護系',
-            '健康事業管理系',
-            '資訊管理系',
-            '嬰幼兒保育系',
-            '語言治療與聽力學系',
-            '語言治療與聽力學系碩士班',
-            '運動保健系',
-            '休閒產業與健康促進系',
-            '生死與健康心理諮商系',
-            '人工智慧與健康大數據研究所',
-            '通識教育中心',
-            '體育室',
-            '學士後多元專長',
-            '學士後學位學程'
-        ]
-    
-    return jsonify({'success': True, 'departments': dept_list})
+# 資料庫中沒有課程時提供的預設系所列表
+DEFAULT_DEPARTMENTS = [
+    '護理系',
+    '護理系博士班',
+    '護理系碩士班',
+    '高齡健康照護系',
+    '長期照護系',
+    '健康事業管理系',
+    '資訊管理系',
+    '嬰幼兒保育系',
+    '語言治療與聽力學系',
+    '語言治療與聽力學系碩士班',
+    '運動保健系',
+    '休閒產業與健康促進系',
+    '生死與健康心理諮商系',
+    '人工智慧與健康大數據研究所',
+    '通識教育中心',
+    '體育室',
+    '學士後多元專長',
+    '學士後學位學程'
+]
 
 # ========================================
-# API: 取得學期列表
+# 學期封存 (見 archive.py)
 # ========================================
-@app.route('/api/semesters', methods=['GET'])
-def get_semesters():
-    """取得所有學期"""
-    semesters = execute_query(
-        'SELECT DISTINCT semester FROM courses WHERE semester IS NOT NULL ORDER BY semester DESC',
-        fetch=True
-    )
-    
-    semester_list = [s['semester'] for s in semesters]
-    return jsonify({'success': True, 'semesters': semester_list})
+_archived_cache = (None, {})
 
-# ========================================
-# API: 搜尋課程
-# ========================================
-@app.route('/api/courses', methods=['GET'])
-def search_courses():
-    """搜尋課程"""
-    keyword = request.args.get('keyword', '')
-    semester = request.args.get('semester', '')
-    department = request.args.get('department', '')
-    grade = request.args.get('grade', '')
-    course_type = request.args.get('type', '')
-    weekday = request.args.get('weekday', '')
-    period = request.args.get('period', '')
-    degree = request.args.get('degree', '')
-    category = request.args.get('category', '')
+def archived_semesters():
+    """已封存的學期 {學期: 課程數}，封存/還原時會更新課程目錄版本，以此判斷快取是否過期"""
+    global _archived_cache
+    version = course_catalog.current_version()
+    if _archived_cache[0] != version:
+        conn = get_db()
+        try:
+            _archived_cache = (version, archive.list_archived(conn))
+        finally:
+            conn.close()
+    return _archived_cache[1]
+
+def course_source(semester='', include_archived=False):
+    """
+    課程查詢來源: 目前學期 courses、封存學期 courses_archive、兩者合併 courses_all
+    未指定學期時只查詢目前學期 (include_archived 時包含封存學期)
+    """
+    archived = archived_semesters()
+    if not archived:
+        return 'courses'
+    if semester:
+        return 'courses_archive' if semester in archived else 'courses'
+    return 'courses_all' if include_archived else 'courses'
+
+def course_search_source(args):
+    return course_source(args.get('semester', ''), bool(args.get('include_archived')))
+
+def build_course_search(args, source='courses'):
+    """
+    依搜尋參數 (request.args) 建立課程查詢
+    source: 查詢來源 (見 course_source)
+    回傳 (query, params)，query 使用 ? 作為參數佔位符
+    """
+    keyword = args.get('keyword', '')
+    semester = args.get('semester', '')
+    department = args.get('department', '')
+    grade = args.get('grade', '')
+    course_type = args.get('type', '')
+    weekday = args.get('weekday', '')
+    period = args.get('period', '')
+    degree = args.get('degree', '')
+    category = args.get('category', '')
     
     # 建立查詢
-    query = 'SELECT * FROM courses WHERE 1=1'
+    query = f'SELECT * FROM {source} WHERE 1=1'
     params = []
     
     if keyword:
@@ -789,10 +929,7 @@ def search_courses():
     # 星期篩選
     if weekday:
         weekdays = weekday.split(',')
-        if USE_POSTGRES:
-            weekday_conditions = ' OR '.join(['weekday = %s' for _ in weekdays])
-        else:
-            weekday_conditions = ' OR '.join(['weekday = ?' for _ in weekdays])
+        weekday_conditions = ' OR '.join(['weekday = ?' for _ in weekdays])
         query += f' AND ({weekday_conditions})'
         params.extend(weekdays)
     
@@ -801,66 +938,122 @@ def search_courses():
         periods = period.split(',')
         period_conditions = []
         for p in periods:
-            if USE_POSTGRES:
-                period_conditions.append("(',' || period || ',' LIKE %s)")
-            else:
-                period_conditions.append("(',' || period || ',' LIKE ?)")
+            period_conditions.append("(',' || period || ',' LIKE ?)")
             params.append(f'%,{p},%')
         query += f' AND ({" OR ".join(period_conditions)})'
     
     # 學制篩選
     if degree:
-        degrees = degree.split(',')
         degree_conditions = []
-        for d in degrees:
-            if d == '四技':
-                degree_conditions.append("SUBSTR(course_code, 3, 2) = '14'")
-            elif d == '二技':
-                degree_conditions.append("SUBSTR(course_code, 3, 2) = '12'")
-            elif d == '二技(三年)' or d == '二技(二年)':
-                degree_conditions.append("(SUBSTR(course_code, 3, 2) = '33' OR SUBSTR(course_code, 3, 2) = '23')")
-            elif d == '碩士班':
-                degree_conditions.append("(SUBSTR(course_code, 3, 2) = '16' OR SUBSTR(course_code, 3, 2) = '46' OR SUBSTR(course_code, 3, 2) = '86')")
-            elif d == '博士班':
-                degree_conditions.append("(SUBSTR(course_code, 3, 2) = '17' OR SUBSTR(course_code, 3, 2) = '87')")
-            elif d == '學士後系':
-                degree_conditions.append("SUBSTR(course_code, 3, 2) = '19'")
-            elif d == '學士後多元專長':
-                degree_conditions.append("SUBSTR(course_code, 3, 2) = '15'")
-            elif d == '學士後學位學程':
-                degree_conditions.append("SUBSTR(course_code, 3, 2) = '18'")
+        for d in degree.split(','):
+            codes = DEGREE_CODES.get(d)
+            if codes:
+                degree_conditions.append(' OR '.join([f"SUBSTR(course_code, 3, 2) = '{code}'" for code in codes]))
         if degree_conditions:
             query += f' AND ({" OR ".join(degree_conditions)})'
     
     # 課程內容分類篩選
     if category:
-        categories = category.split(',')
         category_conditions = []
-        for c in categories:
-            if c == '跨校':
-                category_conditions.append("remarks LIKE '%跨校%'")
-            elif c == '跨域課程':
-                category_conditions.append("remarks LIKE '%跨域%'")
-            elif c == '全英語授課':
-                category_conditions.append("(remarks LIKE '%全英語%' OR remarks LIKE '%全英文%')")
-            elif c == 'EMI全英語授課':
-                category_conditions.append("remarks LIKE '%EMI%'")
-            elif c == '同步遠距教學':
-                category_conditions.append("remarks LIKE '%同步遠距%'")
-            elif c == '非同步遠距教學':
-                category_conditions.append("remarks LIKE '%非同步遠距%'")
-            elif c == '混合式遠距教學':
-                category_conditions.append("remarks LIKE '%混合式遠距%'")
-            elif c == '遠距教學課程':
-                category_conditions.append("remarks LIKE '%遠距教學%'")
-            elif c == '遠距輔助課程':
-                category_conditions.append("remarks LIKE '%遠距輔助%'")
+        for c in category.split(','):
+            for keyword in CATEGORY_KEYWORDS.get(c, []):
+                category_conditions.append('remarks LIKE ?')
+                params.append(f'%{keyword}%')
         if category_conditions:
             query += f' AND ({" OR ".join(category_conditions)})'
     
-    query += ' ORDER BY semester DESC, course_code'
+    # 以 id 作為最後排序鍵，讓 SQL 與欄式引擎的結果順序一致
+    query += ' ORDER BY semester DESC, course_code, id'
+    return query, params
+
+def build_enrollment_query(user_id, status='', source='courses'):
+    """建立使用者收藏/預選清單查詢，回傳 (query, params)"""
+    query = f'''
+        SELECT e.id as enrollment_id, e.status, c.* 
+        FROM enrollments e 
+        JOIN {source} c ON e.course_id = c.id 
+        WHERE e.user_id = ?
+    '''
+    params = [user_id]
+    if status:
+        query += ' AND e.status = ?'
+        params.append(status)
+    query += ' ORDER BY c.semester DESC, c.course_code'
+    return query, params
+
+# ========================================
+# 記憶體課程目錄 (見 catalog.py)
+# ========================================
+def load_all_courses():
+    return execute_query('SELECT * FROM courses ORDER BY semester DESC, course_code, id', fetch=True)
+
+course_catalog = catalog.Catalog(
+    load_all_courses, session_backend,
+    ascii_case_insensitive=not USE_POSTGRES,
+    columnar=CATALOG_ENGINE == 'columnar'
+)
+
+def search_course_rows(args):
+    """
+    依設定的搜尋引擎查詢課程 (有關鍵字且 sort=relevance 時依相關度排序)
+    記憶體目錄只包含目前學期，查詢封存學期時一律使用 SQL
+    """
+    source = course_search_source(args)
+    if source != 'courses':
+        query, params = build_course_search(args, source)
+        return execute_query(query, params, fetch=True, readonly=use_replica(), archive_views=True)
+    if args.get('sort') == 'relevance' and args.get('keyword'):
+        try:
+            limit = int(args.get('limit', RANKED_SEARCH_LIMIT))
+        except ValueError:
+            limit = RANKED_SEARCH_LIMIT
+        return course_catalog.ranked(args, max(1, min(limit, RANKED_SEARCH_MAX_LIMIT)))
+    if course_catalog.columnar:
+        return course_catalog.search(args)
+    query, params = build_course_search(args)
+    return execute_query(query, params, fetch=True, readonly=use_replica())
+
+# ========================================
+# API: 取得系所列表
+# ========================================
+@app.route('/api/departments', methods=['GET'])
+def get_departments():
+    """取得所有系所"""
+    departments = execute_query(
+        'SELECT DISTINCT department FROM courses WHERE department IS NOT NULL ORDER BY department',
+        fetch=True, readonly=use_replica()
+    )
+    
+    dept_list = [d['department'] for d in departments]
+    
+    # 如果資料庫中沒有課程，提供預設系所列表
+    if not dept_list:
+        dept_list = DEFAULT_DEPARTMENTS
+    
+    return jsonify({'success': True, 'departments': dept_list})
+
+# ========================================
+# API: 取得學期列表
+# ========================================
+@app.route('/api/semesters', methods=['GET'])
+def get_semesters():
+    """取得所有學期 (含封存學期)"""
+    semesters = execute_query(
+        'SELECT DISTINCT semester FROM courses WHERE semester IS NOT NULL ORDER BY semester DESC',
+        fetch=True, readonly=use_replica()
+    )
     
-    courses = execute_query(query, params, fetch=True)
+    semester_list = sorted({s['semester'] for s in semesters} | set(archived_semesters()), reverse=True)
+    return jsonify({'success': True, 'semesters': semester_list})
+
+# ========================================
+# API: 搜尋課程
+# ========================================
+@app.route('/api/courses', methods=['GET'])
+@rate_limited('search')
+def search_courses():
+    """搜尋課程"""
+    courses = search_course_rows(request.args)
     
     return jsonify({
         'success': True,
@@ -868,10 +1061,75 @@ def search_courses():
         'count': len(courses)
     })
 
+# ========================================
+# API: 關鍵字自動完成
+# ========================================
+@app.route('/api/courses/suggest', methods=['GET'])
+@rate_limited('search')
+def suggest_courses():
+    """依輸入前綴建議課程名稱、授課教師、教室與課號"""
+    prefix = request.args.get('q', '').strip()
+    semester = request.args.get('semester', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    suggestions = course_catalog.suggest(prefix, semester, limit) if prefix else []
+    return jsonify({'success': True, 'suggestions': suggestions})
+
+# ========================================
+# API: 篩選計數 (各篩選面板選項的課程數)
+# ========================================
+@app.route('/api/courses/facets', methods=['GET'])
+@rate_limited('search')
+def course_facets():
+    """依目前的篩選條件回傳各欄位選項的課程數 (不含該欄位自身的條件)"""
+    if course_search_source(request.args) != 'courses':
+        return jsonify({'success': False, 'message': '封存學期不提供篩選計數'})
+    count, facets = course_catalog.facets(request.args)
+    return jsonify({'success': True, 'count': count, 'facets': facets})
+
+# ========================================
+# API: 學期目錄快照 (瀏覽器下載後在本機篩選)
+# ========================================
+# 目錄版本的快取秒數 (瀏覽器與 CDN)；快照網址含版本，可長期快取
+CATALOG_VERSION_MAX_AGE = 30
+
+@app.route('/api/catalog/version', methods=['GET'])
+def catalog_version():
+    """目前的課程目錄版本 (課程異動時改變)"""
+    response = jsonify({'success': True, 'version': course_catalog.current_version()})
+    response.headers['Cache-Control'] = f'public, max-age={CATALOG_VERSION_MAX_AGE}'
+    return response
+
+@app.route('/api/catalog/<semester>/snapshot', methods=['GET'])
+def catalog_snapshot(semester):
+    """
+    單一學期的精簡目錄 (gzip 壓縮)
+    網址需帶目前版本 (v=...)；版本不符時轉址到目前版本的網址，版本相符的回應不會改變，可長期快取
+    """
+    if course_source(semester) != 'courses':
+        return jsonify({'success': False, 'message': '封存學期不提供目錄快照'}), 404
+    snapshot = course_catalog.snapshot(semester)
+    if snapshot is None:
+        return jsonify({'success': False, 'message': '此學期沒有課程'}), 404
+    if request.args.get('v') != snapshot['version']:
+        response = redirect(url_for('catalog_snapshot', semester=semester, v=snapshot['version']))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        response = app.response_class(snapshot['gzip'], mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(snapshot['json'], mimetype='application/json')
+    response.headers['Cache-Control'] = assets.CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(f"{semester}-{snapshot['version']}")
+    return response.make_conditional(request)
+
 # ========================================
 # API: 加入收藏/選課
 # ========================================
 @app.route('/api/enroll', methods=['POST'])
+@rate_limited('enroll')
 def enroll_course():
     """加入收藏或選課"""
     if 'user_id' not in session:
@@ -902,8 +1160,121 @@ def enroll_course():
         )
         message = '加入成功'
     
+    mark_write()
     return jsonify({'success': True, 'message': message})
 
+# ========================================
+# API: 即時名額 (Server-Sent Events)
+# ========================================
+# 名額變更紀錄 (seat_changes) 保留秒數
+SEAT_CHANGE_RETENTION = 600
+# 每次重新讀取最近幾筆已讀過的變更紀錄 (PostgreSQL 的序號不保證依提交順序出現，
+# 重讀一小段可補上較晚提交的交易；名額沒有改變的課程不會重複送出)
+SEAT_CHANGE_OVERLAP = 200
+# 心跳間隔 (秒)，避免 proxy 關閉閒置連線
+SEAT_STREAM_HEARTBEAT = 15
+# 同步 worker 上單一連線最長秒數，之後瀏覽器自動重新連線 (async_app 沒有此限制)
+SEAT_STREAM_MAX_SECONDS = 300
+SEAT_STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+# 是否推送名額: 同步 worker (預設 2 個、沒有執行緒) 上每個 SSE 連線佔用整個 worker 直到斷線，
+# 幾個頁面就會讓網站停止回應，因此只有非同步服務模式 (async_app.py 設定為 True) 或
+# 明確設定 SEAT_STREAM=1 (gevent / gthread 等可同時處理大量連線的 worker) 時才推送；
+# 否則瀏覽器每 SEAT_POLL_INTERVAL 秒以 /api/seats 查詢一次
+app.config['SEAT_STREAM'] = os.environ.get('SEAT_STREAM') == '1'
+SEAT_POLL_INTERVAL = 15
+
+def load_seat_changes(after_id):
+    """SeatFeed 的變更來源: 回傳 (最新 id, after_id 之後異動過的課程 id 集合)"""
+    row = execute_query('SELECT MAX(id) AS last_id FROM seat_changes', fetchone=True)
+    last_id = row['last_id'] or 0
+    if after_id is None or last_id == after_id:
+        return last_id, set()
+    rows = execute_query(
+        'SELECT DISTINCT course_id FROM seat_changes WHERE id > ? AND id <= ?',
+        (max(0, after_id - SEAT_CHANGE_OVERLAP), last_id), fetch=True
+    )
+    return last_id, {row['course_id'] for row in rows}
+
+def count_seats(course_ids):
+    """{課程 id: [已選人數, 容量]} (讀主資料庫，與變更紀錄一致)"""
+    course_ids = sorted(course_ids)
+    result = {}
+    for start in range(0, len(course_ids), course_ops.ID_CHUNK):
+        chunk = course_ids[start:start + course_ops.ID_CHUNK]
+        rows = execute_query(f'''
+            SELECT c.id, c.capacity, COUNT(e.id) AS enrolled
+            FROM courses c
+            LEFT JOIN enrollments e ON e.course_id = c.id AND e.status = 'enrolled'
+            WHERE c.id IN ({', '.join('?' * len(chunk))})
+            GROUP BY c.id, c.capacity
+        ''', chunk, fetch=True)
+        for row in rows:
+            result[row['id']] = [row['enrolled'], row['capacity'] or 0]
+    return result
+
+def prune_seat_changes():
+    cutoff = (f"NOW() - INTERVAL '{SEAT_CHANGE_RETENTION} seconds'" if USE_POSTGRES
+              else f"datetime('now', '-{SEAT_CHANGE_RETENTION} seconds')")
+    execute_query(f'DELETE FROM seat_changes WHERE created_at < {cutoff}')
+
+seat_feed = seats.SeatFeed(load_seat_changes, count_seats, prune_seat_changes)
+
+def seat_stream_courses(raw_ids, user_id=None):
+    """要訂閱的課程: 網址指定的課程 (畫面上的結果) 加上使用者收藏與預選的課程"""
+    course_ids = {int(value) for value in raw_ids.split(',') if value.strip().isdigit()}
+    if user_id:
+        rows = execute_query('SELECT course_id FROM enrollments WHERE user_id = ?', (user_id,), fetch=True)
+        course_ids.update(row['course_id'] for row in rows)
+    return sorted(course_ids)[:seats.MAX_SUBSCRIBED_COURSES]
+
+@app.route('/api/seats', methods=['GET'])
+@rate_limited('search')
+def get_seats():
+    """
+    查詢課程名額 (未啟用推送時瀏覽器定期呼叫)，課程同 /api/seats/stream
+    seats: {"課程 id": [已選人數, 容量] 或 null (課程已刪除)}
+    """
+    course_ids = seat_stream_courses(request.args.get('courses', ''), session.get('user_id'))
+    counts = count_seats(course_ids) if course_ids else {}
+    return jsonify({
+        'success': True,
+        'seats': {str(course_id): counts.get(course_id) for course_id in course_ids},
+        'interval': SEAT_POLL_INTERVAL,
+    })
+
+@app.route('/api/seats/stream', methods=['GET'])
+def seat_stream():
+    """
+    推送課程名額: 第一則訊息為目前名額，之後只送出有異動的課程
+    event: seats / data: {"課程 id": [已選人數, 容量] 或 null (課程已刪除)}
+    未啟用推送時回傳 204 (EventSource 不會重新連線，瀏覽器改用 /api/seats)
+    """
+    if not app.config['SEAT_STREAM']:
+        return '', 204
+    course_ids = seat_stream_courses(request.args.get('courses', ''), session.get('user_id'))
+    if not course_ids:
+        return jsonify({'success': False, 'message': '請指定課程'}), 400
+    
+    wake = threading.Event()
+    subscription = seat_feed.subscribe(course_ids, wake.set)
+    
+    def events():
+        try:
+            yield seats.RETRY_EVENT
+            deadline = time.monotonic() + SEAT_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                if not wake.wait(SEAT_STREAM_HEARTBEAT):
+                    yield seats.HEARTBEAT_EVENT
+                    continue
+                wake.clear()
+                pending = seat_feed.drain(subscription)
+                if pending:
+                    yield seats.format_event(pending)
+        finally:
+            seat_feed.unsubscribe(subscription)
+    
+    return app.response_class(events(), mimetype='text/event-stream', headers=SEAT_STREAM_HEADERS)
+
 # ========================================
 # API: 取得收藏/預選清單
 # ========================================
@@ -913,26 +1284,9 @@ def get_enrollments():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': '請先登入'})
     
-    status = request.args.get('status', '')
-    
-    if status:
-        query = '''
-            SELECT e.id as enrollment_id, e.status, c.* 
-            FROM enrollments e 
-            JOIN courses c ON e.course_id = c.id 
-            WHERE e.user_id = ? AND e.status = ?
-            ORDER BY c.semester DESC, c.course_code
-        '''
-        enrollments = execute_query(query, (session['user_id'], status), fetch=True)
-    else:
-        query = '''
-            SELECT e.id as enrollment_id, e.status, c.* 
-            FROM enrollments e 
-            JOIN courses c ON e.course_id = c.id 
-            WHERE e.user_id = ?
-            ORDER BY c.semester DESC, c.course_code
-        '''
-        enrollments = execute_query(query, (session['user_id'],), fetch=True)
+    source = course_source(include_archived=True)
+    query, params = build_enrollment_query(session['user_id'], request.args.get('status', ''), source)
+    enrollments = execute_query(query, params, fetch=True, readonly=use_replica(), archive_views=source != 'courses')
     
     return jsonify({
         'success': True,
@@ -944,6 +1298,7 @@ def get_enrollments():
 # API: 刪除收藏/預選
 # ========================================
 @app.route('/api/enroll/<int:enrollment_id>', methods=['DELETE'])
+@rate_limited('enroll')
 def delete_enrollment(enrollment_id):
     """刪除收藏或預選"""
     if 'user_id' not in session:
@@ -953,6 +1308,7 @@ def delete_enrollment(enrollment_id):
         'DELETE FROM enrollments WHERE id = ? AND user_id = ?',
         (enrollment_id, session['user_id'])
     )
+    mark_write()
     
     return jsonify({'success': True, 'message': '刪除成功'})
 
@@ -964,14 +1320,46 @@ def get_course(course_id):
     """取得單一課程資料"""
     course = execute_query(
         'SELECT * FROM courses WHERE id = ?',
-        (course_id,), fetchone=True
+        (course_id,), fetchone=True, readonly=use_replica()
     )
+    if not course and archived_semesters():
+        course = execute_query(
+            'SELECT * FROM courses_archive WHERE id = ?',
+            (course_id,), fetchone=True, readonly=use_replica(), archive_views=True
+        )
     
     if course:
         return jsonify({'success': True, 'course': course})
     else:
         return jsonify({'success': False, 'message': '課程不存在'})
 
+# ========================================
+# API: 跨學期課程歷史
+# ========================================
+def build_course_history_query(course_code, source='courses'):
+    """同一課程代碼在各學期的開課紀錄 (idx_courses_code_semester 索引範圍查詢)"""
+    return f'SELECT * FROM {source} WHERE course_code = ? ORDER BY semester DESC, id', (course_code,)
+
+def group_course_history(sections):
+    """依學期分組 (sections 已依學期排序)"""
+    return [
+        {'semester': semester, 'sections': list(group)}
+        for semester, group in itertools.groupby(sections, key=lambda c: c['semester'])
+    ]
+
+@app.route('/api/courses/history/<course_code>', methods=['GET'])
+def get_course_history(course_code):
+    """取得課程在各學期的授課教師、教室與時間"""
+    source = course_source(include_archived=True)
+    query, params = build_course_history_query(course_code, source)
+    sections = execute_query(query, params, fetch=True, readonly=use_replica(), archive_views=source != 'courses')
+    return jsonify({
+        'success': True,
+        'course_code': course_code,
+        'semesters': group_course_history(sections),
+        'count': len(sections)
+    })
+
 # ========================================
 # API: 新增課程 (管理者)
 # ========================================
@@ -982,6 +1370,8 @@ def add_course():
         return jsonify({'success': False, 'message': '權限不足'})
     
     data = request.json
+    if data.get('semester') in archived_semesters():
+        return jsonify({'success': False, 'message': '此學期已封存，請先還原'})
     
     day_time = ''
     weekday = data.get('weekday', '')
@@ -1017,6 +1407,8 @@ def add_course():
         data.get('class_group', ''),
         data.get('remarks', '')
     ))
+    mark_write()
+    course_catalog.bump_version()
     
     return jsonify({'success': True, 'message': '新增成功'})
 
@@ -1030,6 +1422,8 @@ def update_course(course_id):
         return jsonify({'success': False, 'message': '權限不足'})
     
     data = request.json
+    if data.get('semester') in archived_semesters():
+        return jsonify({'success': False, 'message': '此學期已封存，請先還原'})
     
     day_time = ''
     weekday = data.get('weekday', '')
@@ -1067,6 +1461,8 @@ def update_course(course_id):
         data.get('remarks', ''),
         course_id
     ))
+    mark_write()
+    course_catalog.bump_version()
     
     return jsonify({'success': True, 'message': '更新成功'})
 
@@ -1079,34 +1475,172 @@ def delete_course(course_id):
     if 'user_id' not in session or session.get('role') != 'admin':
         return jsonify({'success': False, 'message': '權限不足'})
     
-    execute_query('DELETE FROM courses WHERE id = ?', (course_id,))
-    execute_query('DELETE FROM enrollments WHERE course_id = ?', (course_id,))
+    conn = get_db()
+    try:
+        course_ops.delete_courses(conn, USE_POSTGRES, 'SELECT id FROM courses WHERE id = ?', (course_id,))
+    finally:
+        conn.close()
+    mark_write()
+    course_catalog.bump_version()
     
     return jsonify({'success': True, 'message': '刪除成功'})
 
 # ========================================
-# API: 取得所有使用者 (管理者)
+# API: 批次課程操作 (管理者，見 course_ops.py)
 # ========================================
+# 依篩選條件刪除時至少需要其中一個條件，避免誤刪全部課程
+BULK_DELETE_FILTERS = ('keyword', 'semester', 'department', 'grade', 'type', 'weekday', 'period', 'degree', 'category')
+
+@app.route('/api/courses/bulk-delete', methods=['POST'])
+def bulk_delete_courses():
+    """
+    刪除符合篩選條件的所有課程與其選課記錄 (篩選參數同搜尋課程)
+    dry_run=true 時只回傳會刪除的筆數
+    """
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    data = request.json or {}
+    if not any(data.get(key) for key in BULK_DELETE_FILTERS):
+        return jsonify({'success': False, 'message': '請至少指定一個篩選條件'})
+    if data.get('semester') in archived_semesters():
+        return jsonify({'success': False, 'message': '此學期已封存，請先還原'})
+    
+    query, params = build_course_search(data)
+    return run_course_operation(
+        course_ops.delete_courses, query, params, dry_run=bool(data.get('dry_run')),
+        message=lambda counts: f"刪除 {counts['courses']} 門課程、{counts['enrollments']} 筆選課記錄"
+    )
+
+@app.route('/api/courses/bulk-update', methods=['POST'])
+def bulk_update_courses():
+    """將多門課程的欄位設為相同的值: {"ids": [...], "fields": {"instructor": "...", ...}}"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    data = request.json or {}
+    ids = data.get('ids') or []
+    # bool 是 int 的子類別，true/false 不可當作課程 id
+    if (not isinstance(ids, list) or not ids
+            or not all(isinstance(course_id, int) and not isinstance(course_id, bool) for course_id in ids)):
+        return jsonify({'success': False, 'message': '請選擇要修改的課程'})
+    fields = data.get('fields')
+    if not isinstance(fields, dict) or not fields:
+        return jsonify({'success': False, 'message': '請指定要修改的欄位'})
+    
+    return run_course_operation(
+        course_ops.update_courses, ids, fields, dry_run=bool(data.get('dry_run')),
+        message=lambda counts: f"修改 {counts['courses']} 門課程"
+    )
+
+@app.route('/api/semesters/<semester>/clone', methods=['POST'])
+def clone_semester(semester):
+    """以來源學期的課程建立新學期: {"source": "1141", "departments": [...] (選用)}"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    data = request.json or {}
+    if semester in archived_semesters():
+        return jsonify({'success': False, 'message': '此學期已封存，請先還原'})
+    
+    return run_course_operation(
+        course_ops.clone_semester, data.get('source', ''), semester, data.get('departments') or None,
+        dry_run=bool(data.get('dry_run')),
+        message=lambda counts: f"複製 {counts['courses']} 門課程到學期 {semester}"
+    )
+
+def run_course_operation(operation, *args, dry_run=False, message):
+    """在單一交易中執行批次操作，回傳受影響的筆數"""
+    conn = get_db()
+    try:
+        counts = operation(conn, USE_POSTGRES, *args, dry_run=dry_run)
+    except course_ops.BulkOperationError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    finally:
+        conn.close()
+    
+    print(f"[course_ops] {operation.__name__}{' (dry run)' if dry_run else ''}: {counts}")
+    if not dry_run:
+        mark_write()
+        course_catalog.bump_version()
+    return jsonify({
+        'success': True,
+        'message': ('預計' if dry_run else '已') + message(counts),
+        'dry_run': dry_run,
+        'counts': counts
+    })
+
+# ========================================
+# API: 使用者列表 (管理者)
+# ========================================
+def build_user_search(args):
+    """
+    建立使用者列表的篩選條件 (role、q)，回傳 (where, params)
+    q 為前綴搜尋 (帳號、學號、姓名、系所、班級)，可使用 migrations 版本 7 的索引
+    """
+    where = ' WHERE 1=1'
+    params = []
+    
+    role = args.get('role', '')
+    keyword = args.get('q', '').strip()
+    if role:
+        # 有搜尋字串時 SQLite 以 +role 避免選用 (role, username) 索引逐筆掃描整個身分，
+        # 改用各欄位的前綴索引 (PostgreSQL 依統計資料自行選擇)
+        where += ' AND +role = ?' if keyword and not USE_POSTGRES else ' AND role = ?'
+        params.append(role)
+    
+    if keyword:
+        # 跳脫萬用字元，只做前綴比對
+        pattern = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        if USE_POSTGRES:
+            conditions = [f"lower({col}) LIKE ? ESCAPE '\\'" for col in migrations.USER_SEARCH_COLUMNS]
+            pattern = pattern.lower()
+        else:
+            conditions = [f"{col} LIKE ? ESCAPE '\\'" for col in migrations.USER_SEARCH_COLUMNS]
+        where += f' AND ({" OR ".join(conditions)})'
+        params.extend([pattern] * len(conditions))
+    
+    return where, params
+
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    """取得所有使用者"""
+    """
+    取得使用者列表 (分頁)
+    參數: role (student / admin)、q (前綴搜尋)、sort、order (asc / desc)、page、per_page
+    """
     if 'user_id' not in session or session.get('role') != 'admin':
         return jsonify({'success': False, 'message': '權限不足'})
     
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = max(1, min(int(request.args.get('per_page', USER_PAGE_SIZE)), USER_PAGE_MAX_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'message': '分頁參數錯誤'})
+    sort = request.args.get('sort', 'username')
+    if sort not in USER_SORT_COLUMNS:
+        sort = 'username'
+    order = 'DESC' if request.args.get('order') == 'desc' else 'ASC'
+    
+    where, params = build_user_search(request.args)
+    readonly = use_replica()
+    total = execute_query(f'SELECT COUNT(*) as count FROM users{where}', params, fetchone=True, readonly=readonly)['count']
     users = execute_query(
-        "SELECT id, username, role, name, student_id, department, class_name, phone, email, avatar FROM users",
-        fetch=True
+        "SELECT id, username, role, name, student_id, department, class_name, phone, email, avatar FROM users"
+        f"{where} ORDER BY {sort} {order}, id {order} LIMIT ? OFFSET ?",
+        params + [per_page, (page - 1) * per_page], fetch=True, readonly=readonly
+    )
+    role_counts = execute_query(
+        'SELECT role, COUNT(*) as count FROM users GROUP BY role', fetch=True, readonly=readonly
     )
-    
-    # 分成學生和管理員
-    students = [u for u in users if u['role'] == 'student']
-    admins = [u for u in users if u['role'] == 'admin']
     
     return jsonify({
         'success': True,
-        'students': students,
-        'admins': admins,
-        'users': users
+        'users': users,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+        'role_counts': {row['role']: row['count'] for row in role_counts}
     })
 
 # ========================================
@@ -1141,10 +1675,100 @@ def create_user():
     execute_query('''
         INSERT INTO users (username, password, name, role, student_id, phone, avatar)
         VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (username, password, name, role, username, phone, avatar))
+    ''', (username, passwords.hash_password(password), name, role, username, phone, avatar))
     
     return jsonify({'success': True, 'message': '新增成功'})
 
+# ========================================
+# API: 批次建立帳號 (管理者)
+# ========================================
+@app.route('/api/users/import', methods=['POST'])
+@rate_limited('import')
+def import_users():
+    """
+    上傳 CSV/Excel 名單批次建立帳號
+    mode=skip (預設): 已存在的帳號不變動；mode=update: 更新已存在帳號的資料
+    名單超過 USER_IMPORT_SYNC_ROWS 列或 background=1 時改在背景執行，回傳 job_id
+    """
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'message': '沒有選擇檔案'})
+    
+    update_existing = request.form.get('mode', 'skip') == 'update'
+    
+    try:
+        roster = provisioning.read_roster(load_pandas(), file, file.filename)
+        valid, errors = provisioning.validate_roster(roster)
+    except provisioning.RosterError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        print(f"[import_users] 讀取名單失敗: {e}")
+        return jsonify({'success': False, 'message': f'讀取名單失敗: {str(e)}'})
+    
+    print(f"[import_users] 名單 {file.filename}: {len(roster)} 列，可匯入 {len(valid)} 列，錯誤 {len(errors)} 列")
+    if valid.empty:
+        report = provisioning.build_report({'created': 0, 'updated': 0, 'conflicts': []}, errors, update_existing)
+        report['success'] = False
+        return jsonify(report)
+    
+    mark_write()
+    if len(valid) <= USER_IMPORT_SYNC_ROWS and request.form.get('background') != '1':
+        return jsonify(run_user_import(valid, errors, update_existing))
+    
+    job_id = import_jobs.create(session['user_id'], len(valid))
+    threading.Thread(
+        target=run_user_import, args=(valid, errors, update_existing, job_id),
+        name=f'user-import-{job_id}', daemon=True
+    ).start()
+    return jsonify({
+        'success': True,
+        'message': f'已開始匯入 {len(valid)} 個帳號',
+        'job_id': job_id,
+        'status_url': f'/api/users/import/{job_id}'
+    }), 202
+
+@app.route('/api/users/import/<job_id>', methods=['GET'])
+def get_user_import(job_id):
+    """查詢背景匯入工作的進度與結果"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    job = import_jobs.get(job_id)
+    if not job or job.get('owner_id') != session['user_id']:
+        return jsonify({'success': False, 'message': '找不到匯入工作'}), 404
+    return jsonify({'success': True, 'job': job})
+
+def run_user_import(valid, errors, update_existing, job_id=None):
+    """寫入名單並回傳結果；job_id 不為 None 時 (背景執行) 進度與結果寫入 import_jobs"""
+    progress = (lambda **fields: import_jobs.update(job_id, **fields)) if job_id else None
+    start = time.time()
+    try:
+        conn = get_db()
+        try:
+            result = provisioning.upsert_users(conn, USE_POSTGRES, valid, update_existing, progress=progress)
+        finally:
+            conn.close()
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"[import_users] 匯入失敗: {e}")
+        report = {'success': False, 'message': f'匯入失敗: {str(e)}'}
+        if job_id:
+            import_jobs.update(job_id, status='failed', result=report)
+        return report
+    
+    if update_existing:
+        for conflict in result['conflicts']:
+            profile_cache.invalidate(conflict['user_id'])
+    report = provisioning.build_report(result, errors, update_existing)
+    print(f"[import_users] {report['message']} ({time.time() - start:.1f} 秒)")
+    if job_id:
+        import_jobs.update(job_id, status='done', stage='done', result=report)
+    return report
+
 # ========================================
 # API: 取得單一使用者 (管理者)
 # ========================================
@@ -1155,7 +1779,7 @@ def get_user(user_id):
         return jsonify({'success': False, 'message': '權限不足'})
     
     user = execute_query(
-        "SELECT id, username, password, role, name, student_id, department, class_name, phone, email, avatar FROM users WHERE id = ?",
+        "SELECT id, username, role, name, student_id, department, class_name, phone, email, avatar FROM users WHERE id = ?",
         (user_id,), fetchone=True
     )
     
@@ -1191,6 +1815,7 @@ def update_user(user_id):
         data.get('avatar', '🐱'),
         user_id
     ))
+    profile_cache.invalidate(user_id)
     
     return jsonify({'success': True, 'message': '更新成功'})
 
@@ -1205,6 +1830,7 @@ def delete_user(user_id):
     
     execute_query('DELETE FROM enrollments WHERE user_id = ?', (user_id,))
     execute_query('DELETE FROM users WHERE id = ?', (user_id,))
+    profile_cache.invalidate(user_id)
     
     return jsonify({'success': True, 'message': '刪除成功'})
 
@@ -1217,12 +1843,13 @@ def reset_user_password(user_id):
     if 'user_id' not in session or session.get('role') != 'admin':
         return jsonify({'success': False, 'message': '權限不足'})
     
-    default_password = 'pass123'
+    default_password = passwords.DEFAULT_PASSWORD
     
     execute_query(
         'UPDATE users SET password = ? WHERE id = ?',
-        (default_password, user_id)
+        (passwords.hash_password(default_password), user_id)
     )
+    profile_cache.invalidate(user_id)
     
     return jsonify({'success': True, 'message': f'密碼已重設為預設值: {default_password}'})
 
@@ -1230,6 +1857,7 @@ def reset_user_password(user_id):
 # API: 匯入課程 (管理者)
 # ========================================
 @app.route('/api/import-courses', methods=['POST'])
+@rate_limited('import')
 def import_courses():
     """匯入課程 Excel 檔案"""
     print("[import_courses] 開始處理匯入請求")
@@ -1252,69 +1880,46 @@ def import_courses():
         print("[import_courses] 沒有指定學期")
         return jsonify({'success': False, 'message': '請指定學期'})
     
+    if semester in archived_semesters():
+        print(f"[import_courses] 學期 {semester} 已封存")
+        return jsonify({'success': False, 'message': '此學期已封存，請先還原'})
+    
     print(f"[import_courses] 檔案: {file.filename}, 學期: {semester}")
     
+    # 與此學期上次匯入的檔案內容相同時直接回傳上次結果 (force=1 強制重新處理)
+    mode = 'diff' if request.form.get('mode') == 'diff' else 'full'
+    dry_run = mode == 'diff' and request.form.get('dry_run') == '1'
+    digest, size = course_import.file_digest(file.stream)
+    if request.form.get('force') != '1':
+        previous = find_duplicate_upload(semester, digest, mode)
+        if previous:
+            print(f"[import_courses] 檔案與 {previous['uploaded_at']} 匯入的內容相同，略過處理")
+            result = json.loads(previous['result'])
+            return jsonify({
+                **result,
+                'duplicate': True,
+                'dry_run': dry_run,
+                'uploaded_at': str(previous['uploaded_at']),
+                'message': f"此檔案已於 {str(previous['uploaded_at'])[:16]} 匯入，未重新處理 ({result.get('message', '')})"
+            })
+    
     try:
-        # 讀取 Excel 檔案
-        print("[import_courses] 開始讀取 Excel 檔案...")
-        if file.filename.endswith('.xls'):
-            try:
-                df = pd.read_excel(file, header=3, engine='xlrd')
-                print(f"[import_courses] 使用 xlrd 讀取成功，共 {len(df)} 行")
-            except Exception as xlrd_error:
-                print(f"[import_courses] xlrd 讀取失敗: {xlrd_error}")
-                # 嘗試不指定 engine
-                file.seek(0)  # 重置檔案指標
-                df = pd.read_excel(file, header=3)
-        else:
-            df = pd.read_excel(file, header=3)
+        courses, error_count = parse_course_upload(file, semester, digest)
         
-        print(f"[import_courses] Excel 讀取完成，欄位數: {len(df.columns)}, 資料行數: {len(df)}")
+        # 差異匯入: 只寫入新增、變更與刪除的課程 (dry_run 只回傳差異報告)
+        if mode == 'diff':
+            result = import_courses_diff(semester, courses, error_count, dry_run)
+            if not dry_run:
+                record_upload(semester, digest, mode, file.filename, size, result)
+            return jsonify(result)
         
         imported_count = 0
-        error_count = 0
         
-        for idx, row in df.iterrows():
-            if idx == 0:
-                continue
-            
+        for course in courses:
             try:
-                course_code = str(row.iloc[3]) if pd.notna(row.iloc[3]) else ''
-                if not course_code or course_code == 'nan':
-                    continue
-                
-                dept_code = str(row.iloc[4]) if pd.notna(row.iloc[4]) else ''
-                department = get_department_name(dept_code)
-                
-                grade = str(row.iloc[7]) if pd.notna(row.iloc[7]) else ''
-                class_group = str(row.iloc[8]) if pd.notna(row.iloc[8]) else ''
-                course_name = str(row.iloc[9]) if pd.notna(row.iloc[9]) else ''
-                course_name_en = str(row.iloc[10]) if pd.notna(row.iloc[10]) else ''
-                instructor = str(row.iloc[11]) if pd.notna(row.iloc[11]) else ''
-                capacity = int(row.iloc[12]) if pd.notna(row.iloc[12]) else 0
-                credits = float(row.iloc[15]) if pd.notna(row.iloc[15]) else 0
-                course_type = str(row.iloc[19]) if pd.notna(row.iloc[19]) else ''
-                classroom = str(row.iloc[20]) if pd.notna(row.iloc[20]) else ''
-                weekday = str(row.iloc[21]) if pd.notna(row.iloc[21]) else ''
-                period = str(row.iloc[22]) if pd.notna(row.iloc[22]) else ''
-                remarks = str(row.iloc[23]) if pd.notna(row.iloc[23]) else ''
-                course_summary = str(row.iloc[24]) if pd.notna(row.iloc[24]) else ''
-                
-                day_map = {'1': '週一', '2': '週二', '3': '週三', '4': '週四', 
-                           '5': '週五', '6': '週六', '7': '週日'}
-                day_time = ''
-                if weekday:
-                    try:
-                        day_str = day_map.get(str(int(float(weekday))), '')
-                        if day_str:
-                            day_time = f"{day_str} {period}"
-                        weekday = str(int(float(weekday)))
-                    except:
-                        pass
-                
                 existing = execute_query(
                     'SELECT id FROM courses WHERE semester = ? AND course_code = ? AND class_group = ?',
-                    (semester, course_code, class_group), fetchone=True
+                    (semester, course['course_code'], course['class_group']), fetchone=True
                 )
                 
                 if existing:
@@ -1326,10 +1931,10 @@ def import_courses():
                             remarks = ?, course_summary = ?
                         WHERE id = ?
                     ''', (
-                        department, grade, course_name, course_name_en,
-                        instructor, credits, course_type, classroom,
-                        day_time, weekday, period, capacity,
-                        remarks, course_summary, existing['id']
+                        course['department'], course['grade'], course['course_name'], course['course_name_en'],
+                        course['instructor'], course['credits'], course['course_type'], course['classroom'],
+                        course['day_time'], course['weekday'], course['period'], course['capacity'],
+                        course['remarks'], course['course_summary'], existing['id']
                     ))
                 else:
                     execute_query('''
@@ -1339,26 +1944,30 @@ def import_courses():
                                            remarks, course_summary)
                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ''', (
-                        semester, department, grade, course_code, course_name,
-                        course_name_en, instructor, credits, course_type, classroom,
-                        day_time, weekday, period, capacity, class_group,
-                        remarks, course_summary
+                        semester, course['department'], course['grade'], course['course_code'], course['course_name'],
+                        course['course_name_en'], course['instructor'], course['credits'], course['course_type'], course['classroom'],
+                        course['day_time'], course['weekday'], course['period'], course['capacity'], course['class_group'],
+                        course['remarks'], course['course_summary']
                     ))
                 
                 imported_count += 1
                 
             except Exception as e:
                 error_count += 1
-                print(f"[import_courses] Row {idx} error: {e}")
+                print(f"[import_courses] {course['course_code']} error: {e}")
                 continue
         
         print(f"[import_courses] 匯入完成: 成功 {imported_count}, 失敗 {error_count}")
+        mark_write()
+        course_catalog.bump_version()
         
-        return jsonify({
+        result = {
             'success': True, 
             'message': f'成功匯入 {imported_count} 筆課程',
             'count': imported_count
-        })
+        }
+        record_upload(semester, digest, mode, file.filename, size, result)
+        return jsonify(result)
         
     except Exception as e:
         import traceback
@@ -1367,6 +1976,265 @@ def import_courses():
         print(f"[import_courses] 詳細錯誤: {error_detail}")
         return jsonify({'success': False, 'message': f'匯入失敗: {str(e)}'})
 
+def parse_course_upload(file, semester, digest):
+    """
+    解析上傳的課程 Excel，回傳 (課程列表, 錯誤列數)
+    相同內容的檔案 (例如差異匯入先試算再套用) 直接讀取解析結果快取 (見 parse_cache.py)
+    """
+    cached = parse_cache.load('import', semester, digest)
+    if cached is not None:
+        columns, rows, error_count = cached
+        print(f"[import_courses] 使用解析結果快取 ({len(rows)} 筆課程)")
+        return [dict(zip(columns, row)) for row in rows], error_count
+    
+    pd = load_pandas()
+    
+    # 讀取 Excel 檔案
+    print("[import_courses] 開始讀取 Excel 檔案...")
+    if file.filename.endswith('.xls'):
+        try:
+            df = pd.read_excel(file, header=3, engine='xlrd')
+            print(f"[import_courses] 使用 xlrd 讀取成功，共 {len(df)} 行")
+        except Exception as xlrd_error:
+            print(f"[import_courses] xlrd 讀取失敗: {xlrd_error}")
+            # 嘗試不指定 engine
+            file.seek(0)  # 重置檔案指標
+            df = pd.read_excel(file, header=3)
+    else:
+        df = pd.read_excel(file, header=3)
+    
+    print(f"[import_courses] Excel 讀取完成，欄位數: {len(df.columns)}, 資料行數: {len(df)}")
+    
+    courses, error_count = course_import.parse_course_sheet(
+        pd, df, semester, get_department_name, log=lambda msg: print(f"[import_courses] {msg}")
+    )
+    if courses:
+        columns = list(courses[0])
+        parse_cache.store('import', semester, digest, columns, [[course[col] for col in columns] for course in courses], error_count)
+    return courses, error_count
+
+def import_courses_diff(semester, courses, error_count, dry_run):
+    """比對檔案與資料庫中的學期課程，回傳差異報告 dict (dry_run=False 時同時寫入)"""
+    start = time.time()
+    conn = get_db()
+    try:
+        existing = course_import.load_semester(conn, USE_POSTGRES, semester)
+        diff = course_import.diff_courses(courses, existing)
+        enrollment_count = course_import.count_enrollments(conn, USE_POSTGRES, [row['id'] for row in diff['delete']])
+        report = course_import.build_report(diff, enrollment_count)
+        if not dry_run:
+            course_import.apply_diff(conn, USE_POSTGRES, diff)
+    finally:
+        conn.close()
+    
+    summary = f"新增 {report['inserted']}、更新 {report['updated']}、刪除 {report['deleted']}、未變更 {report['unchanged']} 門課程"
+    print(f"[import_courses] 差異匯入{' (試算)' if dry_run else ''}: {summary} ({time.time() - start:.2f} 秒)")
+    if not dry_run and (report['inserted'] or report['updated'] or report['deleted']):
+        mark_write()
+        course_catalog.bump_version()
+    
+    return {
+        'success': True,
+        'message': ('預計' if dry_run else '已') + summary,
+        'dry_run': dry_run,
+        'count': report['inserted'] + report['updated'],
+        'errors': error_count,
+        **report
+    }
+
+def find_duplicate_upload(semester, digest, mode):
+    """
+    此學期最近一次匯入的檔案內容與模式都相同時回傳該次紀錄
+    匯入後課程資料又有異動 (手動編輯、批次修改、其他匯入...) 時 catalog 版本不同，需要重新處理
+    """
+    last = execute_query(
+        'SELECT sha256, mode, result, uploaded_at, catalog_version FROM course_uploads WHERE semester = ? ORDER BY id DESC LIMIT 1',
+        (semester,), fetchone=True
+    )
+    if (last and last['sha256'] == digest and last['mode'] == mode
+            and last['catalog_version'] == course_catalog.current_version()):
+        return last
+    return None
+
+def record_upload(semester, digest, mode, filename, size, result):
+    """記錄匯入的檔案摘要、結果與匯入後的 catalog 版本"""
+    execute_query('''
+        INSERT INTO course_uploads (semester, sha256, mode, filename, size, result, uploaded_by, catalog_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (semester, digest, mode, filename, size, json.dumps(result, ensure_ascii=False), session.get('user_id'),
+          course_catalog.current_version()))
+
+# ========================================
+# API: 學期封存 (管理者)
+# ========================================
+@app.route('/api/semesters/archive', methods=['GET'])
+def list_semester_archive():
+    """目前學期與封存學期的課程數"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    active = execute_query(
+        'SELECT semester, COUNT(*) as count FROM courses GROUP BY semester ORDER BY semester DESC',
+        fetch=True
+    )
+    return jsonify({
+        'success': True,
+        'active': {row['semester']: row['count'] for row in active},
+        'archived': archived_semesters()
+    })
+
+@app.route('/api/semesters/<semester>/archive', methods=['POST'])
+def archive_semester(semester):
+    """將學期移到冷儲存 (仍可查詢，但不再出現在未指定學期的搜尋結果)"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    return run_archive_operation(archive.archive_semester, semester, '封存')
+
+@app.route('/api/semesters/<semester>/restore', methods=['POST'])
+def restore_semester(semester):
+    """將封存的學期移回目前學期資料"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    return run_archive_operation(archive.restore_semester, semester, '還原')
+
+def run_archive_operation(operation, semester, label):
+    conn = get_db()
+    try:
+        count = operation(conn, USE_POSTGRES, semester, log=lambda msg: print(f"[archive] {msg}"))
+    except archive.ArchiveError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    finally:
+        conn.close()
+    mark_write()
+    course_catalog.bump_version()
+    return jsonify({'success': True, 'message': f'已{label} {count} 筆課程', 'count': count})
+
+@app.cli.command('archive-semester')
+@click.argument('semester')
+@click.option('--restore', is_flag=True, help='將封存的學期移回')
+def archive_semester_command(semester, restore):
+    """封存/還原學期 (flask --app app archive-semester 1131 [--restore])"""
+    operation = archive.restore_semester if restore else archive.archive_semester
+    conn = get_db()
+    try:
+        operation(conn, USE_POSTGRES, semester)
+    except archive.ArchiveError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    course_catalog.bump_version()
+
+# ========================================
+# API: 匯出 (CSV / XLSX 串流下載)
+# ========================================
+COURSE_EXPORT_COLUMNS = [
+    ('semester', '學期'), ('course_code', '課程代碼'), ('course_name', '課程名稱'),
+    ('course_name_en', '英文名稱'), ('department', '系所'), ('grade', '年級'),
+    ('class_group', '班組'), ('instructor', '授課教師'), ('credits', '學分'),
+    ('course_type', '課別'), ('day_time', '上課時間'), ('classroom', '教室'),
+    ('capacity', '人數上限'), ('remarks', '備註'),
+]
+
+ROSTER_EXPORT_COLUMNS = [
+    ('student_id', '學號'), ('name', '姓名'), ('username', '帳號'),
+    ('user_department', '系所'), ('class_name', '班級'), ('email', 'Email'),
+    ('status', '狀態'), ('enrolled_at', '加入時間'),
+]
+
+ENROLLMENT_EXPORT_COLUMNS = ROSTER_EXPORT_COLUMNS[:5] + COURSE_EXPORT_COLUMNS[:3] + [
+    ('instructor', '授課教師'), ('day_time', '上課時間'), ('status', '狀態'), ('enrolled_at', '加入時間'),
+]
+
+SCHEDULE_EXPORT_COLUMNS = COURSE_EXPORT_COLUMNS[:3] + [
+    ('instructor', '授課教師'), ('credits', '學分'), ('day_time', '上課時間'),
+    ('classroom', '教室'), ('status', '狀態'),
+]
+
+def export_or_error(filename, columns, load_rows):
+    """load_rows: 無參數函數，回傳資料列 (確認格式支援後才執行查詢)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': '不支援的匯出格式 (csv / xlsx)'})
+    return exports.export_response(fmt, filename, columns, load_rows())
+
+@app.route('/api/export/courses', methods=['GET'])
+@rate_limited('search')
+def export_courses():
+    """匯出課程列表 (篩選參數同搜尋課程)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '請先登入'})
+    
+    source = course_search_source(request.args)
+    query, params = build_course_search(request.args, source)
+    return export_or_error(
+        f"courses_{request.args.get('semester') or 'all'}", COURSE_EXPORT_COLUMNS,
+        lambda: stream_query(query, params, readonly=use_replica(), archive_views=source != 'courses')
+    )
+
+@app.route('/api/export/courses/<int:course_id>/roster', methods=['GET'])
+def export_course_roster(course_id):
+    """匯出單一課程的收藏/預選學生名單 (管理者)"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    query = '''
+        SELECT u.student_id, u.name, u.username, u.department as user_department, u.class_name, u.email,
+               e.status, e.created_at as enrolled_at
+        FROM enrollments e
+        JOIN users u ON e.user_id = u.id
+        WHERE e.course_id = ?
+        ORDER BY u.student_id, u.username
+    '''
+    return export_or_error(
+        f'roster_{course_id}', ROSTER_EXPORT_COLUMNS,
+        lambda: stream_query(query, (course_id,), readonly=use_replica())
+    )
+
+@app.route('/api/export/enrollments', methods=['GET'])
+def export_enrollments():
+    """匯出全部選課記錄 (管理者，可用 semester、status 篩選)"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': '權限不足'})
+    
+    source = course_source(include_archived=True)
+    query = f'''
+        SELECT u.student_id, u.name, u.username, u.department as user_department, u.class_name,
+               c.semester, c.course_code, c.course_name, c.instructor, c.day_time,
+               e.status, e.created_at as enrolled_at
+        FROM enrollments e
+        JOIN users u ON e.user_id = u.id
+        JOIN {source} c ON e.course_id = c.id
+        WHERE 1=1
+    '''
+    params = []
+    semester = request.args.get('semester', '')
+    if semester:
+        query += ' AND c.semester = ?'
+        params.append(semester)
+    status = request.args.get('status', '')
+    if status:
+        query += ' AND e.status = ?'
+        params.append(status)
+    query += ' ORDER BY c.semester DESC, c.course_code, u.student_id'
+    
+    return export_or_error(
+        f"enrollments_{semester or 'all'}", ENROLLMENT_EXPORT_COLUMNS,
+        lambda: stream_query(query, params, readonly=use_replica(), archive_views=source != 'courses')
+    )
+
+@app.route('/api/export/schedule', methods=['GET'])
+def export_schedule():
+    """匯出目前使用者的收藏/預選課程 (status 參數同取得收藏/預選清單)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': '請先登入'})
+    
+    source = course_source(include_archived=True)
+    query, params = build_enrollment_query(session['user_id'], request.args.get('status', ''), source)
+    return export_or_error(
+        'schedule', SCHEDULE_EXPORT_COLUMNS,
+        lambda: stream_query(query, params, readonly=use_replica(), archive_views=source != 'courses')
+    )
+
 def get_department_name(dept_code):
     """根據系所代碼取得系所名稱"""
     dept_map = {
@@ -1404,5 +2272,9 @@ def get_department_name(dept_code):
 # 啟動應用程式
 # ========================================
 if __name__ == '__main__':
+    print("[APP] 應用程式啟動，開始初始化資料庫...")
+    init_db()
+    if course_catalog.columnar:
+        course_catalog.ensure_fresh()
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=True, host='0.0.0.0', port=port)
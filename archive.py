@@ -0,0 +1,202 @@
+# ==========================================================
+# 北護課程查詢系統 - 學期封存
+# 舊學期的課程從 courses (目前學期的熱資料) 移到冷儲存，仍可查詢:
+# - PostgreSQL: courses_archive 依學期分割 (PARTITION BY LIST)，每個封存學期一個 partition，
+#               可用 ARCHIVE_TABLESPACE 放到較慢/較便宜的磁碟
+#               courses 本身不分割: 分割表的主鍵必須包含分割欄位 (semester)，
+#               enrollments.course_id 的外鍵就無法只參照 courses.id；目前學期的資料量也不需要分割
+# - SQLite: 所有封存學期放在同一個資料庫檔案 (ARCHIVE_DIR/courses_archive.db，以 semester 欄位區分)，
+#           需要時 ATTACH 並以暫存 view 合併 (SQLite 預設最多 ATTACH 10 個資料庫，
+#           不能每個學期一個檔案；舊版的 courses_<學期>.db 由 consolidate_sqlite 合併)
+# 查詢來源: courses (目前學期)、courses_archive (封存學期)、courses_all (兩者合併)
+# ==========================================================
+
+import os
+import re
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+ARCHIVE_TABLESPACE = os.environ.get('ARCHIVE_TABLESPACE')
+
+class ArchiveError(Exception):
+    """封存/還原失敗 (學期不存在、已封存...)"""
+
+def _check_semester(semester):
+    """學期代碼會用於資料表與檔案名稱，只允許數字"""
+    if not re.fullmatch(r'\d{3,5}', semester or ''):
+        raise ArchiveError(f'學期代碼格式錯誤: {semester}')
+
+def _scalar(row):
+    if isinstance(row, dict):
+        return list(row.values())[0]
+    return row[0]
+
+def sqlite_path():
+    return os.path.join(ARCHIVE_DIR, 'courses_archive.db')
+
+def legacy_sqlite_path(semester):
+    """舊版每個封存學期一個檔案"""
+    return os.path.join(ARCHIVE_DIR, f'courses_{semester}.db')
+
+def _ensure_sqlite_table(cursor):
+    """在 ATTACH 為 archive 的封存檔案中建立與 courses 相同結構的表格"""
+    cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'courses'")
+    if cursor.fetchone():
+        return
+    cursor.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'courses'")
+    create_sql = _scalar(cursor.fetchone())
+    cursor.execute(create_sql.replace('courses', 'archive.courses', 1))
+    cursor.execute('CREATE INDEX archive.idx_courses_semester ON courses(semester)')
+    cursor.execute('CREATE INDEX archive.idx_courses_code_semester ON courses(course_code, semester)')
+
+# ========================================
+# 查詢
+# ========================================
+def list_archived(conn):
+    """回傳 {學期: 課程數}"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT semester, course_count FROM archived_semesters ORDER BY semester DESC')
+    rows = cursor.fetchall()
+    cursor.close()
+    return {row['semester']: row['course_count'] for row in rows}
+
+def attach_archives(conn, semesters):
+    """
+    SQLite: ATTACH 封存資料庫檔案，建立暫存 view courses_archive / courses_all
+    (每個連線只需呼叫一次；PostgreSQL 上這兩者是實體表格/view，不需要呼叫)
+    尚未合併的舊版學期檔案也一併 ATTACH (init_db 會先合併，正常情況下沒有)
+    """
+    selects = []
+    if semesters and os.path.exists(sqlite_path()):
+        conn.execute('ATTACH DATABASE ? AS archive', (sqlite_path(),))
+        selects.append('SELECT * FROM archive.courses')
+    for semester in sorted(semesters):
+        _check_semester(semester)
+        if os.path.exists(legacy_sqlite_path(semester)):
+            conn.execute(f'ATTACH DATABASE ? AS archive_{semester}', (legacy_sqlite_path(semester),))
+            selects.append(f'SELECT * FROM archive_{semester}.courses')
+    archive_sql = ' UNION ALL '.join(selects) or 'SELECT * FROM main.courses WHERE 0'
+    conn.execute(f'CREATE TEMP VIEW courses_archive AS {archive_sql}')
+    conn.execute('CREATE TEMP VIEW courses_all AS SELECT * FROM main.courses UNION ALL SELECT * FROM courses_archive')
+
+# ========================================
+# 舊版封存檔案合併
+# ========================================
+def consolidate_sqlite(conn, log=print):
+    """SQLite: 將舊版每個學期一個的封存檔案 (courses_<學期>.db) 合併到 courses_archive.db"""
+    legacy = [semester for semester in list_archived(conn) if os.path.exists(legacy_sqlite_path(semester))]
+    if not legacy:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute('ATTACH DATABASE ? AS archive', (sqlite_path(),))
+    try:
+        _ensure_sqlite_table(cursor)
+        conn.commit()
+        for semester in legacy:
+            _check_semester(semester)
+            cursor.execute(f'ATTACH DATABASE ? AS archive_{semester}', (legacy_sqlite_path(semester),))
+            try:
+                cursor.execute('DELETE FROM archive.courses WHERE semester = ?', (semester,))
+                cursor.execute(f'INSERT INTO archive.courses SELECT * FROM archive_{semester}.courses')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.execute(f'DETACH DATABASE archive_{semester}')
+            os.remove(legacy_sqlite_path(semester))
+            log(f"學期 {semester} 的封存檔案已合併到 {sqlite_path()}")
+    finally:
+        cursor.execute('DETACH DATABASE archive')
+        cursor.close()
+    return len(legacy)
+
+# ========================================
+# 封存
+# ========================================
+def archive_semester(conn, use_postgres, semester, log=print):
+    """將學期的課程移到冷儲存，回傳移動筆數 (選課記錄保留)"""
+    _check_semester(semester)
+    cursor = conn.cursor()
+    placeholder = '%s' if use_postgres else '?'
+
+    if not use_postgres:
+        consolidate_sqlite(conn, log)
+    cursor.execute(f'SELECT 1 FROM archived_semesters WHERE semester = {placeholder}', (semester,))
+    if cursor.fetchone():
+        raise ArchiveError(f'學期 {semester} 已封存')
+    cursor.execute(f'SELECT COUNT(*) FROM courses WHERE semester = {placeholder}', (semester,))
+    count = _scalar(cursor.fetchone())
+    if not count:
+        raise ArchiveError(f'學期 {semester} 沒有課程')
+
+    try:
+        if use_postgres:
+            tablespace = f' TABLESPACE {ARCHIVE_TABLESPACE}' if ARCHIVE_TABLESPACE else ''
+            cursor.execute(
+                f"CREATE TABLE courses_archive_{semester} PARTITION OF courses_archive "
+                f"FOR VALUES IN ('{semester}'){tablespace}"
+            )
+            cursor.execute('INSERT INTO courses_archive SELECT * FROM courses WHERE semester = %s', (semester,))
+            cursor.execute('DELETE FROM courses WHERE semester = %s', (semester,))
+        else:
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+            cursor.execute('ATTACH DATABASE ? AS archive', (sqlite_path(),))
+            _ensure_sqlite_table(cursor)
+            # 上次封存失敗留下的資料
+            cursor.execute('DELETE FROM archive.courses WHERE semester = ?', (semester,))
+            cursor.execute('INSERT INTO archive.courses SELECT * FROM main.courses WHERE semester = ?', (semester,))
+            cursor.execute('DELETE FROM main.courses WHERE semester = ?', (semester,))
+
+        cursor.execute(
+            f'INSERT INTO archived_semesters (semester, course_count) VALUES ({placeholder}, {placeholder})',
+            (semester, count)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if not use_postgres:
+            cursor.execute('DETACH DATABASE archive')
+        cursor.close()
+
+    if not use_postgres:
+        # 釋放 courses 表空間，讓熱資料檔案維持精簡
+        conn.execute('VACUUM')
+    log(f"學期 {semester} 已封存 ({count} 筆課程)")
+    return count
+
+def restore_semester(conn, use_postgres, semester, log=print):
+    """將封存的學期移回 courses，回傳移動筆數"""
+    _check_semester(semester)
+    cursor = conn.cursor()
+    placeholder = '%s' if use_postgres else '?'
+
+    if not use_postgres:
+        consolidate_sqlite(conn, log)
+    cursor.execute(f'SELECT 1 FROM archived_semesters WHERE semester = {placeholder}', (semester,))
+    if not cursor.fetchone():
+        raise ArchiveError(f'學期 {semester} 未封存')
+
+    try:
+        if use_postgres:
+            cursor.execute(f'INSERT INTO courses SELECT * FROM courses_archive_{semester}')
+            count = cursor.rowcount
+            cursor.execute(f'DROP TABLE courses_archive_{semester}')
+        else:
+            cursor.execute('ATTACH DATABASE ? AS archive', (sqlite_path(),))
+            cursor.execute('INSERT INTO main.courses SELECT * FROM archive.courses WHERE semester = ?', (semester,))
+            count = cursor.rowcount
+            cursor.execute('DELETE FROM archive.courses WHERE semester = ?', (semester,))
+        cursor.execute(f'DELETE FROM archived_semesters WHERE semester = {placeholder}', (semester,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if not use_postgres:
+            cursor.execute('DETACH DATABASE archive')
+        cursor.close()
+
+    log(f"學期 {semester} 已還原 ({count} 筆課程)")
+    return count
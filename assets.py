@@ -0,0 +1,184 @@
+# ==========================================================
+# 北護課程查詢系統 - 靜態資源 (CSS / JS) 打包
+# static/ 中的 CSS、JS 經過精簡後以內容雜湊命名 (例如 css/admin.3f2a1b9c.css)，
+# 另外預先產生 gzip (安裝 brotli 時加上 br) 壓縮檔，存放在 static/dist/
+# 模板以 asset_url() 取得雜湊後的網址；檔名隨內容改變，因此可以設定一年的 immutable 快取，
+# 重新整理頁面時瀏覽器不必再請求或驗證這些檔案
+# 來源檔案修改後 (比對修改時間與大小) 下次取得網址時自動重新打包
+# ==========================================================
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # 未安裝 brotli 時只產生 gzip
+    brotli = None
+
+# 打包的副檔名
+ASSET_EXTENSIONS = ('.css', '.js')
+
+# 雜湊取前幾碼放進檔名
+HASH_LENGTH = 12
+
+# 預先壓縮的格式: Content-Encoding -> 副檔名
+ENCODINGS = {'br': '.br', 'gzip': '.gz'} if brotli is not None else {'gzip': '.gz'}
+
+# 檔名含雜湊，內容不會改變
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# ========================================
+# 精簡
+# ========================================
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+def minify_css(text):
+    """移除註解與多餘空白 (保守處理，不改寫選擇器與屬性值)"""
+    text = _CSS_COMMENT.sub('', text)
+    text = _CSS_SPACE.sub(' ', text)
+    text = _CSS_PUNCTUATION.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+def minify_js(text):
+    """
+    移除每行前後空白、空白行與整行的 // 註解 (保守處理: 保留換行，不影響自動補分號)
+    多行樣板字串 (`...`) 內的行保持原樣
+    """
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        # 以未跳脫的反引號數量判斷下一行是否仍在樣板字串內
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+# ========================================
+# 打包
+# ========================================
+class AssetManifest:
+    """
+    原始路徑 (相對於 static/) -> 雜湊後路徑 (相對於 static/dist/) 的對照表
+    manifest.json 記錄來源檔案的修改時間與大小，多個 worker 行程共用打包結果
+    """
+
+    def __init__(self, static_dir, dist_dir=None):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir or os.path.join(static_dir, 'dist')
+        self.manifest_path = os.path.join(self.dist_dir, 'manifest.json')
+        self._lock = threading.Lock()
+        self.entries = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        tmp_path = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _write(self, relative_path, data):
+        path = os.path.join(self.dist_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _build_file(self, filename, stat):
+        """精簡、計算雜湊並寫入原始與預先壓縮的檔案，回傳 manifest 項目"""
+        source = os.path.join(self.static_dir, filename)
+        stem, ext = os.path.splitext(filename)
+        with open(source, encoding='utf-8') as f:
+            text = f.read()
+        data = MINIFIERS[ext](text).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        hashed = f'{stem}.{digest}{ext}'.replace(os.sep, '/')
+
+        self._write(hashed, data)
+        self._write(hashed + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            self._write(hashed + '.br', brotli.compress(data))
+
+        old = self.entries.get(filename)
+        if old and old['path'] != hashed:
+            self._remove(old['path'])
+        return {'path': hashed, 'mtime': stat.st_mtime, 'size': stat.st_size,
+                'source_bytes': len(text.encode('utf-8')), 'bytes': len(data)}
+
+    def _remove(self, hashed):
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(os.path.join(self.dist_dir, hashed + suffix))
+            except OSError:
+                pass
+
+    def _sources(self):
+        for root, dirs, files in os.walk(self.static_dir):
+            if os.path.abspath(root).startswith(os.path.abspath(self.dist_dir)):
+                dirs[:] = []
+                continue
+            for name in sorted(files):
+                if name.endswith(ASSET_EXTENSIONS):
+                    yield os.path.relpath(os.path.join(root, name), self.static_dir).replace(os.sep, '/')
+
+    def build(self, force=False):
+        """打包 static/ 中所有 CSS、JS (未改變的檔案略過)，回傳 manifest"""
+        with self._lock:
+            for filename in self._sources():
+                self._refresh(filename, force)
+            self._write_manifest()
+        return self.entries
+
+    def _refresh(self, filename, force=False):
+        """來源檔案改變時重新打包，回傳是否重新打包"""
+        stat = os.stat(os.path.join(self.static_dir, filename))
+        entry = self.entries.get(filename)
+        if (not force and entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+                and os.path.exists(os.path.join(self.dist_dir, entry['path']))):
+            return False
+        self.entries[filename] = self._build_file(filename, stat)
+        return True
+
+    def lookup(self, filename):
+        """回傳雜湊後路徑 (來源檔案改變時先重新打包)；不是可打包的檔案時回傳 None"""
+        if not filename.endswith(ASSET_EXTENSIONS) or not os.path.isfile(os.path.join(self.static_dir, filename)):
+            return None
+        with self._lock:
+            if self._refresh(filename):
+                self._write_manifest()
+            return self.entries[filename]['path']
+
+    def resolve(self, hashed, accept_encoding=''):
+        """
+        雜湊後路徑 -> (實際檔案路徑, Content-Encoding 或 None)；不在 manifest 中時回傳 None
+        依 Accept-Encoding 選擇預先壓縮的檔案
+        """
+        if hashed not in {entry['path'] for entry in self.entries.values()}:
+            self.entries = self._read_manifest()  # 其他 worker 可能剛重新打包
+            if hashed not in {entry['path'] for entry in self.entries.values()}:
+                return None
+        path = os.path.join(self.dist_dir, hashed)
+        accepted = {value.split(';')[0].strip() for value in accept_encoding.lower().split(',')}
+        for encoding, suffix in ENCODINGS.items():
+            if encoding in accepted and os.path.exists(path + suffix):
+                return path + suffix, encoding
+        return path, None
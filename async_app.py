@@ -0,0 +1,244 @@
+# ==========================================================
+# 北護課程查詢系統 - 非同步服務模式 (ASGI)
+# 熱門唯讀端點改用 asyncpg 連線池處理，其餘路由仍交給原本的 Flask app
+# 啟動: gunicorn async_app:app -k uvicorn.workers.UvicornWorker
+#       (本地: uvicorn async_app:app --port 5000)
+# ==========================================================
+
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, DATABASE_URL, USE_POSTGRES, DEFAULT_DEPARTMENTS,
+    build_course_search, build_enrollment_query, build_course_history_query, group_course_history,
+    execute_query, course_catalog, search_course_rows, archived_semesters, course_source, course_search_source,
+    seat_feed, seat_stream_courses, SEAT_STREAM_HEARTBEAT, SEAT_STREAM_HEADERS, rate_limiter, db_admission,
+    PROXY_HOPS
+)
+import ratelimit
+import seats
+
+if USE_POSTGRES:
+    import asyncpg
+
+# 名額推送由本服務的 seat_stream 處理 (連線只是等待中的協程，不佔用 worker)
+flask_app.config['SEAT_STREAM'] = True
+
+# 非同步連線池大小
+ASYNC_POOL_MIN = int(os.environ.get('ASYNC_POOL_MIN', 2))
+ASYNC_POOL_MAX = int(os.environ.get('ASYNC_POOL_MAX', 20))
+
+_pool = None
+
+# ========================================
+# 資料庫存取
+# ========================================
+def to_asyncpg(query):
+    """將 ? 佔位符轉換為 asyncpg 的 $1, $2, ..."""
+    counter = iter(range(1, query.count('?') + 1))
+    return re.sub(r'\?', lambda _: f'${next(counter)}', query)
+
+async def fetch(query, params=(), archive_views=False):
+    """
+    執行查詢並回傳 dict 列表 (SQLite 沒有非同步驅動，改在執行緒池執行)
+    archive_views: 查詢封存學期 (PostgreSQL 上是實體表格，只有 SQLite 需要)
+    """
+    if USE_POSTGRES:
+        started = time.perf_counter()
+        async with _pool.acquire() as conn:
+            rows = await conn.fetch(to_asyncpg(query), *params)
+        db_admission.record(time.perf_counter() - started)
+        return [dict(row) for row in rows]
+    return await run_in_threadpool(execute_query, query, params, fetch=True, archive_views=archive_views)
+
+async def fetchone(query, params=(), archive_views=False):
+    rows = await fetch(query, params, archive_views)
+    return rows[0] if rows else None
+
+@asynccontextmanager
+async def lifespan(_app):
+    global _pool
+    if USE_POSTGRES:
+        _pool = await asyncpg.create_pool(DATABASE_URL, min_size=ASYNC_POOL_MIN, max_size=ASYNC_POOL_MAX)
+        print(f"[async_app] asyncpg 連線池建立完成 ({ASYNC_POOL_MIN}~{ASYNC_POOL_MAX})")
+    else:
+        print("[async_app] SQLite 模式，查詢在執行緒池執行")
+    yield
+    if _pool is not None:
+        await _pool.close()
+
+# ========================================
+# 共用工具
+# ========================================
+def json_response(data, status_code=200):
+    """與 Flask jsonify 相同的 JSON 格式 (日期、排序、非 ASCII 字元)"""
+    body = flask_app.json.dumps(data, separators=(',', ':')) + '\n'
+    return Response(body, status_code=status_code, media_type='application/json')
+
+async def load_session(request):
+    """由 Flask 的伺服器端 session 取得登入狀態，讓兩種模式共用登入"""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    _sid, data = await run_in_threadpool(flask_app.session_interface.load, flask_app, cookie)
+    return data or {}
+
+def client_address(request):
+    """與 Flask 的 ProxyFix 相同: 經過 PROXY_HOPS 層反向代理時，取 X-Forwarded-For 倒數第 PROXY_HOPS 個位址"""
+    if PROXY_HOPS:
+        forwarded = [value.strip() for value in request.headers.get('x-forwarded-for', '').split(',') if value.strip()]
+        if len(forwarded) >= PROXY_HOPS:
+            return forwarded[-PROXY_HOPS]
+    return request.client.host if request.client else ''
+
+async def admit(request, budget):
+    """與 Flask 的 rate_limited 相同的流量限制 (權杖桶在執行緒池更新)，回傳 Admission"""
+    user_id = (await load_session(request)).get('user_id')
+    client = f'user:{user_id}' if user_id else f'ip:{client_address(request)}'
+    return await run_in_threadpool(rate_limiter.admit, budget, client)
+
+async def rate_limit_exceeded(request, exc):
+    response = json_response({'success': False, 'message': exc.message}, status_code=429)
+    response.headers['Retry-After'] = str(exc.retry_after)
+    return response
+
+# ========================================
+# API: 取得系所列表
+# ========================================
+async def get_departments(request):
+    departments = await fetch(
+        'SELECT DISTINCT department FROM courses WHERE department IS NOT NULL ORDER BY department'
+    )
+    dept_list = [d['department'] for d in departments] or DEFAULT_DEPARTMENTS
+    return json_response({'success': True, 'departments': dept_list})
+
+# ========================================
+# API: 取得學期列表
+# ========================================
+async def get_semesters(request):
+    semesters = await fetch(
+        'SELECT DISTINCT semester FROM courses WHERE semester IS NOT NULL ORDER BY semester DESC'
+    )
+    archived = await run_in_threadpool(archived_semesters)
+    semester_list = sorted({s['semester'] for s in semesters} | set(archived), reverse=True)
+    return json_response({'success': True, 'semesters': semester_list})
+
+# ========================================
+# API: 搜尋課程
+# ========================================
+async def search_courses(request):
+    with await admit(request, 'search'):
+        return await _search_courses(request)
+
+async def _search_courses(request):
+    source = await run_in_threadpool(course_search_source, request.query_params)
+    if source != 'courses':
+        query, params = build_course_search(request.query_params, source)
+        courses = await fetch(query, params, archive_views=True)
+    elif course_catalog.columnar or request.query_params.get('sort') == 'relevance':
+        # 欄式引擎與相關度排序在記憶體中完成搜尋 (只有重新載入時會查詢資料庫)
+        courses = await run_in_threadpool(search_course_rows, request.query_params)
+    else:
+        query, params = build_course_search(request.query_params)
+        courses = await fetch(query, params)
+    return json_response({'success': True, 'items': courses, 'count': len(courses)})
+
+# ========================================
+# API: 取得單一課程
+# ========================================
+async def get_course(request):
+    course_id = request.path_params['course_id']
+    course = await fetchone('SELECT * FROM courses WHERE id = ?', (course_id,))
+    if not course and await run_in_threadpool(archived_semesters):
+        course = await fetchone('SELECT * FROM courses_archive WHERE id = ?', (course_id,), archive_views=True)
+    if course:
+        return json_response({'success': True, 'course': course})
+    return json_response({'success': False, 'message': '課程不存在'})
+
+# ========================================
+# API: 跨學期課程歷史
+# ========================================
+async def get_course_history(request):
+    course_code = request.path_params['course_code']
+    source = await run_in_threadpool(course_source, '', True)
+    query, params = build_course_history_query(course_code, source)
+    sections = await fetch(query, params, archive_views=source != 'courses')
+    return json_response({
+        'success': True,
+        'course_code': course_code,
+        'semesters': group_course_history(sections),
+        'count': len(sections)
+    })
+
+# ========================================
+# API: 取得收藏/預選清單
+# ========================================
+async def get_enrollments(request):
+    user_session = await load_session(request)
+    if 'user_id' not in user_session:
+        return json_response({'success': False, 'message': '請先登入'})
+
+    source = await run_in_threadpool(course_source, '', True)
+    query, params = build_enrollment_query(user_session['user_id'], request.query_params.get('status', ''), source)
+    enrollments = await fetch(query, params, archive_views=source != 'courses')
+    return json_response({'success': True, 'items': enrollments, 'count': len(enrollments)})
+
+# ========================================
+# API: 即時名額 (Server-Sent Events)
+# 每個連線只是一個等待 asyncio.Event 的協程，不佔用執行緒；
+# 名額由 worker 共用的 seat_feed 執行緒分送 (見 seats.py)，沒有連線上限
+# ========================================
+async def seat_stream(request):
+    user_session = await load_session(request)
+    course_ids = await run_in_threadpool(
+        seat_stream_courses, request.query_params.get('courses', ''), user_session.get('user_id')
+    )
+    if not course_ids:
+        return json_response({'success': False, 'message': '請指定課程'}, status_code=400)
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    subscription = await run_in_threadpool(
+        seat_feed.subscribe, course_ids, lambda: loop.call_soon_threadsafe(wake.set)
+    )
+
+    async def events():
+        try:
+            yield seats.RETRY_EVENT
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), SEAT_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield seats.HEARTBEAT_EVENT
+                    continue
+                wake.clear()
+                pending = seat_feed.drain(subscription)
+                if pending:
+                    yield seats.format_event(pending)
+        finally:
+            seat_feed.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers=SEAT_STREAM_HEADERS)
+
+# 只接手 GET 請求，其他方法與路徑由 Flask 處理
+app = Starlette(
+    routes=[
+        Route('/api/departments', get_departments, methods=['GET']),
+        Route('/api/semesters', get_semesters, methods=['GET']),
+        Route('/api/courses', search_courses, methods=['GET']),
+        Route('/api/courses/{course_id:int}', get_course, methods=['GET']),
+        Route('/api/courses/history/{course_code}', get_course_history, methods=['GET']),
+        Route('/api/enrollments', get_enrollments, methods=['GET']),
+        Route('/api/seats/stream', seat_stream, methods=['GET']),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+    exception_handlers={ratelimit.RateLimited: rate_limit_exceeded},
+)
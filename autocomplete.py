@@ -0,0 +1,62 @@
+# ==========================================================
+# 北護課程查詢系統 - 關鍵字自動完成
+# 課程名稱、授課教師、教室與課號依正規化後的字串排序，
+# 以二分搜尋找出前綴相符的範圍，再依課程數取前幾筆
+# ==========================================================
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+# 建議類型 -> 來源欄位
+SUGGEST_FIELDS = {
+    'course': 'course_name',
+    'instructor': 'instructor',
+    'classroom': 'classroom',
+    'code': 'course_code',
+}
+
+# 多位授課教師以逗號或頓號分隔
+_SPLIT_RE = re.compile(r'[,，、/]')
+
+def normalize(text):
+    """全形轉半形、英文轉小寫、去除前後空白"""
+    return unicodedata.normalize('NFKC', text).lower().strip()
+
+class PrefixIndex:
+    """單一學期 (或全部) 課程的前綴索引"""
+
+    def __init__(self, rows):
+        counts = Counter()
+        for row in rows:
+            for kind, field in SUGGEST_FIELDS.items():
+                value = row.get(field)
+                if not value:
+                    continue
+                parts = _SPLIT_RE.split(value) if kind == 'instructor' else [value]
+                for part in parts:
+                    part = part.strip()
+                    if part:
+                        counts[(part, kind)] += 1
+
+        entries = sorted((normalize(text), text, kind, count) for (text, kind), count in counts.items())
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def suggest(self, prefix, limit=10):
+        """回傳前綴相符、課程數最多的 limit 筆建議"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', lo=start)
+        best = heapq.nsmallest(
+            limit, range(start, end),
+            key=lambda i: (-self.entries[i][3], len(self.entries[i][0]), self.entries[i][0])
+        )
+        return [
+            {'text': self.entries[i][1], 'type': self.entries[i][2], 'count': self.entries[i][3]}
+            for i in best
+        ]
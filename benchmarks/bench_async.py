@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 同步 / 非同步服務模式壓力測試
+以大量並行連線對兩個已啟動的伺服器發送相同的唯讀請求，比較吞吐量與延遲
+
+使用方法:
+    gunicorn app:app -w 4 -b 127.0.0.1:5000
+    gunicorn async_app:app -w 4 -k uvicorn.workers.UvicornWorker -b 127.0.0.1:5001
+    python benchmarks/bench_async.py http://127.0.0.1:5000 http://127.0.0.1:5001 [並行數] [總請求數]
+"""
+
+import http.client
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+PATHS = [
+    '/api/courses?semester=1142',
+    '/api/courses?keyword=%E8%AD%B7%E7%90%86',
+    '/api/courses?semester=1141&degree=%E5%9B%9B%E6%8A%80&weekday=1,3',
+    '/api/courses/1',
+    '/api/departments',
+    '/api/semesters',
+]
+
+def run(base_url, concurrency, total):
+    """回傳 (每秒請求數, 延遲列表 ms, 錯誤數)"""
+    parts = urlsplit(base_url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        local = []
+        for i in counter:
+            path = PATHS[i % len(PATHS)]
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise http.client.HTTPException(response.status)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, sorted(latencies), errors[0]
+
+def report(label, result):
+    rps, latencies, errors = result
+    if not latencies:
+        print(f"{label:<8} 全部失敗 ({errors} 個錯誤)")
+        return
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<8} {rps:8.1f} req/s   p50 {p50:8.1f} ms   p99 {p99:8.1f} ms   錯誤 {errors}")
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    sync_url, async_url = sys.argv[1], sys.argv[2]
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    total = int(sys.argv[4]) if len(sys.argv) > 4 else 5000
+
+    print("=" * 60)
+    print(f"同步 / 非同步壓力測試 (並行 {concurrency}，共 {total} 個請求)")
+    print("=" * 60)
+    report('同步', run(sync_url, concurrency, total))
+    report('非同步', run(async_url, concurrency, total))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 資料庫建立測試
+將目錄中的課程查詢 Excel 複製成多個學期 (模擬多年份的課程資料)，
+分別以循序與多行程方式執行 create_database，比較耗時並確認兩者的課程資料相同
+使用方法: python benchmarks/bench_create_database.py [學期數] [行程數]
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+import create_database  # noqa: E402
+
+TMP_DIR = Path(tempfile.mkdtemp(prefix='bench_create_database_'))
+
+def prepare_files(count):
+    """以專案目錄中的 Excel 為樣本，複製出 count 個學期的檔案"""
+    samples = sorted(create_database.SCRIPT_DIR.glob('*.xls')) + sorted(create_database.SCRIPT_DIR.glob('*.xlsx'))
+    if not samples:
+        sys.exit('❌ 找不到課程查詢 Excel 檔案')
+    for i in range(count):
+        sample = samples[i % len(samples)]
+        year, term = 100 + i // 2, i % 2 + 1
+        shutil.copy(sample, TMP_DIR / f'課程查詢_{year}{term}{sample.suffix}')
+
+def build(jobs):
+    """回傳 (秒數, 課程資料)"""
+    create_database.UPLOAD_DIR = TMP_DIR
+    create_database.DB_PATH = TMP_DIR / f'bench_{jobs}.db'
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_database.main(jobs)
+    elapsed = time.perf_counter() - start
+    conn = sqlite3.connect(create_database.DB_PATH)
+    rows = conn.execute(f"SELECT id, {', '.join(create_database.COURSE_COLUMNS)} FROM courses ORDER BY id").fetchall()
+    conn.close()
+    return elapsed, rows
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    prepare_files(count)
+
+    print("=" * 60)
+    print(f"資料庫建立測試 ({count} 個學期檔案，CPU 核心數 {os.cpu_count()})")
+    print("=" * 60)
+    sequential, expected = build(1)
+    print(f"循序處理        {sequential:6.2f} 秒  ({len(expected)} 筆課程)")
+    parallel, rows = build(jobs)
+    print(f"{jobs} 個行程        {parallel:6.2f} 秒  (加速 {sequential / parallel:.2f} 倍)")
+    print(f"課程資料{'相同' if rows == expected else '不同 ❌'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 匯出串流測試
+在暫存的 SQLite 資料庫建立大量選課記錄，下載 /api/export/enrollments，
+量測第一個區塊的回應時間、總時間與 Python 記憶體高峰 (tracemalloc)
+使用方法: python benchmarks/bench_export.py [選課記錄數]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+TMP_DIR = tempfile.mkdtemp(prefix='bench_export_')
+os.environ.setdefault('SESSION_DB_PATH', os.path.join(TMP_DIR, 'sessions.db'))
+
+import app  # noqa: E402
+import migrations  # noqa: E402
+
+COURSE_COUNT = 2000
+
+def setup_database(enrollments):
+    """建立暫存資料庫：COURSE_COUNT 門課、每位學生 20 筆選課記錄"""
+    path = os.path.join(TMP_DIR, 'bench.db')
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn, use_postgres=False, log=lambda msg: None)
+    conn.executemany(
+        'INSERT INTO courses (semester, department, course_code, course_name, instructor, day_time) VALUES (?, ?, ?, ?, ?, ?)',
+        [('1141', '護理系', f'C{i:06d}', f'測試課程{i}', '測試教師', '週一 1-2') for i in range(COURSE_COUNT)]
+    )
+    students = max(1, enrollments // 20)
+    conn.executemany(
+        'INSERT INTO users (username, password, role, name, student_id) VALUES (?, ?, ?, ?, ?)',
+        [(f'bench{i}', 'x', 'student', f'學生{i}', f'S{i:07d}') for i in range(students)]
+    )
+    conn.execute("INSERT INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
+    conn.executemany(
+        'INSERT INTO enrollments (user_id, course_id, status) VALUES (?, ?, ?)',
+        ((i // 20 + 1, (i * 7919) % COURSE_COUNT + 1, 'favorite') for i in range(enrollments))
+    )
+    conn.commit()
+    conn.close()
+    app.DATABASE = path
+
+def download(client, fmt):
+    """回傳 (第一個區塊秒數, 總秒數, 位元組數)"""
+    start = time.perf_counter()
+    response = client.get(f'/api/export/enrollments?format={fmt}', buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks))
+    first = time.perf_counter() - start
+    for chunk in chunks:
+        size += len(chunk)
+    total = time.perf_counter() - start
+    response.close()
+    return first, total, size
+
+def peak_memory(client, fmt):
+    """再下載一次量測記憶體高峰 (tracemalloc 會拖慢速度，與計時分開)"""
+    tracemalloc.start()
+    download(client, fmt)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def main():
+    enrollments = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    setup_database(enrollments)
+
+    client = app.app.test_client()
+    client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+
+    print("=" * 60)
+    print(f"匯出串流測試 ({enrollments} 筆選課記錄)")
+    print("=" * 60)
+    for fmt in ('csv', 'xlsx'):
+        first, total, size = download(client, fmt)
+        peak = peak_memory(client, fmt)
+        print(f"{fmt:<5} 第一個區塊 {first * 1000:7.1f} ms   總時間 {total:6.2f} s   "
+              f"大小 {size / 1024 / 1024:6.1f} MB   記憶體高峰 {peak / 1024 / 1024:5.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 登入吞吐量測試
+在暫存的 SQLite 資料庫建立已雜湊密碼的帳號，以多個執行緒同時呼叫 /api/login，
+量測目前雜湊成本 (PASSWORD_HASH_METHOD) 下每秒可處理的登入數
+使用方法: python benchmarks/bench_login.py [並行數] [總登入數]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+TMP_DIR = tempfile.mkdtemp(prefix='bench_login_')
+os.environ.setdefault('SESSION_DB_PATH', os.path.join(TMP_DIR, 'sessions.db'))
+
+import app  # noqa: E402
+import migrations  # noqa: E402
+import passwords  # noqa: E402
+
+USER_COUNT = 50
+
+def setup_database():
+    """建立暫存資料庫與測試帳號"""
+    path = os.path.join(TMP_DIR, 'bench.db')
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn, use_postgres=False, log=lambda msg: None)
+    hashed = passwords.hash_password('pass123')
+    conn.executemany(
+        'INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
+        [(f'bench{i}', hashed, 'student') for i in range(USER_COUNT)]
+    )
+    conn.commit()
+    conn.close()
+    app.DATABASE = path
+
+def run(concurrency, total):
+    counter = iter(range(total))
+    failures = [0]
+    lock = threading.Lock()
+
+    def worker():
+        client = app.app.test_client()
+        for i in counter:
+            response = client.post('/api/login', json={'username': f'bench{i % USER_COUNT}', 'password': 'pass123'})
+            if response.status_code != 200 or not response.json['success']:
+                with lock:
+                    failures[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return total / (time.perf_counter() - start), failures[0]
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    setup_database()
+
+    start = time.perf_counter()
+    passwords.verify_password(passwords.hash_password('pass123'), 'pass123')
+    single = (time.perf_counter() - start) * 1000 / 2
+
+    print("=" * 60)
+    print(f"登入吞吐量測試 ({passwords.PASSWORD_HASH_METHOD})")
+    print(f"雜湊執行緒: {passwords.HASH_WORKERS}，佇列上限: {passwords.HASH_QUEUE_LIMIT}")
+    print("=" * 60)
+    print(f"單次雜湊約 {single:.1f} ms")
+    for level in sorted({1, passwords.HASH_WORKERS, concurrency}):
+        rate, failures = run(level, total)
+        print(f"並行 {level:>4}: {rate:8.1f} 次登入/秒   失敗 {failures}")
+
+if __name__ == '__main__':
+    main()
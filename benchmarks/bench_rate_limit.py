@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 流量限制與准入控制測試
+以暫存資料庫啟動 gunicorn (停用 / 啟用流量限制各一次)，模擬瀏覽尖峰:
+- 多個瀏覽用戶端 (不同 IP，以 X-Forwarded-For 指定) 不停送出不加篩選的課程搜尋
+- 同時一個已登入的學生每秒送出數次選課請求，記錄選課的延遲 (p50 / p99 / 最大值)
+比較兩次的選課延遲，以及瀏覽請求成功與被拒絕 (429) 的數量
+使用方法: python benchmarks/bench_rate_limit.py [瀏覽執行緒數] [秒數] [資料庫延遲目標 ms]
+"""
+
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent.resolve()
+PORT = 5077
+# 每個瀏覽執行緒輪流使用的 IP 數 (每個 IP 的請求速度低於額度，只有准入控制會拒絕)
+IPS_PER_THREAD = 200
+# 選課請求間隔 (秒)
+ENROLL_INTERVAL = 0.2
+
+def start_server(tmp_dir, enabled, target_ms):
+    env = dict(os.environ, RATE_LIMIT_ENABLED='1' if enabled else '0', DB_LATENCY_TARGET_MS=str(target_ms),
+               PROXY_HOPS='1', SESSION_DB_PATH=os.path.join(tmp_dir, f'sessions_{int(enabled)}.db'),
+               PARSE_CACHE_DIR=os.path.join(tmp_dir, 'parse_cache'))
+    env.pop('DATABASE_URL', None)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', str(ROOT / 'gunicorn.conf.py'),
+         '-w', '2', '-b', f'127.0.0.1:{PORT}', '--pythonpath', str(ROOT)],
+        cwd=tmp_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', PORT), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit('❌ gunicorn 無法啟動')
+
+def request(conn, method, path, body=None, headers=None):
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={'Content-Type': 'application/json', **(headers or {})})
+    response = conn.getresponse()
+    response.read()
+    return response
+
+def browse(index, stop, counts, lock):
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=30)
+    ok = rejected = 0
+    i = 0
+    while not stop.is_set():
+        ip = f'10.{index}.{i % IPS_PER_THREAD // 250}.{i % IPS_PER_THREAD % 250}'
+        i += 1
+        try:
+            status = request(conn, 'GET', '/api/courses', headers={'X-Forwarded-For': ip}).status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=30)
+            continue
+        if status == 429:
+            rejected += 1
+            time.sleep(0.05)
+        else:
+            ok += 1
+    conn.close()
+    with lock:
+        counts['ok'] += ok
+        counts['rejected'] += rejected
+
+def enroll(stop, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=30)
+    response = request(conn, 'POST', '/api/login', {'username': 'student1', 'password': 'pass123'},
+                       headers={'X-Forwarded-For': '192.168.0.1'})
+    cookie = response.getheader('Set-Cookie').split(';')[0]
+    statuses = ['favorite', 'enrolled']
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        request(conn, 'POST', '/api/enroll', {'course_id': 1 + i % 5, 'status': statuses[i % 2]},
+                headers={'Cookie': cookie, 'X-Forwarded-For': '192.168.0.1'})
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+        time.sleep(max(0, ENROLL_INTERVAL - (time.perf_counter() - start)))
+    conn.close()
+
+def run(tmp_dir, enabled, threads, seconds, target_ms):
+    process = start_server(tmp_dir, enabled, target_ms)
+    try:
+        stop = threading.Event()
+        counts = {'ok': 0, 'rejected': 0}
+        latencies = []
+        lock = threading.Lock()
+        workers = [threading.Thread(target=browse, args=(i, stop, counts, lock)) for i in range(threads)]
+        workers.append(threading.Thread(target=enroll, args=(stop, latencies)))
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+    finally:
+        process.terminate()
+        process.wait()
+    return counts, sorted(latencies)
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    target_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 100
+    tmp_dir = tempfile.mkdtemp(prefix='bench_rate_limit_')
+    shutil.copy(ROOT / 'database.db', os.path.join(tmp_dir, 'database.db'))
+    print(f"瀏覽執行緒 {threads} 個 (不加篩選的課程搜尋)，選課每 {ENROLL_INTERVAL * 1000:.0f} ms 一次，"
+          f"{seconds:.0f} 秒，資料庫延遲目標 {target_ms:.0f} ms\n")
+    try:
+        for enabled in (False, True):
+            counts, latencies = run(tmp_dir, enabled, threads, seconds, target_ms)
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{'啟用限制' if enabled else '停用限制'}  選課 {len(latencies):4d} 次  p50 {p50:7.1f} ms  "
+                  f"p99 {p99:7.1f} ms  最大 {latencies[-1]:7.1f} ms   "
+                  f"瀏覽成功 {counts['ok']:5d} 次  拒絕 (429) {counts['rejected']:5d} 次")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
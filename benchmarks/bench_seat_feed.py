@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 即時名額推播測試
+在暫存的 SQLite 資料庫 (複製 database.db) 建立大量本機訂閱者，每個訂閱者與 async_app 的
+/api/seats/stream 相同 (asyncio.Event + call_soon_threadsafe)，另一個執行緒持續寫入選課記錄:
+- 資料庫查詢次數: 只由單一 SeatFeed 執行緒查詢，與訂閱者數量無關
+- 延遲: 寫入提交到訂閱者收到名額的時間 (p50 / p95 / 最大值)
+- CPU: 整個行程的 CPU 時間 (每秒、每則送出的名額)
+- 記憶體 (tracemalloc): 每個訂閱者的用量；一半的訂閱者從不讀取 (模擬很慢的連線)，
+  寫入分成兩半，後一半寫入後記憶體不再增加 (每個訂閱者最多保留訂閱課程數的名額)
+使用方法: python benchmarks/bench_seat_feed.py [訂閱者數] [每人訂閱課程數] [寫入次數]
+"""
+
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+TMP_DIR = tempfile.mkdtemp(prefix='bench_seat_feed_')
+os.environ.setdefault('SESSION_DB_PATH', os.path.join(TMP_DIR, 'sessions.db'))
+
+import app  # noqa: E402
+import migrations  # noqa: E402
+import seats  # noqa: E402
+
+# 寫入速度 (每秒選課記錄數) 與 SeatFeed 讀取間隔
+WRITE_RATE = 200
+POLL_INTERVAL = 0.2
+# 訂閱集中在前 HOT_COURSES 門課 (熱門課程，多人同時訂閱)
+HOT_COURSES = 300
+
+def setup_database():
+    path = os.path.join(TMP_DIR, 'bench.db')
+    shutil.copy(ROOT / 'database.db', path)
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn, use_postgres=False, log=lambda msg: None)
+    conn.execute('DELETE FROM enrollments')
+    conn.commit()
+    course_ids = [row[0] for row in conn.execute('SELECT id FROM courses ORDER BY id LIMIT ?', (HOT_COURSES,))]
+    conn.close()
+    app.DATABASE = path
+    return path, course_ids
+
+class CountingFeed(seats.SeatFeed):
+    """記錄資料庫查詢次數"""
+
+    def __init__(self):
+        self.queries = 0
+        super().__init__(self._load_changes, self._count_seats, interval=POLL_INTERVAL)
+
+    def _load_changes(self, after_id):
+        self.queries += 1
+        return app.load_seat_changes(after_id)
+
+    def _count_seats(self, course_ids):
+        self.queries += 1
+        return app.count_seats(course_ids)
+
+def write_enrollments(path, course_ids, first_user, count, committed):
+    """以固定速度寫入選課記錄，記錄每門課最後一次提交的時間"""
+    conn = sqlite3.connect(path)
+    rng = random.Random(first_user)
+    interval = 1 / WRITE_RATE
+    next_write = time.perf_counter()
+    for user_id in range(first_user, first_user + count):
+        course_id = rng.choice(course_ids)
+        conn.execute(
+            "INSERT INTO enrollments (user_id, course_id, status) VALUES (?, ?, 'enrolled')",
+            (user_id, course_id)
+        )
+        conn.commit()
+        committed[course_id] = time.perf_counter()
+        next_write += interval
+        time.sleep(max(0, next_write - time.perf_counter()))
+    conn.close()
+
+async def run(subscriber_count, courses_per_subscriber, writes, trace_memory):
+    path, course_ids = setup_database()
+    feed = CountingFeed()
+    loop = asyncio.get_running_loop()
+    rng = random.Random(0)
+    latencies = []
+    received = [0]
+    committed = {}
+
+    if trace_memory:
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+
+    async def subscriber(subscription, wake, reads):
+        # reads=False: 從不讀取 (pending 只保留每門課最新的名額)
+        try:
+            while True:
+                await wake.wait()
+                wake.clear()
+                if not reads:
+                    continue
+                pending = feed.drain(subscription)
+                received[0] += len(pending)
+                if trace_memory:  # 量測記憶體時不保留延遲紀錄
+                    continue
+                now = time.perf_counter()
+                for course_id in pending:
+                    if course_id in committed:
+                        latencies.append((now - committed[course_id]) * 1000)
+        finally:
+            feed.unsubscribe(subscription)
+
+    tasks = []
+    for i in range(subscriber_count):
+        wake = asyncio.Event()
+        subscription = feed.subscribe(
+            rng.sample(course_ids, courses_per_subscriber), lambda wake=wake: loop.call_soon_threadsafe(wake.set)
+        )
+        tasks.append(asyncio.create_task(subscriber(subscription, wake, reads=i % 2 == 0)))
+    await asyncio.sleep(0.1)
+    subscribed = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+    queries_before = feed.queries
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    memory = []
+    for half in range(2):
+        await asyncio.to_thread(write_enrollments, path, course_ids, 100000 + half * writes, writes // 2, committed)
+        await asyncio.sleep(POLL_INTERVAL * 3)  # 等最後的變更送出
+        memory.append(tracemalloc.get_traced_memory()[0] if trace_memory else 0)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    if trace_memory:
+        tracemalloc.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        'queries': feed.queries - queries_before,
+        'wall': wall,
+        'cpu': cpu,
+        'received': received[0],
+        'latencies': sorted(latencies),
+        'per_subscriber': (subscribed - before) / subscriber_count,
+        'subscribed': subscribed - before,
+        'half': memory[0] - before,
+        'after': memory[1] - before,
+        'peak': peak - before,
+    }
+
+def main():
+    subscriber_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    courses_per_subscriber = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    writes = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    print(f"訂閱者 {subscriber_count} 個 (一半從不讀取)，每人 {courses_per_subscriber} 門課，"
+          f"寫入 {writes} 筆選課記錄 ({WRITE_RATE} 筆/秒)\n")
+
+    try:
+        result = asyncio.run(run(subscriber_count, courses_per_subscriber, writes, trace_memory=False))
+        latencies = result['latencies']
+        print(f"資料庫查詢   {result['queries']} 次 ({result['queries'] / result['wall']:.1f} 次/秒，與訂閱者數無關)")
+        print(f"送出名額     {result['received']} 則 (讀取的訂閱者)")
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"延遲         p50 {p50:.0f} ms   p95 {p95:.0f} ms   最大 {latencies[-1]:.0f} ms"
+                  f" (讀取間隔 {POLL_INTERVAL * 1000:.0f} ms)")
+        print(f"CPU          {result['cpu']:.2f} 秒 / {result['wall']:.1f} 秒 "
+              f"({result['cpu'] / result['wall'] * 100:.0f}%，含寫入執行緒)   "
+              f"每則名額 {result['cpu'] / max(1, result['received']) * 1e6:.1f} µs")
+
+        memory = asyncio.run(run(subscriber_count, courses_per_subscriber, writes, trace_memory=True))
+        print(f"記憶體       訂閱後 {memory['subscribed'] / 1024 / 1024:.1f} MB "
+              f"(每個訂閱者 {memory['per_subscriber'] / 1024:.1f} KB)   "
+              f"寫入一半 {memory['half'] / 1024 / 1024:.1f} MB   全部寫入 {memory['after'] / 1024 / 1024:.1f} MB   "
+              f"峰值 {memory['peak'] / 1024 / 1024:.1f} MB")
+    finally:
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 冷啟動時間測試
+每次開新的 Python 行程 import app，量測 worker 冷啟動延遲
+使用方法: python benchmarks/bench_startup.py [次數]
+"""
+
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent.resolve()
+
+
+def measure(code, runs):
+    """執行 runs 次並回傳每次耗時 (毫秒)"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=PROJECT_DIR,
+                       check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    median = timings[len(timings) // 2]
+    print(f"{label:<28} 中位數 {median:8.1f} ms   最小 {timings[0]:8.1f} ms   最大 {timings[-1]:8.1f} ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    print("=" * 60)
+    print(f"冷啟動時間測試 (每項 {runs} 次)")
+    print("=" * 60)
+
+    report('python (空行程)', measure('pass', runs))
+    report('import app', measure('import app', runs))
+    report('import app + 載入 pandas', measure('import app; app.load_pandas()', runs))
+
+
+if __name__ == '__main__':
+    main()
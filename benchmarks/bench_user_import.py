@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 批次建立帳號測試
+在暫存的 SQLite 資料庫以 /api/users/import 匯入 N 個帳號的 CSV 名單
+(含格式錯誤與重複帳號)，量測驗證與寫入時間，再以 mode=update 重新匯入一次
+使用方法: python benchmarks/bench_user_import.py [帳號數]
+"""
+
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+TMP_DIR = tempfile.mkdtemp(prefix='bench_user_import_')
+os.environ.setdefault('SESSION_DB_PATH', os.path.join(TMP_DIR, 'sessions.db'))
+
+import app  # noqa: E402
+import migrations  # noqa: E402
+
+def setup_database():
+    path = os.path.join(TMP_DIR, 'bench.db')
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn, use_postgres=False, log=lambda msg: None)
+    conn.execute("INSERT INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
+    conn.execute("INSERT INTO users (username, password, role, name) VALUES ('S0000001', 'x', 'student', '舊資料')")
+    conn.commit()
+    conn.close()
+    app.DATABASE = path
+    return path
+
+def build_roster(count):
+    """學號,姓名,系所,班級,Email (未填密碼，使用預設密碼)"""
+    lines = ['學號,姓名,系所,班級,Email']
+    for i in range(1, count + 1):
+        lines.append(f'S{i:07d},學生{i},護理系,護理一{i % 4 + 1},s{i}@example.com')
+    lines.append('bad id!,格式錯誤,護理系,,')
+    lines.append(f'S{count:07d},重複,護理系,,')
+    return '\n'.join(lines).encode('utf-8')
+
+def upload(client, roster, mode):
+    start = time.perf_counter()
+    response = client.post('/api/users/import', data={
+        'file': (io.BytesIO(roster), 'roster.csv'), 'mode': mode, 'background': '1'
+    }, content_type='multipart/form-data')
+    data = response.get_json()
+    job_url = data['status_url']
+    while True:
+        job = client.get(job_url).get_json()['job']
+        if job['status'] != 'running':
+            break
+        time.sleep(0.05)
+    return time.perf_counter() - start, job
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    path = setup_database()
+    client = app.app.test_client()
+    client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    roster = build_roster(count)
+
+    print("=" * 60)
+    print(f"批次建立帳號測試 ({count} 個帳號)")
+    print("=" * 60)
+    for mode in ('skip', 'update'):
+        elapsed, job = upload(client, roster, mode)
+        print(f"mode={mode:<6} {elapsed:6.2f} 秒  {job['result']['message']}")
+
+    conn = sqlite3.connect(path)
+    total = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    conn.close()
+    print(f"users 資料表共 {total} 筆")
+    login = client.post('/api/login', json={'username': 'S0000002', 'password': app.passwords.DEFAULT_PASSWORD})
+    print(f"以預設密碼登入新帳號: {login.get_json()['message']}")
+
+if __name__ == '__main__':
+    main()
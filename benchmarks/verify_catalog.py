@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 欄式搜尋引擎差異驗證
+以隨機與邊界篩選條件比對 SQL 查詢 (build_course_search) 與欄式引擎
+(Catalog.search) 的結果，兩者的課程與順序必須完全相同，並比較查詢耗時
+使用目前設定的資料庫 (DATABASE_URL 或 database.db)
+使用方法: python benchmarks/verify_catalog.py [隨機組合數] [亂數種子]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+TMP_DIR = tempfile.mkdtemp(prefix='verify_catalog_')
+os.environ.setdefault('SESSION_DB_PATH', os.path.join(TMP_DIR, 'sessions.db'))
+
+import app  # noqa: E402
+import catalog  # noqa: E402
+
+# 資料中不存在或含 LIKE 萬用字元的值，確認兩邊的處理一致
+EDGE_CASES = [
+    {},
+    {'semester': '0000'},
+    {'department': '不存在的系所'},
+    {'weekday': '1,,9'},
+    {'period': '%'},
+    {'period': '1_'},
+    {'period': '1,99'},
+    {'degree': '不存在的學制'},
+    {'degree': '四技,不存在的學制'},
+    {'category': '不存在的分類'},
+    {'keyword': 'a'},
+    {'keyword': 'A'},
+    {'keyword': '%'},
+    {'keyword': '_'},
+]
+
+def distinct(column):
+    rows = app.execute_query(f'SELECT DISTINCT {column} FROM courses WHERE {column} IS NOT NULL', fetch=True)
+    return [str(r[column]) for r in rows if r[column] != '']
+
+def random_cases(count, rng):
+    values = {
+        'semester': distinct('semester'),
+        'department': distinct('department'),
+        'grade': distinct('grade'),
+        'type': distinct('course_type'),
+        'weekday': distinct('weekday'),
+        'period': sorted({p for text in distinct('period') for p in text.split(',')}),
+        'degree': list(catalog.DEGREE_CODES),
+        'category': list(catalog.CATEGORY_KEYWORDS),
+    }
+    names = [r['course_name'] for r in app.execute_query('SELECT course_name FROM courses', fetch=True) if r['course_name']]
+    multi = ('weekday', 'period', 'degree', 'category')
+
+    cases = []
+    for _ in range(count):
+        args = {}
+        for param, choices in values.items():
+            if not choices or rng.random() > 0.35:
+                continue
+            if param in multi:
+                args[param] = ','.join(rng.sample(choices, rng.randint(1, min(3, len(choices)))))
+            else:
+                args[param] = rng.choice(choices)
+        if names and rng.random() < 0.3:
+            name = rng.choice(names)
+            start = rng.randrange(len(name))
+            args['keyword'] = name[start:start + rng.randint(1, 3)]
+        cases.append(args)
+    return cases
+
+def sql_search(args):
+    query, params = app.build_course_search(args)
+    return app.execute_query(query, params, fetch=True)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    rng = random.Random(seed)
+
+    engine = catalog.Catalog(
+        app.load_all_courses, app.session_backend,
+        ascii_case_insensitive=not app.USE_POSTGRES, columnar=True
+    )
+    start = time.perf_counter()
+    engine.ensure_fresh()
+    print(f"建立欄式索引: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    cases = EDGE_CASES + random_cases(count, rng)
+    mismatches = 0
+    sql_time = columnar_time = 0.0
+    for args in cases:
+        start = time.perf_counter()
+        expected = [row['id'] for row in sql_search(args)]
+        sql_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = [row['id'] for row in engine.search(args)]
+        columnar_time += time.perf_counter() - start
+
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"❌ 結果不同 {args}: SQL {len(expected)} 筆 / 欄式 {len(actual)} 筆")
+
+    print(f"比對 {len(cases)} 組條件，不一致 {mismatches} 組")
+    print(f"SQL   平均 {sql_time / len(cases) * 1000:8.2f} ms")
+    print(f"欄式  平均 {columnar_time / len(cases) * 1000:8.2f} ms")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
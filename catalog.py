@@ -0,0 +1,489 @@
+# ==========================================================
+# 北護課程查詢系統 - 記憶體課程目錄
+# 將 courses 表載入記憶體並預先解析篩選用欄位 (學制代碼、節次、分類...)，
+# 供篩選計數 (facets) 等需要快速掃描整個目錄的功能使用
+# 課程資料異動時呼叫 bump_version()，各 worker 下次使用時自動重新載入
+# 選用的欄式引擎 (columnar=True) 以 NumPy 陣列保存每學期課程，搜尋改用向量化遮罩
+# snapshot() 產生單一學期的精簡目錄 (JSON + gzip)，供瀏覽器下載後在本機篩選
+# ==========================================================
+
+import gzip
+import json
+import re
+import string
+import threading
+import time
+
+import autocomplete
+import text_index
+
+# NumPy 只有欄式引擎需要，第一次建立欄式目錄時才載入 (見 load_numpy)
+np = None
+
+def load_numpy():
+    """載入 NumPy，未安裝時回傳 None (只能使用 SQL 搜尋)"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+# 學制 -> 課程代碼第 3~4 碼
+DEGREE_CODES = {
+    '四技': ['14'],
+    '二技': ['12'],
+    '二技(三年)': ['33', '23'],
+    '二技(二年)': ['33', '23'],
+    '碩士班': ['16', '46', '86'],
+    '博士班': ['17', '87'],
+    '學士後系': ['19'],
+    '學士後多元專長': ['15'],
+    '學士後學位學程': ['18'],
+}
+
+# 課程內容分類 -> 課表備註關鍵字
+CATEGORY_KEYWORDS = {
+    '跨校': ['跨校'],
+    '跨域課程': ['跨域'],
+    '全英語授課': ['全英語', '全英文'],
+    'EMI全英語授課': ['EMI'],
+    '同步遠距教學': ['同步遠距'],
+    '非同步遠距教學': ['非同步遠距'],
+    '混合式遠距教學': ['混合式遠距'],
+    '遠距教學課程': ['遠距教學'],
+    '遠距輔助課程': ['遠距輔助'],
+}
+
+# 篩選計數欄位 (回應的鍵) 與對應的搜尋參數名稱
+FACETS = {
+    'department': 'department',
+    'grade': 'grade',
+    'course_type': 'type',
+    'weekday': 'weekday',
+    'period': 'period',
+    'degree': 'degree',
+    'category': 'category',
+}
+
+VERSION_KEY = 'catalog:version'
+
+# 學期目錄快照包含的欄位 (結果列表與篩選需要的欄位；大綱等其他欄位由 /api/courses/<id> 取得)
+# 每筆課程另外附上學制、課程分類的位元遮罩 (對應 degrees / categories 的順序)
+SNAPSHOT_FIELDS = [
+    'id', 'semester', 'department', 'grade', 'course_code', 'course_name', 'instructor',
+    'credits', 'course_type', 'classroom', 'day_time', 'weekday', 'period',
+]
+
+# 多值欄位的位元編號
+DEGREE_BITS = {label: 1 << i for i, label in enumerate(DEGREE_CODES)}
+CATEGORY_BITS = {label: 1 << i for i, label in enumerate(CATEGORY_KEYWORDS)}
+
+# 字典編碼的欄位 (欄位 -> 搜尋參數名稱)
+CATEGORICAL = {
+    'department': 'department',
+    'grade': 'grade',
+    'course_type': 'type',
+}
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# ========================================
+# SQL LIKE 比對 (與資料庫查詢結果一致)
+# ========================================
+def like_matcher(pattern, ascii_case_insensitive):
+    """
+    回傳判斷字串是否符合 SQL LIKE pattern 的函數 (None 視為 NULL，不符合)
+    ascii_case_insensitive: SQLite 的 LIKE 對 ASCII 字母不分大小寫，PostgreSQL 則區分
+    """
+    inner = pattern[1:-1]
+    if pattern.startswith('%') and pattern.endswith('%') and len(pattern) >= 2 and not re.search(r'[%_]', inner):
+        # 常見情況: %關鍵字% 直接用子字串比對
+        if ascii_case_insensitive:
+            needle = inner.translate(_ASCII_LOWER)
+            return lambda value: value is not None and needle in value.translate(_ASCII_LOWER)
+        return lambda value: value is not None and inner in value
+
+    regex = ''.join('.*' if ch == '%' else '.' if ch == '_' else re.escape(ch) for ch in pattern)
+    flags = re.DOTALL | ((re.IGNORECASE | re.ASCII) if ascii_case_insensitive else 0)
+    compiled = re.compile(regex, flags)
+    return lambda value: value is not None and compiled.fullmatch(value) is not None
+
+def has_wildcard(value):
+    return re.search(r'[%_]', value) is not None
+
+# ========================================
+# 欄式索引 (NumPy)
+# ========================================
+class ColumnarIndex:
+    """
+    一組課程 (單一學期或全部) 的欄式陣列:
+    - 系所/年級/課別/星期: 字典編碼 (int32，-1 表示 NULL)
+    - 學制、課程分類: 位元遮罩 (DEGREE_BITS / CATEGORY_BITS)
+    - 節次: 每個節次一個位元 (uint64)，節次種類超過 64 種時改為逐筆比對
+    """
+
+    def __init__(self, indices, courses, features):
+        # 保留載入時的資料列參考，重新載入期間仍能取得一致的結果
+        self.courses = courses
+        self.features = features
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.size = len(indices)
+        rows = [features[i] for i in indices]
+
+        self.vocab = {}
+        self.codes = {}
+        for field in (*CATEGORICAL, 'weekday'):
+            vocab = {}
+            codes = np.full(self.size, -1, dtype=np.int32)
+            for pos, f in enumerate(rows):
+                if f[field] is not None:
+                    codes[pos] = vocab.setdefault(f[field], len(vocab))
+            self.vocab[field] = vocab
+            self.codes[field] = codes
+
+        self.degree_bits = np.fromiter(
+            (sum(DEGREE_BITS[d] for d in f['degree']) for f in rows), dtype=np.uint32, count=self.size)
+        self.category_bits = np.fromiter(
+            (sum(CATEGORY_BITS[c] for c in f['category']) for f in rows), dtype=np.uint32, count=self.size)
+
+        slots = sorted({p for f in rows for p in f['period']})
+        if len(slots) <= 64:
+            self.slot_bits = {p: np.uint64(1) << np.uint64(i) for i, p in enumerate(slots)}
+            self.slots = np.fromiter(
+                (sum(1 << slots.index(p) for p in f['period']) for f in rows), dtype=np.uint64, count=self.size)
+        else:
+            self.slot_bits = None
+            self.slots = None
+        self.period_text = [f['period_text'] for f in rows]
+
+    def equals(self, field, values):
+        """欄位值屬於 values 之一 (對應 field = ? OR field = ?)"""
+        wanted = [self.vocab[field][v] for v in values if v in self.vocab[field]]
+        if not wanted:
+            return np.zeros(self.size, dtype=bool)
+        return np.isin(self.codes[field], wanted)
+
+    def period_mask(self, periods, ascii_case_insensitive):
+        if self.slots is not None and not any(has_wildcard(p) for p in periods):
+            bits = np.uint64(0)
+            for p in periods:
+                bits |= self.slot_bits.get(p, np.uint64(0))
+            return (self.slots & bits) != 0
+        # LIKE 萬用字元或節次種類過多: 逐筆比對
+        matchers = [like_matcher(f'%,{p},%', ascii_case_insensitive) for p in periods]
+        return np.fromiter(
+            (any(m(text) for m in matchers) for text in self.period_text), dtype=bool, count=self.size)
+
+    def mask(self, args, ascii_case_insensitive):
+        """依搜尋參數建立布林遮罩 (關鍵字除外，語意與 build_course_search 相同)"""
+        mask = np.ones(self.size, dtype=bool)
+        for field, param in CATEGORICAL.items():
+            value = args.get(param, '')
+            if value:
+                mask &= self.equals(field, [value])
+
+        weekday = args.get('weekday', '')
+        if weekday:
+            mask &= self.equals('weekday', weekday.split(','))
+
+        period = args.get('period', '')
+        if period:
+            mask &= self.period_mask(period.split(','), ascii_case_insensitive)
+
+        degree = args.get('degree', '')
+        if degree:
+            bits = sum(DEGREE_BITS[d] for d in set(degree.split(',')) if d in DEGREE_BITS)
+            if bits:
+                mask &= (self.degree_bits & bits) != 0
+
+        category = args.get('category', '')
+        if category:
+            bits = sum(CATEGORY_BITS[c] for c in set(category.split(',')) if c in CATEGORY_BITS)
+            if bits:
+                mask &= (self.category_bits & bits) != 0
+        return mask
+
+# ========================================
+# 記憶體課程目錄
+# ========================================
+class Catalog:
+    """
+    load_rows: 無參數函數，回傳 courses 全部資料列 (dict)
+    store: 共用儲存後端 (session_store)，用來在 worker 之間同步目錄版本
+    columnar: 建立欄式索引供 search() 使用 (需要 NumPy)
+    """
+
+    def __init__(self, load_rows, store, ascii_case_insensitive=True, columnar=False):
+        if columnar and load_numpy() is None:
+            print("[catalog] ⚠️ 未安裝 NumPy，欄式搜尋引擎停用")
+            columnar = False
+        self.load_rows = load_rows
+        self.store = store
+        self.ascii_case_insensitive = ascii_case_insensitive
+        self.columnar = columnar
+        self.version = None
+        self.courses = []
+        self.features = []
+        self.by_semester = {}
+        self.positions = {}
+        self.text_index = text_index.TextIndex()
+        self.prefix_indexes = {}
+        self.prefix_version = None
+        self.snapshots = {}
+        self.snapshot_version = None
+        self.columns = {}
+        self.all_columns = None
+        # 分類關鍵字不含萬用字元，LIKE '%關鍵字%' 等同子字串比對
+        self._category_needles = {
+            label: [self._fold(kw) for kw in keywords] for label, keywords in CATEGORY_KEYWORDS.items()
+        }
+        self._lock = threading.Lock()
+
+    # ---------- 版本管理 ----------
+    def current_version(self):
+        return self.store.get(VERSION_KEY) or '0'
+
+    def bump_version(self):
+        """課程資料異動後呼叫，讓所有 worker 重新載入"""
+        self.store.set(VERSION_KEY, str(time.time_ns()), 10 * 365 * 86400)
+
+    def ensure_fresh(self):
+        version = self.current_version()
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            # 先記錄版本再載入，載入期間若有異動，下次檢查會再重新載入
+            self._load(self.load_rows())
+            self.version = version
+
+    def _load(self, rows):
+        features = []
+        by_semester = {}
+        for index, row in enumerate(rows):
+            features.append(self._features(row))
+            by_semester.setdefault(row.get('semester'), []).append(index)
+        if self.columnar:
+            self.columns = {semester: ColumnarIndex(indices, rows, features) for semester, indices in by_semester.items()}
+            self.all_columns = ColumnarIndex(range(len(rows)), rows, features)
+        self.courses = rows
+        self.features = features
+        self.by_semester = by_semester
+        self.positions = {row['id']: index for index, row in enumerate(rows)}
+        print(f"[catalog] 載入 {len(rows)} 筆課程" + (" (欄式索引)" if self.columnar else ""))
+
+    def _fold(self, text):
+        return text.translate(_ASCII_LOWER) if self.ascii_case_insensitive else text
+
+    def _features(self, row):
+        """預先計算每筆課程的篩選值 (對應 build_course_search 的 SQL 條件)"""
+        period = row.get('period')
+        code = row.get('course_code') or ''
+        remarks = self._fold(row['remarks']) if row.get('remarks') is not None else None
+        return {
+            'department': row.get('department'),
+            'grade': row.get('grade'),
+            'course_type': row.get('course_type'),
+            'weekday': row.get('weekday'),
+            'period_text': f',{period},' if period is not None else None,
+            'period': set(period.split(',')) if period is not None else set(),
+            'degree': {label for label, codes in DEGREE_CODES.items() if code[2:4] in codes},
+            'category': {
+                label for label, needles in self._category_needles.items()
+                if remarks is not None and any(needle in remarks for needle in needles)
+            },
+            'keyword_fields': (row.get('course_name'), row.get('instructor'), row.get('classroom')),
+        }
+
+    # ---------- 篩選 ----------
+    def candidates(self, semester=''):
+        if semester:
+            return self.by_semester.get(semester, [])
+        return range(len(self.courses))
+
+    def _keyword_filter(self, keyword):
+        match = like_matcher(f'%{keyword}%', self.ascii_case_insensitive)
+        return lambda f: any(match(value) for value in f['keyword_fields'])
+
+    def _facet_filters(self, args):
+        """依搜尋參數建立各篩選欄位的判斷函數 (語意與 build_course_search 相同)"""
+        filters = {}
+        for field in ('department', 'grade', 'course_type'):
+            value = args.get(FACETS[field], '')
+            if value:
+                filters[field] = lambda f, field=field, value=value: f[field] == value
+
+        weekday = args.get('weekday', '')
+        if weekday:
+            weekdays = set(weekday.split(','))
+            filters['weekday'] = lambda f: f['weekday'] in weekdays
+
+        period = args.get('period', '')
+        if period:
+            periods = period.split(',')
+            if any(has_wildcard(p) for p in periods):
+                matchers = [like_matcher(f'%,{p},%', self.ascii_case_insensitive) for p in periods]
+                filters['period'] = lambda f: any(m(f['period_text']) for m in matchers)
+            else:
+                wanted_periods = set(periods)
+                filters['period'] = lambda f: not wanted_periods.isdisjoint(f['period'])
+
+        degree = args.get('degree', '')
+        if degree:
+            wanted_degrees = {d for d in degree.split(',') if d in DEGREE_CODES}
+            if wanted_degrees:
+                filters['degree'] = lambda f: not wanted_degrees.isdisjoint(f['degree'])
+
+        category = args.get('category', '')
+        if category:
+            wanted_categories = {c for c in category.split(',') if c in CATEGORY_KEYWORDS}
+            if wanted_categories:
+                filters['category'] = lambda f: not wanted_categories.isdisjoint(f['category'])
+        return filters
+
+    def search(self, args):
+        """
+        以欄式索引搜尋課程，結果與 build_course_search 的 SQL 查詢相同 (含排序)
+        """
+        self.ensure_fresh()
+        semester = args.get('semester', '')
+        index = self.columns.get(semester) if semester else self.all_columns
+        if index is None:
+            return []
+
+        selected = index.indices[index.mask(args, self.ascii_case_insensitive)]
+        keyword = args.get('keyword', '')
+        if keyword:
+            keyword_filter = self._keyword_filter(keyword)
+            return [index.courses[i] for i in selected if keyword_filter(index.features[i])]
+        return [index.courses[i] for i in selected]
+
+    def ranked(self, args, limit=50):
+        """
+        依關鍵字相關度 (BM25) 排序的搜尋，其他篩選條件與一般搜尋相同
+        回傳前 limit 筆課程，每筆加上 relevance 分數
+        """
+        self.ensure_fresh()
+        with self._lock:
+            courses, features, positions, version = self.courses, self.features, self.positions, self.version
+        updated, removed = self.text_index.sync(courses, version)
+        if updated or removed:
+            print(f"[catalog] 全文索引更新 {updated} 筆、移除 {removed} 筆")
+
+        semester = args.get('semester', '')
+        filters = list(self._facet_filters(args).values())
+
+        def accept(doc_id):
+            index = positions.get(doc_id)
+            if index is None or (semester and courses[index].get('semester') != semester):
+                return False
+            return all(check(features[index]) for check in filters)
+
+        hits = self.text_index.search(args.get('keyword', ''), accept, limit)
+        return [dict(courses[positions[doc_id]], relevance=round(score, 4)) for doc_id, score in hits]
+
+    def suggest(self, prefix, semester='', limit=10):
+        """
+        關鍵字自動完成 (各學期的前綴索引在第一次使用時建立，目錄重新載入後重建)
+        不存在的學期回傳空清單，不建立索引 (避免任意學期參數佔用快取)
+        """
+        self.ensure_fresh()
+        with self._lock:
+            if semester and semester not in self.by_semester:
+                return []
+            if self.prefix_version != self.version:
+                self.prefix_indexes = {}
+                self.prefix_version = self.version
+            index = self.prefix_indexes.get(semester)
+            if index is None:
+                index = autocomplete.PrefixIndex([self.courses[i] for i in self.candidates(semester)])
+                self.prefix_indexes[semester] = index
+        return index.suggest(prefix, limit)
+
+    def snapshot(self, semester):
+        """
+        單一學期的精簡目錄，回傳 {'version', 'json', 'gzip'} (位元組)；學期沒有課程時回傳 None
+        各學期在第一次下載時產生，目錄重新載入後重建
+        """
+        self.ensure_fresh()
+        with self._lock:
+            if self.snapshot_version != self.version:
+                self.snapshots = {}
+                self.snapshot_version = self.version
+            snapshot = self.snapshots.get(semester)
+            if snapshot is None:
+                indices = self.by_semester.get(semester)
+                if not indices:
+                    return None
+                payload = {
+                    'version': self.version,
+                    'semester': semester,
+                    'ascii_case_insensitive': self.ascii_case_insensitive,
+                    'fields': SNAPSHOT_FIELDS + ['degree_bits', 'category_bits'],
+                    'degrees': list(DEGREE_BITS),
+                    'categories': list(CATEGORY_BITS),
+                    'rows': [
+                        [self.courses[i].get(field) for field in SNAPSHOT_FIELDS] + [
+                            sum(DEGREE_BITS[d] for d in self.features[i]['degree']),
+                            sum(CATEGORY_BITS[c] for c in self.features[i]['category']),
+                        ]
+                        for i in indices
+                    ],
+                }
+                data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+                snapshot = {'version': self.version, 'json': data, 'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+                self.snapshots[semester] = snapshot
+        return snapshot
+
+    def facets(self, args):
+        """
+        單次掃描計算所有篩選欄位的數量
+        每個欄位的數量套用「其他」欄位的條件 (不含自身)，讓同一面板內可以複選
+        回傳 (符合全部條件的課程數, {欄位: {值: 數量}})
+        """
+        self.ensure_fresh()
+        keyword = args.get('keyword', '')
+        keyword_filter = self._keyword_filter(keyword) if keyword else None
+        filters = list(self._facet_filters(args).items())
+        counts = {field: {} for field in FACETS}
+        total = 0
+        with self._lock:
+            by_semester, features = self.by_semester, self.features
+
+        semester = args.get('semester', '')
+        for index in (by_semester.get(semester, []) if semester else range(len(features))):
+            f = features[index]
+            if keyword_filter and not keyword_filter(f):
+                continue
+
+            # 找出未通過的條件；超過一個就不影響任何欄位
+            failed = None
+            rejected = False
+            for field, check in filters:
+                if not check(f):
+                    if failed is not None:
+                        rejected = True
+                        break
+                    failed = field
+            if rejected:
+                continue
+
+            if failed is None:
+                total += 1
+                targets = FACETS
+            else:
+                targets = (failed,)
+            for field in targets:
+                values = f[field]
+                if isinstance(values, set):
+                    for value in values:
+                        if value != '':
+                            counts[field][value] = counts[field].get(value, 0) + 1
+                elif values is not None and values != '':
+                    counts[field][values] = counts[field].get(values, 0) + 1
+
+        return total, counts
@@ -0,0 +1,254 @@
+# ==========================================================
+# 北護課程查詢系統 - 課程 Excel 解析與差異匯入
+# 每列課程正規化後計算雜湊，以 (學期, 課程代碼, 上課班組) 為鍵，
+# 與資料庫中同學期課程的雜湊比對 (資料庫的雜湊由目前的欄位值計算，
+# 管理者手動修改過的課程也會正確判斷)，只寫入新增、變更與刪除的課程
+# 上傳檔案以 SHA-256 記錄 (course_uploads)，相同檔案重複上傳時不再解析
+# ==========================================================
+
+import hashlib
+
+from course_ops import ID_CHUNK
+
+# 匯入檔案提供的欄位 (雜湊與更新只涵蓋這些欄位)
+IMPORT_FIELDS = [
+    'department', 'grade', 'course_name', 'course_name_en', 'instructor', 'credits',
+    'course_type', 'classroom', 'day_time', 'weekday', 'period', 'capacity',
+    'remarks', 'course_summary',
+]
+
+DAY_MAP = {'1': '週一', '2': '週二', '3': '週三', '4': '週四',
+           '5': '週五', '6': '週六', '7': '週日'}
+
+# 差異報告列出的明細筆數上限 (總數另外回傳)
+REPORT_LIMIT = 200
+
+# ========================================
+# 解析
+# ========================================
+def parse_course_sheet(pd, df, semester, department_name, log=print):
+    """
+    將課程查詢 Excel (header=3) 轉成課程 dict 列表，回傳 (課程列表, 錯誤列數)
+    department_name: 系所代碼 -> 系所名稱
+    """
+    def cell(values, index):
+        value = values[index]
+        return str(value) if pd.notna(value) else ''
+
+    courses = []
+    error_count = 0
+    for idx, values in enumerate(df.itertuples(index=False, name=None)):
+        # 第一列為欄位說明
+        if idx == 0:
+            continue
+
+        try:
+            course_code = cell(values, 3)
+            if not course_code or course_code == 'nan':
+                continue
+
+            weekday = cell(values, 21)
+            period = cell(values, 22)
+            day_time = ''
+            if weekday:
+                try:
+                    day_str = DAY_MAP.get(str(int(float(weekday))), '')
+                    if day_str:
+                        day_time = f"{day_str} {period}"
+                    weekday = str(int(float(weekday)))
+                except ValueError:
+                    pass
+
+            courses.append({
+                'semester': semester,
+                'course_code': course_code,
+                'class_group': cell(values, 8),
+                'department': department_name(cell(values, 4)),
+                'grade': cell(values, 7),
+                'course_name': cell(values, 9),
+                'course_name_en': cell(values, 10),
+                'instructor': cell(values, 11),
+                'capacity': int(float(values[12])) if pd.notna(values[12]) else 0,
+                'credits': float(values[15]) if pd.notna(values[15]) else 0,
+                'course_type': cell(values, 19),
+                'classroom': cell(values, 20),
+                'day_time': day_time,
+                'weekday': weekday,
+                'period': period,
+                'remarks': cell(values, 23),
+                'course_summary': cell(values, 24),
+            })
+        except Exception as e:
+            error_count += 1
+            log(f"Row {idx} error: {e}")
+
+    return courses, error_count
+
+# ========================================
+# 雜湊與比對
+# ========================================
+def _normalize(field, value):
+    if value is None:
+        return ''
+    if field == 'credits':
+        return format(float(value or 0), 'g')
+    if field == 'capacity':
+        return str(int(value or 0))
+    return str(value).strip()
+
+def row_hash(course):
+    """匯入欄位正規化後的 SHA-1 (檔案與資料庫的同一門課內容相同時雜湊相同)"""
+    text = '\x1f'.join(_normalize(field, course.get(field)) for field in IMPORT_FIELDS)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def course_key(course):
+    return (course['semester'], course['course_code'], course.get('class_group') or '')
+
+def diff_courses(courses, existing):
+    """
+    比對檔案與資料庫中同學期的課程
+    courses: parse_course_sheet 的結果；existing: 資料庫中該學期的課程 (含 id 與 IMPORT_FIELDS)
+    回傳 {'insert': [課程], 'update': [(id, 課程, 舊資料)], 'delete': [舊資料], 'unchanged': 筆數}
+    同一個鍵可能有多列 (例如一週上課兩次的課程)：先配對內容完全相同的列，
+    其餘依檔案順序與 id 順序配對為更新，多出的列為新增或刪除
+    """
+    incoming = {}
+    for course in courses:
+        incoming.setdefault(course_key(course), []).append(course)
+    stored = {}
+    for row in sorted(existing, key=lambda row: row['id']):
+        stored.setdefault(course_key(row), []).append(row)
+
+    insert = []
+    update = []
+    delete = []
+    unchanged = 0
+    for key in list(incoming) + [key for key in stored if key not in incoming]:
+        rows = stored.get(key, [])
+        by_hash = {}
+        for row in rows:
+            by_hash.setdefault(row_hash(row), []).append(row)
+
+        pending = []
+        matched = set()
+        for course in incoming.get(key, []):
+            same = by_hash.get(row_hash(course))
+            if same:
+                matched.add(same.pop(0)['id'])
+                unchanged += 1
+            else:
+                pending.append(course)
+
+        leftover = [row for row in rows if row['id'] not in matched]
+        for course, row in zip(pending, leftover):
+            update.append((row['id'], course, row))
+        insert.extend(pending[len(leftover):])
+        delete.extend(leftover[len(pending):])
+    return {'insert': insert, 'update': update, 'delete': delete, 'unchanged': unchanged}
+
+def changed_fields(old, new):
+    """回傳 {欄位: [舊值, 新值]} (只列出正規化後不同的欄位)"""
+    return {
+        field: [old.get(field), new.get(field)]
+        for field in IMPORT_FIELDS
+        if _normalize(field, old.get(field)) != _normalize(field, new.get(field))
+    }
+
+def build_report(diff, enrollment_count):
+    """差異報告 (前端確認用)；明細只列前 REPORT_LIMIT 筆"""
+    def summary(course):
+        return {
+            'course_code': course['course_code'],
+            'class_group': course.get('class_group') or '',
+            'course_name': course.get('course_name') or '',
+        }
+
+    changes = (
+        [{'action': 'insert', **summary(course)} for course in diff['insert']]
+        + [{'action': 'update', **summary(course), 'changes': changed_fields(old, course)}
+           for _course_id, course, old in diff['update']]
+        + [{'action': 'delete', **summary(row)} for row in diff['delete']]
+    )
+    return {
+        'inserted': len(diff['insert']),
+        'updated': len(diff['update']),
+        'deleted': len(diff['delete']),
+        'unchanged': diff['unchanged'],
+        'deleted_enrollments': enrollment_count,
+        'changes': changes[:REPORT_LIMIT],
+    }
+
+def file_digest(stream, chunk_size=1024 * 1024):
+    """回傳 (上傳檔案的 SHA-256, 位元組數)，讀完後將檔案指標移回開頭"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+# ========================================
+# 讀取與寫入
+# ========================================
+def load_semester(conn, use_postgres, semester):
+    """讀取資料庫中該學期的課程 (id、鍵與匯入欄位)"""
+    placeholder = '%s' if use_postgres else '?'
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT id, semester, course_code, class_group, {', '.join(IMPORT_FIELDS)} "
+        f"FROM courses WHERE semester = {placeholder}",
+        (semester,)
+    )
+    rows = [dict(row) for row in cursor.fetchall()]
+    cursor.close()
+    return rows
+
+def count_enrollments(conn, use_postgres, course_ids):
+    """刪除這些課程時會一併刪除的選課記錄數"""
+    placeholder = '%s' if use_postgres else '?'
+    cursor = conn.cursor()
+    total = 0
+    for start in range(0, len(course_ids), ID_CHUNK):
+        chunk = course_ids[start:start + ID_CHUNK]
+        cursor.execute(
+            f"SELECT COUNT(*) FROM enrollments WHERE course_id IN ({', '.join([placeholder] * len(chunk))})",
+            chunk
+        )
+        row = cursor.fetchone()
+        total += list(row.values())[0] if isinstance(row, dict) else row[0]
+    cursor.close()
+    return total
+
+def apply_diff(conn, use_postgres, diff):
+    """在單一交易中寫入差異 (刪除的課程一併刪除選課記錄)"""
+    placeholder = '%s' if use_postgres else '?'
+    columns = ['semester', 'course_code', 'class_group'] + IMPORT_FIELDS
+    cursor = conn.cursor()
+    try:
+        if diff['insert']:
+            cursor.executemany(
+                f"INSERT INTO courses ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})",
+                [[course[col] for col in columns] for course in diff['insert']]
+            )
+        if diff['update']:
+            assignments = ', '.join(f'{field} = {placeholder}' for field in IMPORT_FIELDS)
+            cursor.executemany(
+                f'UPDATE courses SET {assignments} WHERE id = {placeholder}',
+                [[course[field] for field in IMPORT_FIELDS] + [course_id] for course_id, course, _old in diff['update']]
+            )
+        delete_ids = [row['id'] for row in diff['delete']]
+        for start in range(0, len(delete_ids), ID_CHUNK):
+            chunk = delete_ids[start:start + ID_CHUNK]
+            marks = ', '.join([placeholder] * len(chunk))
+            cursor.execute(f'DELETE FROM enrollments WHERE course_id IN ({marks})', chunk)
+            cursor.execute(f'DELETE FROM courses WHERE id IN ({marks})', chunk)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,149 @@
+# ==========================================================
+# 北護課程查詢系統 - 批次課程操作 (管理者)
+# 每個操作在單一交易中以集合式 SQL 完成 (不逐門課呼叫)，
+# 刪除課程時一併刪除其選課記錄，回傳各表格受影響的筆數
+# 只處理 courses (目前學期)；封存學期需先還原 (見 archive.py)
+# ==========================================================
+
+# 可批次修改的欄位 (學期、課號等識別欄位不開放，避免與其他課程重複)
+UPDATABLE_FIELDS = {
+    'department': str,
+    'grade': str,
+    'course_name': str,
+    'course_name_en': str,
+    'instructor': str,
+    'credits': float,
+    'course_type': str,
+    'classroom': str,
+    'capacity': int,
+    'remarks': str,
+    'course_summary': str,
+}
+
+# 複製學期時複製的欄位 (id、建立時間、已選人數不複製)
+CLONE_COLUMNS = [
+    'department', 'grade', 'course_code', 'course_name', 'course_name_en', 'instructor',
+    'credits', 'course_type', 'classroom', 'day_time', 'weekday', 'period', 'capacity',
+    'class_group', 'remarks', 'course_summary',
+]
+
+# 每次 IN (...) 最多的 id 數 (SQLite 參數數量有上限)
+ID_CHUNK = 500
+
+class BulkOperationError(Exception):
+    """批次操作參數錯誤 (欄位不可修改、目標學期已有課程...)"""
+
+def _sql(query, use_postgres):
+    return query.replace('?', '%s') if use_postgres else query
+
+def _scalar(row):
+    if isinstance(row, dict):
+        return list(row.values())[0]
+    return row[0]
+
+def _run(conn, operation, dry_run):
+    """執行 operation(cursor)；dry_run 時回傳筆數後復原"""
+    cursor = conn.cursor()
+    try:
+        result = operation(cursor)
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# ========================================
+# 刪除
+# ========================================
+def delete_courses(conn, use_postgres, id_query, params=(), dry_run=False):
+    """
+    刪除 id_query (回傳 id 欄位的 SELECT) 選出的課程與其選課記錄
+    回傳 {'courses': 刪除課程數, 'enrollments': 刪除選課記錄數}
+    """
+    matched = f'SELECT id FROM ({id_query}) matched'
+
+    def operation(cursor):
+        cursor.execute(_sql(f'DELETE FROM enrollments WHERE course_id IN ({matched})', use_postgres), params)
+        enrollments = cursor.rowcount
+        cursor.execute(_sql(f'DELETE FROM courses WHERE id IN ({matched})', use_postgres), params)
+        return {'courses': cursor.rowcount, 'enrollments': enrollments}
+
+    return _run(conn, operation, dry_run)
+
+# ========================================
+# 批次修改
+# ========================================
+def clean_updates(fields):
+    """檢查並轉換要修改的欄位值，回傳 {欄位: 值}"""
+    if not fields:
+        raise BulkOperationError('請指定要修改的欄位')
+    updates = {}
+    for field, value in fields.items():
+        if field not in UPDATABLE_FIELDS:
+            raise BulkOperationError(f'欄位 {field} 不可批次修改')
+        try:
+            updates[field] = UPDATABLE_FIELDS[field](value if value is not None else '')
+        except (TypeError, ValueError):
+            raise BulkOperationError(f'欄位 {field} 的值格式錯誤')
+    return updates
+
+def update_courses(conn, use_postgres, ids, fields, dry_run=False):
+    """將 ids 中的課程設為相同的欄位值，回傳 {'courses': 修改課程數}"""
+    updates = clean_updates(fields)
+    ids = sorted({int(course_id) for course_id in ids})
+    assignments = ', '.join(f'{field} = ?' for field in updates)
+
+    def operation(cursor):
+        count = 0
+        for start in range(0, len(ids), ID_CHUNK):
+            chunk = ids[start:start + ID_CHUNK]
+            cursor.execute(
+                _sql(f"UPDATE courses SET {assignments} WHERE id IN ({', '.join('?' * len(chunk))})", use_postgres),
+                list(updates.values()) + chunk
+            )
+            count += cursor.rowcount
+        return {'courses': count}
+
+    return _run(conn, operation, dry_run)
+
+# ========================================
+# 複製學期
+# ========================================
+def clone_semester(conn, use_postgres, source, target, departments=None, dry_run=False):
+    """
+    將 source 學期的課程複製為 target 學期 (target 必須還沒有課程，且不是封存學期)
+    departments: 只複製這些系所 (None 表示全部)
+    回傳 {'courses': 新增課程數}
+    """
+    if not source or not target or source == target:
+        raise BulkOperationError('請指定不同的來源與目標學期')
+    columns = ', '.join(CLONE_COLUMNS)
+    where = 'semester = ?'
+    params = [target, source]
+    if departments:
+        where += f" AND department IN ({', '.join('?' * len(departments))})"
+        params.extend(departments)
+
+    def operation(cursor):
+        cursor.execute(_sql('SELECT COUNT(*) FROM courses WHERE semester = ?', use_postgres), (target,))
+        if _scalar(cursor.fetchone()):
+            raise BulkOperationError(f'學期 {target} 已有課程')
+        # 封存學期的課程在 courses_archive，複製進 courses 會讓 courses_all 出現兩份
+        cursor.execute(_sql('SELECT COUNT(*) FROM archived_semesters WHERE semester = ?', use_postgres), (target,))
+        if _scalar(cursor.fetchone()):
+            raise BulkOperationError(f'學期 {target} 已封存')
+        cursor.execute(_sql(f'''
+            INSERT INTO courses (semester, {columns})
+            SELECT ?, {columns} FROM courses WHERE {where}
+            ORDER BY id
+        ''', use_postgres), params)
+        if not cursor.rowcount:
+            raise BulkOperationError(f'學期 {source} 沒有符合的課程')
+        return {'courses': cursor.rowcount}
+
+    return _run(conn, operation, dry_run)
@@ -8,13 +8,46 @@
 import sqlite3
 import pandas as pd
 import os
+import re
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
+import migrations
+import parse_cache
+
 # 設定路徑 - 使用相對路徑，資料庫和Excel檔案放在同一目錄
 SCRIPT_DIR = Path(__file__).parent.resolve()
 UPLOAD_DIR = SCRIPT_DIR  # Excel檔案放在腳本同目錄
 DB_PATH = SCRIPT_DIR / 'database.db'  # 資料庫也放在同目錄
 
+# 課程資料的欄位順序 (與 process_excel_file 產生的 tuple 相同)
+COURSE_COLUMNS = [
+    'semester', 'department', 'grade', 'course_code', 'course_name',
+    'course_name_en', 'instructor', 'credits', 'course_type', 'classroom',
+    'day_time', 'weekday', 'period', 'capacity', 'enrolled',
+    'class_group', 'remarks', 'course_summary',
+]
+
+# 每次 executemany 寫入的筆數
+BATCH_SIZE = 5000
+
+# 建立資料庫期間使用的 SQLite 設定 (資料庫是重新產生的，中途失敗重跑即可，不需要日誌與 fsync)
+BUILD_PRAGMAS = [
+    'PRAGMA journal_mode=OFF',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536',
+]
+
+# 建立完成後恢復的設定
+RESTORE_PRAGMAS = [
+    'PRAGMA journal_mode=DELETE',
+    'PRAGMA synchronous=FULL',
+]
+
 # 定義系所對照表
 DEPARTMENT_MAPPING = {
     '護理系': '護理系',
@@ -40,72 +73,21 @@ DEPARTMENT_MAPPING = {
 }
 
 def create_tables(conn):
-    """建立資料庫表格"""
+    """建立資料庫表格 (schema 定義見 migrations.py)"""
     cursor = conn.cursor()
     
     # 刪除舊表格
     cursor.execute('DROP TABLE IF EXISTS enrollments')
     cursor.execute('DROP TABLE IF EXISTS courses')
     cursor.execute('DROP TABLE IF EXISTS users')
-    
-    # 建立使用者表
-    cursor.execute('''
-        CREATE TABLE users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # 建立課程表 (包含大綱所需欄位)
-    cursor.execute('''
-        CREATE TABLE courses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            semester TEXT NOT NULL,
-            department TEXT NOT NULL,
-            grade TEXT,
-            course_code TEXT NOT NULL,
-            course_name TEXT NOT NULL,
-            course_name_en TEXT,
-            instructor TEXT,
-            credits REAL,
-            course_type TEXT,
-            classroom TEXT,
-            day_time TEXT,
-            weekday TEXT,
-            period TEXT,
-            capacity INTEGER DEFAULT 60,
-            enrolled INTEGER DEFAULT 0,
-            class_group TEXT,
-            remarks TEXT,
-            course_summary TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # 建立選課記錄表
-    cursor.execute('''
-        CREATE TABLE enrollments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            course_id INTEGER NOT NULL,
-            status TEXT DEFAULT 'enrolled',
-            enrolled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (course_id) REFERENCES courses(id),
-            UNIQUE(user_id, course_id)
-        )
-    ''')
-    
-    # 建立索引
-    cursor.execute('CREATE INDEX idx_courses_semester ON courses(semester)')
-    cursor.execute('CREATE INDEX idx_courses_department ON courses(department)')
-    cursor.execute('CREATE INDEX idx_courses_grade ON courses(grade)')
-    cursor.execute('CREATE INDEX idx_enrollments_user ON enrollments(user_id)')
-    
+    cursor.execute('DROP TABLE IF EXISTS schema_version')
+    cursor.execute('DROP TABLE IF EXISTS archived_semesters')
+    cursor.execute('DROP TABLE IF EXISTS course_uploads')
+    cursor.execute('DROP TABLE IF EXISTS seat_changes')
     conn.commit()
+    
+    # 依版本建立表格與索引
+    migrations.migrate(conn, use_postgres=False, log=lambda msg: print(f"   {msg}"))
     print("✅ 資料表建立成功")
 
 def insert_test_users(conn):
@@ -389,8 +371,94 @@ def process_excel_file(file_path, semester):
         traceback.print_exc()
         return []
 
-def main():
-    """主程式"""
+def detect_semester(filename):
+    """從檔名提取學期 (例如: 課程查詢_1142.xls -> 1142)，找不到時回傳 None"""
+    match = re.search(r'(\d{4})', filename)
+    return match.group(1) if match else None
+
+def parse_semester_file(file_path, use_cache=True):
+    """
+    解析單一學期檔案 (在子行程中執行)，回傳 (檔名, 學期, 課程列表)
+    use_cache: 檔案內容未改變時直接讀取上次的解析結果 (見 parse_cache.py)
+    """
+    semester = detect_semester(file_path.name)
+    if semester is None:
+        semester = '1142'  # 預設學期
+        print(f"     ⚠️ {file_path.name} 無法識別學期，使用預設值: {semester}")
+
+    digest = parse_cache.file_sha256(file_path) if use_cache else None
+    if use_cache:
+        cached = parse_cache.load('build', semester, digest)
+        if cached is not None:
+            columns, courses, _errors = cached
+            if columns == COURSE_COLUMNS:
+                print(f"\n⚡ 使用快取: {file_path.name} (學期: {semester}, {len(courses)} 筆課程)")
+                return file_path.name, semester, courses
+
+    courses = process_excel_file(file_path, semester)
+    # 解析失敗時 process_excel_file 回傳空列表，不寫入快取
+    if use_cache and courses:
+        parse_cache.store('build', semester, digest, COURSE_COLUMNS, courses)
+    return file_path.name, semester, courses
+
+def iter_parsed_files(files, jobs, use_cache=True):
+    """
+    依檔案順序逐一產生解析結果 (檔名, 學期, 課程列表)
+    jobs > 1 時以多個行程同時解析，寫入端處理前一個檔案時其餘檔案持續解析；
+    結果仍依檔案順序交給寫入端，課程 id 與循序建立時相同
+    """
+    parse = partial(parse_semester_file, use_cache=use_cache)
+    if jobs <= 1 or len(files) <= 1:
+        for file_path in files:
+            yield parse(file_path)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+        yield from executor.map(parse, files)
+
+def bulk_load_courses(conn, parsed_files):
+    """
+    以批次 executemany 寫入所有課程 (單一交易)
+    寫入期間使用 BUILD_PRAGMAS，courses 的索引先移除、寫入完成後再依原定義建立
+    回傳寫入的課程數
+    """
+    cursor = conn.cursor()
+    for pragma in BUILD_PRAGMAS:
+        cursor.execute(pragma)
+
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'courses' AND sql IS NOT NULL"
+    )
+    indexes = cursor.fetchall()
+    for name, _sql in indexes:
+        cursor.execute(f'DROP INDEX {name}')
+
+    insert_sql = (
+        f"INSERT INTO courses ({', '.join(COURSE_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(COURSE_COLUMNS))})"
+    )
+    total = 0
+    for filename, semester, courses in parsed_files:
+        print(f"   - {filename} (學期: {semester}): {len(courses)} 筆")
+        for start in range(0, len(courses), BATCH_SIZE):
+            cursor.executemany(insert_sql, courses[start:start + BATCH_SIZE])
+        total += len(courses)
+
+    for name, sql in indexes:
+        cursor.execute(sql)
+    conn.commit()
+
+    for pragma in RESTORE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+    return total
+
+def main(jobs=None, use_cache=True):
+    """
+    主程式
+    jobs: 同時解析檔案的行程數，預設為 CPU 核心數
+    use_cache: 使用解析結果快取 (False 時一律重新解析 Excel)
+    """
+    jobs = jobs or os.cpu_count() or 1
     print("=" * 60)
     print("北護課程查詢系統 - 資料庫建立工具")
     print("=" * 60)
@@ -408,58 +476,21 @@ def main():
     
     # 自動搜尋所有課程查詢Excel檔案
     print("\n🔍 搜尋Excel檔案...")
-    all_courses = []
     
     # 列出目錄中所有檔案
-    all_files = list(UPLOAD_DIR.glob('*.xls')) + list(UPLOAD_DIR.glob('*.xlsx'))
-    print(f"   找到 {len(all_files)} 個Excel檔案")
-    
-    for file_path in all_files:
-        filename = file_path.name
-        print(f"   - {filename}")
-        
-        # 從檔名提取學期 (例如: 課程查詢_1142.xls -> 1142)
-        semester = None
-        if '1142' in filename:
-            semester = '1142'
-        elif '1141' in filename:
-            semester = '1141'
-        elif '1132' in filename:
-            semester = '1132'
-        elif '1131' in filename:
-            semester = '1131'
-        else:
-            # 嘗試從檔名提取4位數字作為學期
-            import re
-            match = re.search(r'(\d{4})', filename)
-            if match:
-                semester = match.group(1)
-            else:
-                semester = '1142'  # 預設學期
-                print(f"     ⚠️ 無法識別學期，使用預設值: {semester}")
-        
-        print(f"     學期: {semester}")
-        courses = process_excel_file(file_path, semester)
-        all_courses.extend(courses)
+    all_files = sorted(UPLOAD_DIR.glob('*.xls')) + sorted(UPLOAD_DIR.glob('*.xlsx'))
+    print(f"   找到 {len(all_files)} 個Excel檔案 (使用 {min(jobs, max(len(all_files), 1))} 個行程解析)")
     
     if not all_files:
         print("\n❌ 沒有找到任何Excel檔案！")
         print("   請確認Excel檔案放在以下目錄:")
         print(f"   {UPLOAD_DIR}")
     
-    # 插入課程資料
-    if all_courses:
-        cursor = conn.cursor()
-        cursor.executemany('''
-            INSERT INTO courses (
-                semester, department, grade, course_code, course_name,
-                course_name_en, instructor, credits, course_type, classroom, 
-                day_time, weekday, period, capacity, enrolled, 
-                class_group, remarks, course_summary
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', all_courses)
-        conn.commit()
-        print(f"\n✅ 成功插入 {len(all_courses)} 筆課程資料")
+    # 解析與寫入課程資料
+    start = time.perf_counter()
+    total = bulk_load_courses(conn, iter_parsed_files(all_files, jobs, use_cache))
+    if total:
+        print(f"\n✅ 成功插入 {total} 筆課程資料 ({time.perf_counter() - start:.2f} 秒)")
     
     # 顯示統計資訊
     cursor = conn.cursor()
@@ -493,4 +524,10 @@ def main():
     print(f"📁 資料庫檔案: {DB_PATH}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='從Excel檔案建立課程資料庫')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='同時解析檔案的行程數 (預設為 CPU 核心數，1 為循序處理)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用解析結果快取，重新解析所有 Excel 檔案')
+    args = parser.parse_args()
+    main(args.jobs, use_cache=not args.no_cache)
\ No newline at end of file
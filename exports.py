@@ -0,0 +1,161 @@
+# ==========================================================
+# 北護課程查詢系統 - 串流匯出 (CSV / XLSX)
+# 資料列由產生器逐批提供，轉成 CSV 或 XLSX 後立即送出，
+# 不會把整份結果放在記憶體，第一批資料讀到後瀏覽器就開始下載
+# XLSX 以 zipfile 串流寫入 (不需要 seek)，工作表使用 inline string
+# ==========================================================
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+# 每累積多少列送出一次
+FLUSH_ROWS = 500
+
+# XML 不允許的控制字元
+_ILLEGAL_XML_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return str(value)
+
+# ========================================
+# CSV
+# ========================================
+def csv_stream(columns, rows):
+    """columns: [(欄位, 標題)]；輸出 UTF-8 (含 BOM，Excel 開啟中文不會亂碼)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for _key, header in columns])
+    # 標題列立即送出，查詢排序期間瀏覽器已開始下載
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    keys = [key for key, _header in columns]
+    for count, row in enumerate(rows, 1):
+        # csv 模組會將 None 寫成空字串、其他值以 str() 轉換
+        writer.writerow([row.get(key) for key in keys])
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+# ========================================
+# XLSX
+# ========================================
+class _ChunkWriter:
+    """zipfile 的輸出目標：寫入的內容暫存，由產生器取出後送出"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>'''
+
+_ROOT_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+
+_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>'''
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            text = escape(_ILLEGAL_XML_RE.sub('', _text(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        else:
+            cells.append(f'<c><v>{value}</v></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+def xlsx_stream(columns, rows, sheet_name='Sheet1'):
+    """columns: [(欄位, 標題)]；逐批輸出 XLSX 檔案內容"""
+    output = _ChunkWriter()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31])))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield output.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row([header for _key, header in columns]).encode('utf-8'))
+            keys = [key for key, _header in columns]
+            for count, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row([row.get(key) for key in keys]).encode('utf-8'))
+                if count % FLUSH_ROWS == 0:
+                    yield output.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield output.drain()
+
+# ========================================
+# Flask 回應
+# ========================================
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv'),  # Response 會自動加上 charset=utf-8
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+def export_response(fmt, filename, columns, rows):
+    """
+    回傳串流下載回應；fmt 不支援時回傳 None
+    rows: 產生 dict 的 iterable (例如 app.stream_query)
+    """
+    if fmt not in EXPORT_FORMATS:
+        return None
+    stream, mimetype = EXPORT_FORMATS[fmt]
+    return Response(
+        stream_with_context(stream(columns, rows)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{fmt}"',
+            # 不讓反向代理 (nginx) 緩衝整份檔案
+            'X-Accel-Buffering': 'no',
+        }
+    )
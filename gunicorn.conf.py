@@ -0,0 +1,27 @@
+# ==========================================================
+# gunicorn 設定檔 (gunicorn 啟動時自動讀取)
+# 使用方法: gunicorn app:app
+# ==========================================================
+
+import os
+
+# 部署環境 (Render) 的請求經過一層反向代理，流量限制依 X-Forwarded-For 取得用戶端 IP
+# (未設定時所有未登入的用戶端都是代理的 IP，共用同一份額度)；直接對外服務時請設定 PROXY_HOPS=0
+os.environ.setdefault('PROXY_HOPS', '1')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+
+def on_starting(server):
+    """在 master 行程中執行一次資料庫初始化，worker 啟動時不再執行 DDL"""
+    if os.environ.get('SKIP_INIT_DB'):
+        return
+    from app import init_db
+    init_db()
+
+def post_worker_init(worker):
+    """使用欄式搜尋引擎時，worker 啟動後先載入課程目錄，避免第一個請求等待"""
+    from app import course_catalog
+    if course_catalog.columnar:
+        course_catalog.ensure_fresh()
@@ -10,6 +10,8 @@ import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+import migrations
+
 # 從環境變數取得資料庫連接字串
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
@@ -41,8 +43,13 @@ except Exception as e:
 print("\n🗑️ 清理舊表格...")
 try:
     cursor.execute('DROP TABLE IF EXISTS enrollments CASCADE')
+    cursor.execute('DROP TABLE IF EXISTS courses_archive CASCADE')
     cursor.execute('DROP TABLE IF EXISTS courses CASCADE')
     cursor.execute('DROP TABLE IF EXISTS users CASCADE')
+    cursor.execute('DROP TABLE IF EXISTS schema_version')
+    cursor.execute('DROP TABLE IF EXISTS archived_semesters')
+    cursor.execute('DROP TABLE IF EXISTS course_uploads')
+    cursor.execute('DROP TABLE IF EXISTS seat_changes')
     conn.commit()
     print("✅ 舊表格已清理")
 except Exception as e:
@@ -50,107 +57,17 @@ except Exception as e:
     conn.rollback()
 
 # ========================================
-# 創建使用者表
+# 依版本建立表格與索引 (schema 定義見 migrations.py)
 # ========================================
-print("\n📋 創建 users 表...")
+print("\n📋 套用資料庫版本...")
 try:
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'student',
-            name TEXT DEFAULT '',
-            student_id TEXT DEFAULT '',
-            department TEXT DEFAULT '',
-            class_name TEXT DEFAULT '',
-            phone TEXT DEFAULT '',
-            email TEXT DEFAULT '',
-            avatar TEXT DEFAULT '🐱',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    print("✅ users 表創建成功")
+    migrations.migrate(conn, use_postgres=True, log=lambda msg: print(f"   {msg}"))
+    print(f"✅ 資料庫版本: {migrations.current_version(conn)}")
 except Exception as e:
-    print(f"❌ 創建 users 表失敗: {e}")
+    print(f"❌ 套用資料庫版本失敗: {e}")
     conn.rollback()
     exit(1)
 
-# ========================================
-# 創建課程表
-# ========================================
-print("\n📋 創建 courses 表...")
-try:
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS courses (
-            id SERIAL PRIMARY KEY,
-            semester TEXT NOT NULL,
-            department TEXT NOT NULL,
-            grade TEXT,
-            course_code TEXT NOT NULL,
-            course_name TEXT NOT NULL,
-            course_name_en TEXT,
-            instructor TEXT,
-            credits REAL,
-            course_type TEXT,
-            classroom TEXT,
-            day_time TEXT,
-            weekday TEXT,
-            period TEXT,
-            capacity INTEGER DEFAULT 60,
-            enrolled INTEGER DEFAULT 0,
-            class_group TEXT,
-            remarks TEXT,
-            course_summary TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    print("✅ courses 表創建成功")
-except Exception as e:
-    print(f"❌ 創建 courses 表失敗: {e}")
-    conn.rollback()
-    exit(1)
-
-# ========================================
-# 創建選課記錄表
-# ========================================
-print("\n📋 創建 enrollments 表...")
-try:
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS enrollments (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
-            status TEXT DEFAULT 'enrolled',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, course_id)
-        )
-    ''')
-    conn.commit()
-    print("✅ enrollments 表創建成功")
-except Exception as e:
-    print(f"❌ 創建 enrollments 表失敗: {e}")
-    conn.rollback()
-    exit(1)
-
-# ========================================
-# 創建索引
-# ========================================
-print("\n📋 創建索引...")
-try:
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_semester ON courses(semester)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_department ON courses(department)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_grade ON courses(grade)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_user ON enrollments(user_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments(course_id)')
-    conn.commit()
-    print("✅ 索引創建成功")
-except Exception as e:
-    print(f"⚠️ 創建索引時發生錯誤: {e}")
-    conn.rollback()
-
 # ========================================
 # 插入測試使用者
 # ========================================
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+北護課程查詢系統 - 資料庫版本遷移
+所有入口 (app.py init_db、/api/init-database、init_postgres.py、create_database.py)
+共用這一份 schema 定義，依 schema_version 表依序套用尚未執行的版本
+使用方法: python migrations.py [--check]  (依 DATABASE_URL 決定 PostgreSQL 或 SQLite)
+          --check: 遷移後與全新建立的資料庫比較各表格欄位，不一致時回傳 1
+
+新增版本時只能往 MIGRATIONS 後面追加，不要修改已發布的版本。
+PostgreSQL 上標記 online 的版本以 autocommit 執行，索引使用
+CREATE INDEX CONCURRENTLY 建立，不會鎖住正在服務的 courses 表。
+"""
+
+import os
+import sqlite3
+import sys
+
+# PostgreSQL advisory lock 代號，避免多個行程同時執行遷移
+MIGRATION_LOCK_ID = 1131_1142
+
+# ========================================
+# 共用工具
+# ========================================
+def _scalar(row):
+    """取出單欄查詢結果 (相容 RealDictCursor 與 sqlite3)"""
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return list(row.values())[0]
+    return row[0]
+
+def _sqlite_columns(cursor, table):
+    """取得 SQLite 表格現有欄位"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {_row_get(row, 'name', 1) for row in cursor.fetchall()}
+
+def _row_get(row, key, index):
+    try:
+        return row[key]
+    except (IndexError, KeyError, TypeError):
+        return row[index]
+
+def _create_index(cursor, use_postgres, name, table, columns, unique=False):
+    """建立索引；PostgreSQL 使用 CONCURRENTLY (需在 autocommit 下執行)"""
+    unique_sql = 'UNIQUE ' if unique else ''
+    if use_postgres:
+        # CONCURRENTLY 中途失敗會留下 INVALID 索引，IF NOT EXISTS 會誤判為已存在
+        cursor.execute('''
+            SELECT NOT i.indisvalid AS invalid
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s
+        ''', (name,))
+        row = cursor.fetchone()
+        if row is not None and _scalar(row):
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+        cursor.execute(f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}({columns})')
+    else:
+        cursor.execute(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table}({columns})')
+
+# ========================================
+# 版本 1: 基本表格
+# ========================================
+def _v1_base_tables(cursor, use_postgres):
+    pk = 'SERIAL PRIMARY KEY' if use_postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS users (
+            id {pk},
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'student',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS courses (
+            id {pk},
+            semester TEXT NOT NULL,
+            department TEXT NOT NULL,
+            grade TEXT,
+            course_code TEXT NOT NULL,
+            course_name TEXT NOT NULL,
+            course_name_en TEXT,
+            instructor TEXT,
+            credits REAL,
+            course_type TEXT,
+            classroom TEXT,
+            day_time TEXT,
+            weekday TEXT,
+            period TEXT,
+            capacity INTEGER DEFAULT 60,
+            enrolled INTEGER DEFAULT 0,
+            class_group TEXT,
+            remarks TEXT,
+            course_summary TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    if use_postgres:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS enrollments (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                course_id INTEGER REFERENCES courses(id) ON DELETE CASCADE,
+                status TEXT DEFAULT 'enrolled',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS enrollments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                status TEXT DEFAULT 'enrolled',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (course_id) REFERENCES courses(id)
+            )
+        ''')
+
+# ========================================
+# 版本 2: 使用者個人檔案欄位
+# ========================================
+PROFILE_COLUMNS = [
+    ('name', "''"),
+    ('student_id', "''"),
+    ('department', "''"),
+    ('class_name', "''"),
+    ('phone', "''"),
+    ('email', "''"),
+    ('avatar', "'🐱'"),
+]
+
+def _v2_profile_columns(cursor, use_postgres):
+    if use_postgres:
+        for col, default in PROFILE_COLUMNS:
+            cursor.execute(f'ALTER TABLE users ADD COLUMN IF NOT EXISTS {col} TEXT DEFAULT {default}')
+    else:
+        existing = _sqlite_columns(cursor, 'users')
+        for col, default in PROFILE_COLUMNS:
+            if col not in existing:
+                cursor.execute(f'ALTER TABLE users ADD COLUMN {col} TEXT DEFAULT {default}')
+
+# ========================================
+# 版本 3: 選課記錄唯一限制 (先清除重複資料，保留最新一筆)
+# ========================================
+def _v3_enrollment_unique(cursor, use_postgres):
+    cursor.execute('''
+        DELETE FROM enrollments
+        WHERE id NOT IN (SELECT MAX(id) FROM enrollments GROUP BY user_id, course_id)
+    ''')
+    _create_index(cursor, use_postgres, 'idx_enrollments_user_course',
+                  'enrollments', 'user_id, course_id', unique=True)
+
+# ========================================
+# 版本 4: 查詢索引
+# ========================================
+def _v4_query_indexes(cursor, use_postgres):
+    _create_index(cursor, use_postgres, 'idx_courses_semester', 'courses', 'semester')
+    _create_index(cursor, use_postgres, 'idx_courses_department', 'courses', 'department')
+    _create_index(cursor, use_postgres, 'idx_courses_grade', 'courses', 'grade')
+    _create_index(cursor, use_postgres, 'idx_enrollments_user', 'enrollments', 'user_id')
+    _create_index(cursor, use_postgres, 'idx_enrollments_course', 'enrollments', 'course_id')
+
+# ========================================
+# 版本 5: 跨學期課程歷史索引 (同一課程代碼依學期排列)
+# ========================================
+def _v5_course_history_index(cursor, use_postgres):
+    _create_index(cursor, use_postgres, 'idx_courses_code_semester', 'courses', 'course_code, semester')
+
+# ========================================
+# 版本 6: 學期封存 (見 archive.py)
+# ========================================
+def _v6_semester_archive(cursor, use_postgres):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_semesters (
+            semester TEXT PRIMARY KEY,
+            course_count INTEGER DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if use_postgres:
+        # 每個封存學期一個 partition (封存時建立)
+        cursor.execute('CREATE TABLE IF NOT EXISTS courses_archive (LIKE courses) PARTITION BY LIST (semester)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_archive_code_semester ON courses_archive (course_code, semester)')
+        # 之後若 courses 新增欄位，需在新版本中重建此 view
+        cursor.execute('CREATE OR REPLACE VIEW courses_all AS SELECT * FROM courses UNION ALL SELECT * FROM courses_archive')
+        # 封存的課程保留選課記錄，刪除課程時由 app 自行刪除選課記錄 (與 SQLite 相同)
+        cursor.execute('ALTER TABLE enrollments DROP CONSTRAINT IF EXISTS enrollments_course_id_fkey')
+
+# ========================================
+# 版本 7: 使用者列表搜尋與分頁索引
+# 搜尋為前綴比對: PostgreSQL 使用 lower(欄位) text_pattern_ops (LIKE 'abc%')，
+# SQLite 使用 NOCASE 索引 (LIKE 預設不分大小寫，可直接使用索引)
+# ========================================
+USER_SEARCH_COLUMNS = ['username', 'student_id', 'name', 'department', 'class_name']
+
+def _v7_user_search_indexes(cursor, use_postgres):
+    for column in USER_SEARCH_COLUMNS:
+        expression = f'lower({column}) text_pattern_ops' if use_postgres else f'{column} COLLATE NOCASE'
+        _create_index(cursor, use_postgres, f'idx_users_{column}_search', 'users', expression)
+    _create_index(cursor, use_postgres, 'idx_users_role_username', 'users', 'role, username')
+
+# ========================================
+# 版本 8: 課程檔案上傳紀錄 (相同檔案重複上傳時直接回傳上次結果)
+# ========================================
+def _v8_course_uploads(cursor, use_postgres):
+    pk = 'SERIAL PRIMARY KEY' if use_postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS course_uploads (
+            id {pk},
+            semester TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            filename TEXT,
+            size INTEGER,
+            result TEXT,
+            uploaded_by INTEGER,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_course_uploads_semester ON course_uploads (semester, id)')
+
+# ========================================
+# 版本 9: 名額異動紀錄 (即時名額推播的變更來源，見 seats.py)
+# 由 trigger 寫入，所有修改選課記錄的路徑 (選課、刪除、匯入、批次刪除課程...) 都會記錄
+# 只記錄影響已選人數 (status = 'enrolled') 或容量的異動
+# ========================================
+def _v9_seat_changes(cursor, use_postgres):
+    pk = 'BIGSERIAL PRIMARY KEY' if use_postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS seat_changes (
+            id {pk},
+            course_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if use_postgres:
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION record_seat_change() RETURNS trigger AS $$
+            BEGIN
+                IF TG_TABLE_NAME = 'courses' THEN
+                    IF OLD.capacity IS DISTINCT FROM NEW.capacity THEN
+                        INSERT INTO seat_changes (course_id) VALUES (NEW.id);
+                    END IF;
+                    RETURN NULL;
+                END IF;
+                IF TG_OP <> 'INSERT' AND OLD.status = 'enrolled' THEN
+                    INSERT INTO seat_changes (course_id) VALUES (OLD.course_id);
+                END IF;
+                IF TG_OP <> 'DELETE' AND NEW.status = 'enrolled' THEN
+                    INSERT INTO seat_changes (course_id) VALUES (NEW.course_id);
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trg_enrollments_seat_change ON enrollments')
+        cursor.execute('''
+            CREATE TRIGGER trg_enrollments_seat_change
+            AFTER INSERT OR DELETE OR UPDATE OF status, course_id ON enrollments
+            FOR EACH ROW EXECUTE PROCEDURE record_seat_change()
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trg_courses_seat_change ON courses')
+        cursor.execute('''
+            CREATE TRIGGER trg_courses_seat_change
+            AFTER UPDATE OF capacity ON courses
+            FOR EACH ROW EXECUTE PROCEDURE record_seat_change()
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_enrollments_seat_insert
+            AFTER INSERT ON enrollments WHEN NEW.status = 'enrolled'
+            BEGIN
+                INSERT INTO seat_changes (course_id) VALUES (NEW.course_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_enrollments_seat_delete
+            AFTER DELETE ON enrollments WHEN OLD.status = 'enrolled'
+            BEGIN
+                INSERT INTO seat_changes (course_id) VALUES (OLD.course_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_enrollments_seat_update
+            AFTER UPDATE OF status, course_id ON enrollments
+            WHEN OLD.status = 'enrolled' OR NEW.status = 'enrolled'
+            BEGIN
+                INSERT INTO seat_changes (course_id) SELECT OLD.course_id WHERE OLD.status = 'enrolled';
+                INSERT INTO seat_changes (course_id) SELECT NEW.course_id WHERE NEW.status = 'enrolled';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_courses_seat_capacity
+            AFTER UPDATE OF capacity ON courses WHEN OLD.capacity IS NOT NEW.capacity
+            BEGIN
+                INSERT INTO seat_changes (course_id) VALUES (NEW.id);
+            END
+        ''')
+
+# ========================================
+# 版本 10: 統一選課記錄的時間欄位
+# 舊版 create_database.py 建立的 enrollments 使用 enrolled_at，其他入口使用 created_at
+# ========================================
+def _v10_enrollment_created_at(cursor, use_postgres):
+    if use_postgres:
+        cursor.execute('''
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'enrollments'
+        ''')
+        columns = {_row_get(row, 'column_name', 0) for row in cursor.fetchall()}
+    else:
+        columns = _sqlite_columns(cursor, 'enrollments')
+    if 'enrolled_at' not in columns or 'created_at' in columns:
+        return
+
+    if use_postgres or sqlite3.sqlite_version_info >= (3, 25, 0):
+        cursor.execute('ALTER TABLE enrollments RENAME COLUMN enrolled_at TO created_at')
+        return
+
+    # SQLite 3.25 以前不支援 RENAME COLUMN: 複製到新表後重建索引與 trigger
+    cursor.execute('ALTER TABLE enrollments RENAME TO enrollments_old')
+    cursor.execute('''
+        CREATE TABLE enrollments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'enrolled',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (course_id) REFERENCES courses(id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO enrollments (id, user_id, course_id, status, created_at)
+        SELECT id, user_id, course_id, status, enrolled_at FROM enrollments_old
+    ''')
+    cursor.execute('DROP TABLE enrollments_old')
+    _create_index(cursor, use_postgres, 'idx_enrollments_user_course', 'enrollments', 'user_id, course_id', unique=True)
+    _create_index(cursor, use_postgres, 'idx_enrollments_user', 'enrollments', 'user_id')
+    _create_index(cursor, use_postgres, 'idx_enrollments_course', 'enrollments', 'course_id')
+    _v9_seat_changes(cursor, use_postgres)
+
+# ========================================
+# 版本 11: 上傳紀錄加上匯入後的課程資料版本 (catalog version)
+# 課程在匯入後被修改過時，相同檔案需要重新處理
+# ========================================
+def _v11_upload_catalog_version(cursor, use_postgres):
+    if use_postgres:
+        cursor.execute('ALTER TABLE course_uploads ADD COLUMN IF NOT EXISTS catalog_version TEXT')
+    elif 'catalog_version' not in _sqlite_columns(cursor, 'course_uploads'):
+        cursor.execute('ALTER TABLE course_uploads ADD COLUMN catalog_version TEXT')
+
+# 版本清單 (online=True 表示 PostgreSQL 上以 autocommit 執行，可使用 CONCURRENTLY)
+MIGRATIONS = [
+    {'version': 1, 'description': '建立 users / courses / enrollments 表', 'apply': _v1_base_tables},
+    {'version': 2, 'description': '新增使用者個人檔案欄位', 'apply': _v2_profile_columns},
+    {'version': 3, 'description': '選課記錄 (user_id, course_id) 唯一索引', 'apply': _v3_enrollment_unique, 'online': True},
+    {'version': 4, 'description': '課程與選課查詢索引', 'apply': _v4_query_indexes, 'online': True},
+    {'version': 5, 'description': '課程代碼 + 學期索引 (跨學期課程歷史)', 'apply': _v5_course_history_index, 'online': True},
+    {'version': 6, 'description': '學期封存 (archived_semesters、courses_archive)', 'apply': _v6_semester_archive},
+    {'version': 7, 'description': '使用者列表搜尋與分頁索引', 'apply': _v7_user_search_indexes, 'online': True},
+    {'version': 8, 'description': '課程檔案上傳紀錄 (course_uploads)', 'apply': _v8_course_uploads},
+    {'version': 9, 'description': '名額異動紀錄 (seat_changes) 與選課記錄 trigger', 'apply': _v9_seat_changes},
+    {'version': 10, 'description': '選課記錄時間欄位統一為 created_at', 'apply': _v10_enrollment_created_at},
+    {'version': 11, 'description': '上傳紀錄加上課程資料版本 (catalog_version)', 'apply': _v11_upload_catalog_version},
+]
+
+LATEST_VERSION = MIGRATIONS[-1]['version']
+
+# ========================================
+# 遷移執行器
+# ========================================
+def current_version(conn):
+    """取得目前資料庫版本 (尚未建立 schema_version 時為 0)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    version = _scalar(cursor.fetchone())
+    cursor.close()
+    return version or 0
+
+def migrate(conn, use_postgres, log=print):
+    """
+    套用所有尚未執行的版本，回傳本次套用的版本清單
+    conn: get_db() 取得的連線 (psycopg2 或 sqlite3)
+    """
+    cursor = conn.cursor()
+    placeholder = '%s' if use_postgres else '?'
+
+    if use_postgres:
+        cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+
+        applied = []
+        version = current_version(conn)
+        for migration in MIGRATIONS:
+            if migration['version'] <= version:
+                continue
+
+            log(f"套用版本 {migration['version']}: {migration['description']}")
+            online = use_postgres and migration.get('online')
+            if online:
+                conn.commit()
+                conn.autocommit = True
+            try:
+                migration['apply'](cursor, use_postgres)
+                cursor.execute(
+                    f'INSERT INTO schema_version (version, description) VALUES ({placeholder}, {placeholder})',
+                    (migration['version'], migration['description'])
+                )
+                if not online:
+                    conn.commit()
+            except Exception:
+                if not online:
+                    conn.rollback()
+                raise
+            finally:
+                if online:
+                    conn.autocommit = False
+            applied.append(migration['version'])
+
+        if not applied:
+            log(f"資料庫已是最新版本 ({version})")
+        return applied
+    finally:
+        if use_postgres:
+            conn.rollback()
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+            conn.commit()
+        cursor.close()
+
+# ========================================
+# Schema 檢查
+# 與全新建立 (空白 SQLite 套用所有版本) 的資料庫比較各表格欄位，
+# 確認由舊版腳本建立的資料庫遷移後與新資料庫一致
+# ========================================
+def table_columns(conn, use_postgres):
+    """各表格的欄位名稱 {表格: {欄位...}}"""
+    cursor = conn.cursor()
+    if use_postgres:
+        cursor.execute('''
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema()
+        ''')
+        tables = {}
+        for row in cursor.fetchall():
+            tables.setdefault(_row_get(row, 'table_name', 0), set()).add(_row_get(row, 'column_name', 1))
+    else:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        tables = {_row_get(row, 'name', 0): None for row in cursor.fetchall()}
+        for table in tables:
+            tables[table] = _sqlite_columns(cursor, table)
+    cursor.close()
+    return tables
+
+def schema_differences(conn, use_postgres):
+    """回傳與全新資料庫不一致之處 (字串清單，一致時為空清單)"""
+    fresh = sqlite3.connect(':memory:')
+    migrate(fresh, use_postgres=False, log=lambda msg: None)
+    expected = table_columns(fresh, use_postgres=False)
+    fresh.close()
+
+    actual = table_columns(conn, use_postgres)
+    differences = []
+    for table, columns in sorted(expected.items()):
+        if table not in actual:
+            differences.append(f'缺少表格 {table}')
+            continue
+        missing = columns - actual[table]
+        extra = actual[table] - columns
+        if missing:
+            differences.append(f'{table} 缺少欄位: {", ".join(sorted(missing))}')
+        if extra:
+            differences.append(f'{table} 多出欄位: {", ".join(sorted(extra))}')
+    return differences
+
+if __name__ == '__main__':
+    DATABASE_URL = os.environ.get('DATABASE_URL')
+    if DATABASE_URL:
+        import psycopg2
+        if DATABASE_URL.startswith('postgres://'):
+            DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+        connection = psycopg2.connect(DATABASE_URL)
+    else:
+        connection = sqlite3.connect('database.db')
+    migrate(connection, bool(DATABASE_URL))
+    if '--check' in sys.argv:
+        problems = schema_differences(connection, bool(DATABASE_URL))
+        for problem in problems:
+            print(f"❌ {problem}")
+        if not problems:
+            print("✅ schema 與全新建立的資料庫一致")
+        connection.close()
+        sys.exit(1 if problems else 0)
+    connection.close()
@@ -0,0 +1,90 @@
+# ==========================================================
+# 北護課程查詢系統 - 課程 Excel 解析結果快取
+# 解析 .xls (xlrd) 是建立資料庫與匯入課程最慢的步驟；
+# 解析後的課程資料以欄式格式存放 (安裝 pyarrow 時用 Parquet，否則用 pickle 保存各欄的列表)，
+# 以來源檔案的 SHA-256 為鍵，檔案內容改變時鍵不同，自動重新解析並清除同學期的舊快取
+# 解析邏輯改變時請調高 PARSER_VERSION，讓舊快取全部失效
+# ==========================================================
+
+import glob
+import hashlib
+import os
+import pickle
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # 未安裝 pyarrow 時使用 pickle
+    pyarrow = None
+
+CACHE_DIR = os.environ.get(
+    'PARSE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parse_cache')
+)
+
+# 解析邏輯的版本 (create_database.process_excel_file / course_import.parse_course_sheet)
+PARSER_VERSION = 1
+
+SUFFIX = '.parquet' if pyarrow is not None else '.pkl'
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """來源檔案的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _path(kind, semester, digest):
+    return os.path.join(CACHE_DIR, f'{kind}_{semester}_{digest[:32]}_v{PARSER_VERSION}{SUFFIX}')
+
+def load(kind, semester, digest):
+    """
+    讀取快取，回傳 (欄位列表, 各列 tuple 列表, 錯誤列數)；沒有快取或無法讀取時回傳 None
+    kind: 解析器名稱 ('build' 建立資料庫、'import' 管理者匯入)
+    """
+    path = _path(kind, semester, digest)
+    if not os.path.exists(path):
+        return None
+    try:
+        if pyarrow is not None:
+            table = pyarrow.parquet.read_table(path)
+            columns = table.column_names
+            data = [table.column(name).to_pylist() for name in columns]
+            errors = int((table.schema.metadata or {}).get(b'errors', b'0'))
+        else:
+            with open(path, 'rb') as f:
+                payload = pickle.load(f)
+            columns, data, errors = payload['columns'], payload['data'], payload['errors']
+    except Exception as e:
+        print(f"[parse_cache] 無法讀取快取 {os.path.basename(path)}: {e}")
+        return None
+    return columns, list(zip(*data)), errors
+
+def store(kind, semester, digest, columns, rows, errors=0):
+    """寫入快取 (先寫暫存檔再改名，同時執行的行程不會讀到寫一半的檔案)，並清除同學期的舊快取"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(kind, semester, digest)
+    data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        if pyarrow is not None:
+            table = pyarrow.table(dict(zip(columns, data)))
+            table = table.replace_schema_metadata({'errors': str(errors)})
+            pyarrow.parquet.write_table(table, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'columns': list(columns), 'data': data, 'errors': errors}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[parse_cache] 無法寫入快取 {os.path.basename(path)}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    for old in glob.glob(os.path.join(CACHE_DIR, f'{glob.escape(kind)}_{glob.escape(semester)}_*')):
+        if old != path and not old.endswith('.tmp'):
+            try:
+                os.remove(old)
+            except OSError:  # 其他行程已刪除
+                pass
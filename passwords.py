@@ -0,0 +1,98 @@
+# ==========================================================
+# 北護課程查詢系統 - 密碼雜湊
+# 雜湊計算在固定大小的執行緒池執行 (hashlib 計算時會釋放 GIL)，
+# 大量同時登入時最多只佔用 HASH_WORKERS 個 CPU，等待數量超過
+# HASH_QUEUE_LIMIT 時直接回報忙碌，不會讓請求執行緒無限排隊
+# ==========================================================
+
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# 雜湊方法與成本 (werkzeug 格式)，調整後舊雜湊會在下次登入時自動更新
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 2))
+HASH_QUEUE_LIMIT = int(os.environ.get('HASH_QUEUE_LIMIT', HASH_WORKERS * 8))
+HASH_QUEUE_TIMEOUT = float(os.environ.get('HASH_QUEUE_TIMEOUT', 5))
+
+# 管理者重設密碼與批次建立帳號 (名單未填密碼) 時使用的預設密碼
+DEFAULT_PASSWORD = os.environ.get('DEFAULT_PASSWORD', 'pass123')
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(HASH_QUEUE_LIMIT)
+_dummy_hash = None
+
+class HashPoolBusy(Exception):
+    """雜湊工作佇列已滿"""
+
+def _run(fn, *args):
+    """在雜湊執行緒池執行並等待結果"""
+    if not _slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+        raise HashPoolBusy()
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+def is_hashed(stored):
+    """判斷資料庫中的密碼是否已經是雜湊值 (舊資料為明文)"""
+    return bool(stored) and '$' in stored and stored.split('$', 1)[0].startswith(('pbkdf2:', 'scrypt'))
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def hash_many(values, progress=None):
+    """
+    批次雜湊 (批次建立帳號用)，回傳 {明文: 雜湊}
+    每次只送出 HASH_WORKERS 個工作，讓同時進行的登入仍能排進執行緒池
+    progress(done, total): 每批完成後呼叫
+    """
+    values = list(values)
+    hashes = {}
+    for start in range(0, len(values), HASH_WORKERS):
+        batch = values[start:start + HASH_WORKERS]
+        futures = [_executor.submit(generate_password_hash, value, PASSWORD_HASH_METHOD) for value in batch]
+        for value, future in zip(batch, futures):
+            hashes[value] = future.result()
+        if progress:
+            progress(len(hashes), len(values))
+    return hashes
+
+def verify_password(stored, password):
+    """驗證密碼，同時支援雜湊值與尚未轉換的明文"""
+    if not stored or not password:
+        return False
+    if is_hashed(stored):
+        return _run(check_password_hash, stored, password)
+    return hmac.compare_digest(stored.encode(), password.encode())
+
+def verify_missing_user(password):
+    """帳號不存在時也做一次雜湊驗證，讓回應時間無法用來判斷帳號是否存在"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password('dummy-password')
+    verify_password(_dummy_hash, password)
+    return False
+
+def _hash_params(method):
+    """
+    補上 werkzeug 的預設參數，回傳雜湊值開頭記錄的完整方法
+    例如 scrypt -> scrypt:32768:8:1、pbkdf2 -> pbkdf2:sha256:<預設次數>
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        defaults = [str(2 ** 15), '8', '1']
+    elif name == 'pbkdf2':
+        defaults = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join([name, *args, *defaults[len(args):]])
+
+def needs_rehash(stored):
+    """明文或雜湊方法、成本與目前設定不同時需要重新雜湊"""
+    if not is_hashed(stored):
+        return True
+    return _hash_params(stored.split('$', 1)[0]) != _hash_params(PASSWORD_HASH_METHOD)
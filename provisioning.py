@@ -0,0 +1,265 @@
+# ==========================================================
+# 北護課程查詢系統 - 批次建立帳號 (CSV / Excel 名單)
+# 名單以 pandas 整欄驗證 (不逐列呼叫 API)，所有帳號在同一個交易寫入:
+# 先放進暫存表 (PostgreSQL 用 COPY、SQLite 用 executemany)，
+# 再以一次 INSERT ... SELECT 新增、一次 UPDATE ... FROM 更新已存在的帳號
+# 大型名單在背景執行緒處理，進度存放在共用的儲存後端 (見 session_store.py)
+# ==========================================================
+
+import csv
+import io
+import json
+import secrets
+import time
+
+import passwords
+
+# 欄位 -> 名單中可接受的標題 (不分大小寫)
+ROSTER_FIELDS = {
+    'username': ('username', 'account', '帳號', '學號', '員工編號'),
+    'password': ('password', '密碼'),
+    'name': ('name', '姓名'),
+    'role': ('role', '身分', '角色'),
+    'student_id': ('student_id', '學生證號'),
+    'department': ('department', '系所'),
+    'class_name': ('class_name', 'class', '班級'),
+    'phone': ('phone', '電話', '手機'),
+    'email': ('email', 'e-mail', '電子郵件'),
+}
+
+ROLE_NAMES = {'student': 'student', '學生': 'student', 'admin': 'admin', '管理員': 'admin'}
+
+USERNAME_PATTERN = r'[A-Za-z0-9_.@-]{1,64}'
+EMAIL_PATTERN = r'[^@\s]+@[^@\s]+\.[^@\s]+'
+
+# 回報的錯誤/衝突筆數上限 (總數另外回傳)
+REPORT_LIMIT = 200
+
+# 匯入工作進度保存秒數
+JOB_TTL = 24 * 3600
+
+# 寫入 users 的欄位 (password 為雜湊值)
+USER_COLUMNS = ['username', 'password', 'name', 'role', 'student_id',
+                'department', 'class_name', 'phone', 'email']
+
+class RosterError(Exception):
+    """名單無法讀取或缺少必要欄位"""
+
+# ========================================
+# 讀取與驗證
+# ========================================
+def read_roster(pd, file, filename):
+    """讀取名單 (所有欄位皆為字串)，標題對應到 ROSTER_FIELDS 的欄位名稱"""
+    if filename.lower().endswith('.csv'):
+        df = pd.read_csv(file, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    elif filename.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(file, dtype=str, keep_default_na=False)
+    else:
+        raise RosterError('檔案格式錯誤，請上傳 CSV 或 Excel 檔案')
+
+    aliases = {alias.lower(): field for field, names in ROSTER_FIELDS.items() for alias in names}
+    renamed = {}
+    for column in df.columns:
+        field = aliases.get(str(column).strip().lower())
+        if field and field not in renamed.values():
+            renamed[column] = field
+    if 'username' not in renamed.values():
+        raise RosterError('名單缺少帳號欄位 (username / 帳號 / 學號)')
+
+    df = df[list(renamed)].rename(columns=renamed)
+    for field in ROSTER_FIELDS:
+        if field not in df.columns:
+            df[field] = ''
+    return df.fillna('').astype(str).apply(lambda column: column.str.strip())
+
+def validate_roster(df):
+    """
+    整欄驗證名單，回傳 (可匯入的 DataFrame, 錯誤列表)
+    錯誤: {'row': 名單中的列號 (含標題列), 'username', 'message'}
+    """
+    roles = df['role'].str.lower().map(ROLE_NAMES)
+    df = df.assign(role=roles.where(df['role'] != '', 'student'))
+
+    checks = [
+        (df['username'] == '', '帳號為空'),
+        (~df['username'].str.fullmatch(USERNAME_PATTERN) & (df['username'] != ''), '帳號格式錯誤'),
+        (df['role'].isna(), '身分錯誤 (student / admin)'),
+        ((df['email'] != '') & ~df['email'].str.fullmatch(EMAIL_PATTERN), 'Email 格式錯誤'),
+        (df['username'].duplicated() & (df['username'] != ''), '帳號在名單中重複'),
+    ]
+    invalid = None
+    errors = []
+    for mask, message in checks:
+        mask = mask.fillna(True) & (~invalid if invalid is not None else True)
+        for index in df.index[mask]:
+            errors.append({'row': int(index) + 2, 'username': df.at[index, 'username'], 'message': message})
+        invalid = mask if invalid is None else invalid | mask
+    errors.sort(key=lambda error: error['row'])
+
+    valid = df[~invalid].copy()
+    # 學生未填學號時以帳號作為學號 (與單筆新增帳號相同)
+    missing_id = (valid['student_id'] == '') & (valid['role'] == 'student')
+    valid.loc[missing_id, 'student_id'] = valid.loc[missing_id, 'username']
+    valid['row'] = valid.index + 2
+    return valid, errors
+
+# ========================================
+# 寫入資料庫
+# ========================================
+def _hash_passwords(valid, progress):
+    """
+    回傳每列的密碼雜湊 (未填密碼的列為 '')
+    相同的密碼只計算一次；新帳號未填密碼時使用預設密碼
+    """
+    plain = valid['password'].tolist()
+    hashes = passwords.hash_many(set(plain) - {''}, progress=progress)
+    return [hashes.get(value, '') for value in plain]
+
+def _create_staging(cursor, use_postgres, rows):
+    """建立暫存表並寫入名單"""
+    columns = ['row_number'] + USER_COLUMNS
+    if use_postgres:
+        cursor.execute(
+            'CREATE TEMP TABLE roster_import (row_number INTEGER, '
+            + ', '.join(f'{col} TEXT' for col in USER_COLUMNS) + ') ON COMMIT DROP'
+        )
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY roster_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    else:
+        cursor.execute('DROP TABLE IF EXISTS temp.roster_import')
+        cursor.execute(
+            'CREATE TEMP TABLE roster_import (row_number INTEGER, '
+            + ', '.join(f'{col} TEXT' for col in USER_COLUMNS) + ')'
+        )
+        cursor.executemany(
+            f"INSERT INTO roster_import ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows
+        )
+    cursor.execute('CREATE INDEX roster_import_username ON roster_import (username)')
+
+def upsert_users(conn, use_postgres, valid, update_existing=False, progress=None):
+    """
+    在同一個交易中新增名單中的帳號
+    update_existing=False: 已存在的帳號不變動，列為衝突
+    update_existing=True: 已存在的帳號更新個人資料 (名單有填密碼時一併更新密碼)
+    回傳 {'created', 'updated', 'conflicts': [{'row', 'username', 'user_id'}]}
+    """
+    progress = progress or (lambda **fields: None)
+    password_hashes = _hash_passwords(valid, lambda done, total: progress(stage='hashing', done=done, total=total))
+    progress(stage='writing', done=0, total=len(valid))
+
+    default_hash = passwords.hash_password(passwords.DEFAULT_PASSWORD)
+    rows = [
+        [row_number] + [password if col == 'password' else value for col, value in zip(USER_COLUMNS, values)]
+        for row_number, password, values in zip(
+            valid['row'].tolist(), password_hashes, valid[USER_COLUMNS].itertuples(index=False, name=None)
+        )
+    ]
+
+    placeholder = '%s' if use_postgres else '?'
+    cursor = conn.cursor()
+    try:
+        _create_staging(cursor, use_postgres, rows)
+
+        cursor.execute('''
+            SELECT r.row_number, r.username, u.id AS user_id
+            FROM roster_import r JOIN users u ON u.username = r.username
+            ORDER BY r.row_number
+        ''')
+        conflicts = [dict(row) for row in cursor.fetchall()]
+
+        profile_columns = [col for col in USER_COLUMNS if col not in ('username', 'password')]
+        cursor.execute(f'''
+            INSERT INTO users (username, password, {', '.join(profile_columns)})
+            SELECT r.username, COALESCE(NULLIF(r.password, ''), {placeholder}),
+                   {', '.join(f'r.{col}' for col in profile_columns)}
+            FROM roster_import r
+            WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.username = r.username)
+            ORDER BY r.row_number
+        ''', (default_hash,))
+        created = cursor.rowcount
+
+        updated = 0
+        if update_existing and conflicts:
+            assignments = ', '.join(
+                f"{col} = CASE WHEN r.{col} = '' THEN users.{col} ELSE r.{col} END"
+                for col in ['password'] + profile_columns
+            )
+            cursor.execute(f'''
+                UPDATE users SET {assignments}
+                FROM roster_import r
+                WHERE users.username = r.username
+            ''')
+            updated = cursor.rowcount
+
+        if not use_postgres:
+            cursor.execute('DROP TABLE temp.roster_import')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    progress(stage='writing', done=len(valid), total=len(valid))
+    return {
+        'created': created,
+        'updated': updated,
+        'conflicts': [
+            {'row': row['row_number'], 'username': row['username'], 'user_id': row['user_id']}
+            for row in conflicts
+        ],
+    }
+
+def build_report(result, errors, update_existing):
+    """整理回傳給前端的結果 (錯誤與衝突只列前 REPORT_LIMIT 筆)"""
+    conflicts = result['conflicts']
+    message = f"新增 {result['created']} 個帳號"
+    if update_existing:
+        message += f"，更新 {result['updated']} 個帳號"
+    elif conflicts:
+        message += f"，{len(conflicts)} 個帳號已存在 (未變更)"
+    if errors:
+        message += f"，{len(errors)} 列資料錯誤"
+    return {
+        'success': True,
+        'message': message,
+        'created': result['created'],
+        'updated': result['updated'],
+        'conflict_count': len(conflicts),
+        'conflicts': [{'row': c['row'], 'username': c['username']} for c in conflicts[:REPORT_LIMIT]],
+        'error_count': len(errors),
+        'errors': errors[:REPORT_LIMIT],
+    }
+
+# ========================================
+# 背景匯入工作
+# ========================================
+class ImportJobs:
+    """匯入工作的狀態與進度 (存放在共用儲存後端，任何 worker 都能查詢)"""
+
+    def __init__(self, store, ttl=JOB_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def create(self, owner_id, total):
+        job_id = secrets.token_urlsafe(12)
+        self._save(job_id, {
+            'job_id': job_id, 'owner_id': owner_id, 'status': 'running',
+            'stage': 'queued', 'done': 0, 'total': total, 'started_at': time.time(),
+        })
+        return job_id
+
+    def get(self, job_id):
+        value = self.store.get(f'user-import:{job_id}')
+        return json.loads(value) if value is not None else None
+
+    def update(self, job_id, **fields):
+        job = self.get(job_id) or {'job_id': job_id}
+        job.update(fields)
+        self._save(job_id, job)
+
+    def _save(self, job_id, job):
+        self.store.set(f'user-import:{job_id}', json.dumps(job, ensure_ascii=False), self.ttl)
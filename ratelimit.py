@@ -0,0 +1,293 @@
+# ==========================================================
+# 北護課程查詢系統 - 流量限制與負載保護
+# 1. 每個用戶端 (登入者的 user id，未登入時為 IP) 在每個路由群組各有一個權杖桶 (token bucket)，
+#    桶的狀態存放在共用的儲存後端 (與 session 相同: 本機 SQLite 檔案或 Redis)，
+#    所有 gunicorn worker 共用同一份額度
+# 2. 資料庫延遲正常時不限制；延遲超過目標值時，可捨棄的請求 (瀏覽、搜尋) 需要取得准入名額:
+#    同一台主機所有 worker 合計的名額依延遲比例從 SHEDDABLE_SLOTS 減少 (以檔案鎖計算)，
+#    沒有名額時直接回傳 429 (不等待: 同步 worker 等待名額時也佔住了 worker)
+#    選課、登入等請求不需要名額，瀏覽尖峰時仍有 worker 可以立即處理
+# 超過限制時拋出 RateLimited，由 app 轉成 429 + Retry-After
+# ==========================================================
+
+import math
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: 名額只在單一行程內計算
+    fcntl = None
+
+# 路由群組的額度: rate 每秒補充的次數、burst 桶容量 (可連續使用的次數)、
+# shed 是否為可捨棄的請求 (需要取得准入名額)
+BUDGETS = {
+    'search': {'rate': 3.0, 'burst': 30, 'shed': True},    # 課程搜尋、篩選計數、匯出課程
+    'enroll': {'rate': 2.0, 'burst': 20, 'shed': False},   # 加入/移除收藏與預選
+    'login': {'rate': 0.2, 'burst': 10, 'shed': False},    # 登入、忘記密碼，每個 IP + 帳號 (每 5 秒補 1 次)
+    'login_ip': {'rate': 2.0, 'burst': 60, 'shed': False}, # 登入、忘記密碼，每個 IP 合計 (校園 NAT 共用)
+    'import': {'rate': 0.05, 'burst': 5, 'shed': False},   # 匯入課程、批次建立帳號
+}
+
+# 資料庫延遲目標 (秒)；延遲的指數移動平均超過此值時開始捨棄可捨棄的請求
+DB_LATENCY_TARGET = float(os.environ.get('DB_LATENCY_TARGET_MS', 100)) / 1000
+# 延遲超過目標時，同一台主機同時處理中的可捨棄請求上限 (所有 worker 合計，再依延遲比例降低)
+# 預設為 gunicorn worker 數；非同步服務模式 (一個 worker 同時處理多個請求) 請調高
+SHEDDABLE_SLOTS = int(os.environ.get('SHEDDABLE_SLOTS', os.environ.get('WEB_CONCURRENCY', 2)))
+# 延遲平均的權重與失效秒數 (一段時間沒有查詢就視為恢復正常)
+LATENCY_ALPHA = 0.2
+LATENCY_STALE_SECONDS = 5
+# 捨棄請求時建議的最長重試秒數
+MAX_RETRY_AFTER = 10
+
+# 閒置超過此秒數的桶已經補滿，可以刪除
+BUCKET_IDLE_SECONDS = 3600
+
+class RateLimited(Exception):
+    """超過流量限制 (retry_after: 建議幾秒後重試)"""
+
+    def __init__(self, retry_after, message):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.message = message
+
+# ========================================
+# 權杖桶儲存後端
+# ========================================
+class SQLiteBuckets:
+    """本機 SQLite (與 session 同一個檔案)，以 BEGIN IMMEDIATE 讓多個 worker 依序更新同一個桶"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # 建立表格的連線用完即關閉 (gunicorn master 載入 app 後才 fork 出 worker)
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst, cost=1):
+        """取出 cost 個權杖，回傳 0 (允許) 或需要等待的秒數"""
+        conn = self._conn()
+        now = time.time()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(0, now - row[1]) * rate)
+            wait = 0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            # 偶爾清除閒置的桶
+            if secrets.randbelow(1000) == 0:
+                conn.execute('DELETE FROM rate_buckets WHERE updated_at < ?', (now - BUCKET_IDLE_SECONDS,))
+            conn.execute('COMMIT')
+            return wait
+        except sqlite3.Error as e:
+            # 儲存後端忙碌時放行 (限制失效比拒絕所有請求好)
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            print(f"[ratelimit] 無法更新權杖桶: {e}")
+            return 0
+
+class RedisBuckets:
+    """Redis (多台主機共用)，以 Lua script 在 Redis 端完成讀取與更新"""
+
+    SCRIPT = '''
+        local now, rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+        local tokens = burst
+        if state[1] then
+            tokens = math.min(burst, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+        end
+        local wait = 0
+        if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        return tostring(wait)
+    '''
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        try:
+            return float(self.script(keys=[f'rate:{key}'], args=[time.time(), rate, burst, cost]))
+        except Exception as e:
+            print(f"[ratelimit] 無法更新權杖桶: {e}")
+            return 0
+
+def create_buckets(sqlite_path='sessions.db'):
+    """依環境變數建立儲存後端 (與 session_store.create_store 相同的設定)"""
+    redis_url = os.environ.get('SESSION_REDIS_URL')
+    if redis_url:
+        return RedisBuckets(redis_url)
+    return SQLiteBuckets(os.environ.get('SESSION_DB_PATH', sqlite_path))
+
+# ========================================
+# 准入控制
+# 名額為 lock_dir 中的檔案 (slot.0、slot.1...)，以非阻塞的 flock 取得，
+# 行程結束時作業系統自動釋放；資料庫延遲由各 worker 自行量測 (同一個資料庫，趨勢相同)
+# ========================================
+class AdmissionController:
+    def __init__(self, lock_dir, slots=SHEDDABLE_SLOTS, target=DB_LATENCY_TARGET):
+        self.lock_dir = lock_dir
+        self.slots = slots
+        self.target = target
+        self.latency = 0.0
+        self.last_sample = 0.0
+        self.shed = 0
+        self._held = set()    # 本行程持有的名額
+        self._files = {}      # 名額 -> 本行程開啟的鎖定檔
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """記錄一次資料庫查詢的耗時"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self.last_sample > LATENCY_STALE_SECONDS:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_ALPHA * (seconds - self.latency)
+            self.last_sample = now
+
+    def current_latency(self):
+        if time.monotonic() - self.last_sample > LATENCY_STALE_SECONDS:
+            return 0.0
+        return self.latency
+
+    def limit(self, latency):
+        """目前的名額數 (延遲正常時為 None，不限制)"""
+        if latency <= self.target:
+            return None
+        return max(1, int(self.slots * self.target / latency))
+
+    def _check_fork(self):
+        """fork 後重新開啟鎖定檔 (flock 鎖定的是開啟的檔案，不能與 master 共用)"""
+        if self._pid != os.getpid():
+            self._files = {}
+            self._held = set()
+            self._pid = os.getpid()
+
+    def _lock_file(self, slot):
+        if slot not in self._files:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            self._files[slot] = open(os.path.join(self.lock_dir, f'slot.{slot}'), 'a')
+        return self._files[slot]
+
+    def _try_slot(self, slot):
+        if slot in self._held:
+            return False
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file(slot), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+        self._held.add(slot)
+        return True
+
+    def acquire(self):
+        """
+        取得一個名額，回傳名額編號 (延遲正常時不需要名額，回傳 None)；
+        沒有名額時拋出 RateLimited
+        """
+        latency = self.current_latency()
+        limit = self.limit(latency)
+        if limit is None:
+            return None
+        with self._lock:
+            self._check_fork()
+            for slot in range(limit):
+                if self._try_slot(slot):
+                    return slot
+            self.shed += 1
+        raise RateLimited(min(MAX_RETRY_AFTER, latency / self.target), '系統忙碌中，請稍後再試')
+
+    def release(self, slot):
+        with self._lock:
+            if slot not in self._held:
+                return
+            self._held.discard(slot)
+            if fcntl is not None:
+                fcntl.flock(self._files[slot], fcntl.LOCK_UN)
+
+    def stats(self):
+        latency = self.current_latency()
+        return {'latency_ms': round(latency * 1000, 1), 'limit': self.limit(latency),
+                'held': len(self._held), 'shed': self.shed}
+
+def create_admission(sqlite_path='sessions.db'):
+    """名額鎖定檔放在 session SQLite 檔案旁 (同一台主機的 worker 共用)"""
+    session_path = os.path.abspath(os.environ.get('SESSION_DB_PATH', sqlite_path))
+    return AdmissionController(os.path.join(os.path.dirname(session_path), '.admission'))
+
+# ========================================
+# 流量限制
+# ========================================
+class Admission:
+    """
+    admit() 的回傳值，以 with 包住請求處理 (結束時釋放准入名額)；
+    串流回應可改為在送出完畢後呼叫 release()
+    """
+
+    def __init__(self, controller=None, slot=None):
+        self.controller = controller
+        self.slot = slot
+
+    def release(self):
+        if self.controller is not None and self.slot is not None:
+            self.controller.release(self.slot)
+        self.controller = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+class RateLimiter:
+    def __init__(self, buckets, admission, budgets=None, enabled=True):
+        self.buckets = buckets
+        self.admission = admission
+        self.budgets = budgets or BUDGETS
+        self.enabled = enabled
+
+    def admit(self, budget, client):
+        """
+        檢查 client 在 budget 群組的額度與目前負載，回傳 Admission；超過限制時拋出 RateLimited
+        client: 'user:<id>' 或 'ip:<位址>'
+        """
+        if not self.enabled:
+            return Admission()
+        config = self.budgets[budget]
+        wait = self.buckets.take(f'{budget}:{client}', config['rate'], config['burst'])
+        if wait:
+            raise RateLimited(wait, '請求過於頻繁，請稍後再試')
+        if not config['shed']:
+            return Admission()
+        return Admission(self.admission, self.admission.acquire())
@@ -0,0 +1,165 @@
+# ==========================================================
+# 北護課程查詢系統 - 即時名額推播
+# 選課記錄異動時由資料庫 trigger 寫入 seat_changes (見 migrations.py 版本 9)，
+# 每個 worker 只有一個 SeatFeed 執行緒讀取這份變更紀錄，只重新計算有人訂閱的課程名額，
+# 再依 課程 -> 訂閱者 索引分送 (連線數增加時不會增加資料庫查詢)
+# 每個訂閱者只保留各課程尚未送出的最新名額 (多次異動合併為一次)，
+# 記憶體用量與訂閱的課程數成正比，不會因為連線讀取太慢而累積
+# ==========================================================
+
+import json
+import threading
+import time
+
+# 讀取變更紀錄的間隔 (秒)
+POLL_INTERVAL = 1.0
+
+# 清除舊變更紀錄的間隔 (秒)；紀錄保留時間見 app.py 的 SEAT_CHANGE_RETENTION
+PRUNE_INTERVAL = 60
+
+# 每個連線最多訂閱的課程數
+MAX_SUBSCRIBED_COURSES = 500
+
+# 連線中斷後瀏覽器重新連線前等待 3 秒；心跳為 SSE 註解，瀏覽器會忽略
+RETRY_EVENT = 'retry: 3000\n\n'
+HEARTBEAT_EVENT = ': ping\n\n'
+
+def format_event(pending):
+    """SSE 訊息: event: seats / data: {"課程 id": [已選人數, 容量] 或 null}"""
+    data = json.dumps({str(course_id): seats for course_id, seats in pending.items()}, separators=(',', ':'))
+    return f'event: seats\ndata: {data}\n\n'
+
+class Subscription:
+    """
+    一個連線的訂閱
+    notify(): 有新名額時呼叫 (由 SeatFeed 執行緒呼叫，需可跨執行緒使用)
+    """
+
+    __slots__ = ('courses', 'pending', 'notify')
+
+    def __init__(self, courses, notify):
+        self.courses = courses
+        self.pending = {}
+        self.notify = notify
+
+class SeatFeed:
+    """
+    load_changes(after_id): 回傳 (最新 id, after_id 之後異動過的課程 id 集合)；
+                            after_id 為 None 時只回傳最新 id
+    count_seats(course_ids): 回傳 {課程 id: [已選人數, 容量]} (不存在的課程不列出)
+    prune(): 清除舊變更紀錄 (選用)
+    """
+
+    def __init__(self, load_changes, count_seats, prune=None, interval=POLL_INTERVAL):
+        self.load_changes = load_changes
+        self.count_seats = count_seats
+        self.prune = prune
+        self.interval = interval
+        self.subscribers = {}  # 課程 id -> {Subscription}
+        self.seats = {}        # 有人訂閱的課程 -> 最後送出的名額
+        self.last_id = None
+        self.last_prune = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    # ========================================
+    # 訂閱
+    # ========================================
+    def subscribe(self, course_ids, notify):
+        """訂閱課程名額；目前的名額立即放入 pending (第一則訊息)"""
+        self._ensure_started()
+        courses = frozenset(int(course_id) for course_id in list(course_ids)[:MAX_SUBSCRIBED_COURSES])
+        subscription = Subscription(courses, notify)
+        with self._lock:
+            for course_id in courses:
+                self.subscribers.setdefault(course_id, set()).add(subscription)
+            missing = [course_id for course_id in courses if course_id not in self.seats]
+
+        # 登記後才查詢，之後的異動一定會由 poll 送出
+        counts = self.count_seats(missing) if missing else {}
+        with self._lock:
+            for course_id, seats in counts.items():
+                if course_id in self.subscribers:
+                    self.seats.setdefault(course_id, seats)
+            subscription.pending = {
+                course_id: self.seats[course_id] for course_id in courses if course_id in self.seats
+            }
+        notify()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for course_id in subscription.courses:
+                subscribers = self.subscribers.get(course_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[course_id]
+                    self.seats.pop(course_id, None)
+
+    def drain(self, subscription):
+        """取出尚未送出的名額 {課程 id: [已選人數, 容量] 或 None (課程已刪除)}"""
+        with self._lock:
+            pending, subscription.pending = subscription.pending, {}
+        return pending
+
+    def stats(self):
+        with self._lock:
+            connections = {id(sub) for subs in self.subscribers.values() for sub in subs}
+            return {'connections': len(connections), 'courses': len(self.subscribers), 'last_id': self.last_id}
+
+    # ========================================
+    # 變更紀錄
+    # ========================================
+    def _ensure_started(self):
+        """第一次訂閱時記下目前的變更位置並啟動背景執行緒"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self.last_id, _changed = self.load_changes(None)
+                self._thread = threading.Thread(target=self._run, name='seat-feed', daemon=True)
+                self._thread.start()
+                print(f"[seats] 名額推播啟動 (變更紀錄位置 {self.last_id})")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+                if self.prune and time.monotonic() - self.last_prune > PRUNE_INTERVAL:
+                    self.last_prune = time.monotonic()
+                    self.prune()
+            except Exception as e:
+                print(f"[seats] ❌ 讀取名額變更失敗: {e}")
+
+    def poll(self):
+        """讀取新的變更紀錄，重新計算有人訂閱的課程並分送，回傳送出的名額數"""
+        last_id, changed = self.load_changes(self.last_id)
+        if last_id == self.last_id:
+            return 0
+        self.last_id = last_id
+        with self._lock:
+            watched = [course_id for course_id in changed if course_id in self.subscribers]
+        if not watched:
+            return 0
+
+        counts = self.count_seats(watched)
+        notified = set()
+        deltas = 0
+        with self._lock:
+            for course_id in watched:
+                subscribers = self.subscribers.get(course_id)
+                seats = counts.get(course_id)
+                if not subscribers or self.seats.get(course_id) == seats:
+                    continue
+                self.seats[course_id] = seats
+                for subscription in subscribers:
+                    subscription.pending[course_id] = seats
+                    notified.add(subscription)
+                deltas += len(subscribers)
+        for subscription in notified:
+            subscription.notify()
+        return deltas
@@ -0,0 +1,213 @@
+# ==========================================================
+# 北護課程查詢系統 - 伺服器端 Session 與個人檔案快取
+# cookie 只保存簽章過的 session id，資料存放在共用的儲存後端:
+# - 設定 SESSION_REDIS_URL 時使用 Redis (多台主機共用)
+# - 否則使用本機 SQLite 檔案 (同一台主機的 gunicorn worker 共用)
+# ==========================================================
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+
+# 個人檔案快取保存秒數 (更新時會主動清除，這只是上限)
+PROFILE_CACHE_TTL = 3600
+
+# ========================================
+# 儲存後端
+# ========================================
+class SQLiteStore:
+    """本機 SQLite 鍵值儲存 (WAL 模式，可供多個 worker 行程同時讀寫)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # 建立表格的連線用完即關閉 (gunicorn master 載入 app 後才 fork 出 worker，
+        # fork 前開啟的 SQLite 連線不能在子行程繼續使用)
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS kv_store (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM kv_store WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO kv_store (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, time.time() + ttl)
+        )
+        # 偶爾清除過期資料
+        if secrets.randbelow(1000) == 0:
+            conn.execute('DELETE FROM kv_store WHERE expires_at <= ?', (time.time(),))
+        conn.commit()
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute('DELETE FROM kv_store WHERE key = ?', (key,))
+        conn.commit()
+
+class RedisStore:
+    """Redis 鍵值儲存 (需安裝 redis 套件)"""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+def create_store(sqlite_path='sessions.db'):
+    """依環境變數建立儲存後端"""
+    redis_url = os.environ.get('SESSION_REDIS_URL')
+    if redis_url:
+        return RedisStore(redis_url)
+    return SQLiteStore(os.environ.get('SESSION_DB_PATH', sqlite_path))
+
+# ========================================
+# 伺服器端 Session
+# ========================================
+class ServerSideSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.new = new
+        self.old_sid = None
+
+    def regenerate(self):
+        """登入後更換 session id，避免 session fixation"""
+        self.old_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask SessionInterface - session 資料存在 store，cookie 只放簽章過的 id"""
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def _ttl(self, app):
+        lifetime = app.permanent_session_lifetime
+        if isinstance(lifetime, timedelta):
+            return lifetime.total_seconds()
+        return float(lifetime)
+
+    def load(self, app, cookie):
+        """由 cookie 值取得 session 資料 (找不到時回傳 None)"""
+        if not cookie:
+            return None, None
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return None, None
+        value = self.store.get(f'session:{sid}')
+        if value is None:
+            return None, None
+        return sid, self.serializer.loads(value)
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        sid, data = self.load(app, request.cookies.get(self.get_cookie_name(app)))
+        if data is None:
+            return self.session_class(new=True)
+        return self.session_class(data, sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.old_sid:
+            self.store.delete(f'session:{session.old_sid}')
+
+        # 清空的 session: 刪除資料與 cookie
+        if not session:
+            if session.modified:
+                self.store.delete(f'session:{session.sid}')
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        self.store.set(f'session:{session.sid}', self.serializer.dumps(dict(session)), self._ttl(app))
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+        response.vary.add('Cookie')
+
+# ========================================
+# 個人檔案快取
+# ========================================
+class ProfileCache:
+    """以 user id 為鍵的個人檔案快取，與 session 共用同一個儲存後端"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl=PROFILE_CACHE_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def get(self, user_id):
+        value = self.store.get(f'profile:{user_id}')
+        return self.serializer.loads(value) if value is not None else None
+
+    def set(self, user_id, profile):
+        self.store.set(f'profile:{user_id}', self.serializer.dumps(profile), self.ttl)
+
+    def invalidate(self, user_id):
+        self.store.delete(f'profile:{user_id}')
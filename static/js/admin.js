@@ -118,7 +118,7 @@ function showSection(section) {
 // ========================================
 // 功能：搜尋課程
 // ========================================
-async function adminSearchCourses() {
+function buildAdminSearchParams() {
     const keyword = document.getElementById('adminKeywordInput').value.trim();
     const semester = document.getElementById('adminSemesterSelect').value;
     const department = document.getElementById('adminDepartmentSelect').value;
@@ -146,6 +146,11 @@ async function adminSearchCourses() {
     if (adminSelectedFilters.category.length > 0) {
         params.append('category', adminSelectedFilters.category.join(','));
     }
+    return params;
+}
+
+async function adminSearchCourses() {
+    const params = buildAdminSearchParams();
     
     console.log('🔍 管理者搜尋參數:', Object.fromEntries(params));
     
@@ -156,6 +161,8 @@ async function adminSearchCourses() {
         if (data.success) {
             console.log(`✅ 找到 ${data.count} 筆課程`);
             displayAdminResults(data.items);
+        } else if (response.status === 429) {
+            alert(data.message);
         } else {
             displayAdminResults([]);
         }
@@ -168,82 +175,211 @@ async function adminSearchCourses() {
 // ========================================
 // 功能：顯示課程列表（管理者）
 // ========================================
+// 大量結果只產生畫面上看得到的列 (見 virtual-list.js)，勾選狀態存放在 selectedCourses
+const ADMIN_RESULT_HEADER = `
+    <tr>
+        <th>學期</th>
+        <th>系所</th>
+        <th>年級</th>
+        <th>課程名稱</th>
+        <th>授課教師</th>
+        <th>學分</th>
+        <th>課別</th>
+        <th>教室</th>
+        <th>星期</th>
+        <th>節次</th>
+        <th>大綱</th>
+        <th>編輯</th>
+        <th>刪除</th>
+        <th><input type="checkbox" id="selectAllCourses" title="全選" onchange="toggleAllCourseSelection(this.checked)"></th>
+    </tr>
+`;
+
+const ADMIN_DAY_MAP = {'1': '一', '2': '二', '3': '三', '4': '四', 
+                       '5': '五', '6': '六', '7': '日'};
+
+let adminCourses = [];
+let selectedCourses = new Set();
+
+function renderAdminResultRow(course) {
+    // 解析星期
+    let weekdayDisplay = '';
+    if (course.weekday) {
+        weekdayDisplay = ADMIN_DAY_MAP[course.weekday] || '';
+    } else if (course.day_time) {
+        const match = course.day_time.match(/週([一二三四五六日])/);
+        if (match) weekdayDisplay = match[1];
+    }
+    
+    // 解析節次
+    let periodDisplay = course.period || '';
+    if (!periodDisplay && course.day_time) {
+        const match = course.day_time.match(/(\d+[-,\d]*)/);
+        if (match) periodDisplay = match[1];
+    }
+    
+    return `
+        <td>${course.semester || ''}</td>
+        <td>${course.department || ''}</td>
+        <td>${course.grade || ''}</td>
+        <td>${course.course_name || ''}</td>
+        <td>${course.instructor || ''}</td>
+        <td>${course.credits || ''}</td>
+        <td>${course.course_type || ''}</td>
+        <td>${course.classroom || ''}</td>
+        <td>${weekdayDisplay}</td>
+        <td>${periodDisplay}</td>
+        <td>
+            <button class="btn-icon btn-outline" onclick="showCourseInfo(${course.id})" title="課程資訊">•••</button>
+        </td>
+        <td>
+            <button class="btn-icon btn-edit" onclick="editCourse(${course.id})" title="編輯">✎</button>
+        </td>
+        <td>
+            <button class="btn-icon btn-trash" onclick="deleteCourse(${course.id})" title="刪除">🗑</button>
+        </td>
+        <td>
+            <input type="checkbox" class="course-select" value="${course.id}" ${selectedCourses.has(course.id) ? 'checked' : ''} onchange="toggleCourseSelection(${course.id}, this.checked)">
+        </td>
+    `;
+}
+
 function displayAdminResults(courses) {
     const container = document.getElementById('adminCoursesResults');
+    adminCourses = courses || [];
+    selectedCourses = new Set();
     
-    if (!courses || courses.length === 0) {
+    if (adminCourses.length === 0) {
+        clearVirtualResults(container);
         container.innerHTML = '<p class="no-results">沒有找到符合的課程</p>';
         return;
     }
     
-    let html = `
-        <table class="results-table">
-            <thead>
-                <tr>
-                    <th>學期</th>
-                    <th>系所</th>
-                    <th>年級</th>          
-                    <th>課程名稱</th>
-                    <th>授課教師</th>
-                    <th>學分</th>
-                    <th>課別</th>
-                    <th>教室</th>
-                    <th>星期</th>
-                    <th>節次</th>
-                    <th>大綱</th>
-                    <th>編輯</th>
-                    <th>刪除</th>
-                </tr>
-            </thead>
-            <tbody>
+    const bulkActions = `
+        <div class="bulk-actions">
+            <span>已選 <strong id="bulkSelectedCount">0</strong> 門</span>
+            <select id="bulkField" class="form-select">
+                <option value="instructor">授課教師</option>
+                <option value="classroom">教室</option>
+                <option value="department">系所</option>
+                <option value="grade">年級</option>
+                <option value="course_type">課別</option>
+                <option value="credits">學分</option>
+                <option value="capacity">人數上限</option>
+                <option value="remarks">備註</option>
+            </select>
+            <input type="text" id="bulkValue" class="search-input" placeholder="新的值">
+            <button onclick="bulkUpdateSelected()">✎ 套用到已選課程</button>
+            <button class="btn-bulk-delete" onclick="bulkDeleteResults()">🗑 刪除全部搜尋結果</button>
+        </div>
     `;
+    renderVirtualResults(container, adminCourses, ADMIN_RESULT_HEADER, renderAdminResultRow, bulkActions);
+}
+
+// ========================================
+// 功能：批次課程操作 (修改已選課程、刪除搜尋結果、複製學期)
+// ========================================
+function selectedCourseIds() {
+    return Array.from(selectedCourses);
+}
+
+function toggleCourseSelection(courseId, checked) {
+    if (checked) {
+        selectedCourses.add(courseId);
+    } else {
+        selectedCourses.delete(courseId);
+    }
+    updateBulkSelection();
+}
+
+// 全選包含尚未捲動到的課程 (未顯示的列在捲動到時依 selectedCourses 產生)
+function toggleAllCourseSelection(checked) {
+    selectedCourses = new Set(checked ? adminCourses.map(course => course.id) : []);
+    document.querySelectorAll('.course-select').forEach(cb => { cb.checked = checked; });
+    updateBulkSelection();
+}
+
+function updateBulkSelection() {
+    document.getElementById('bulkSelectedCount').textContent = selectedCourses.size;
+    const selectAll = document.getElementById('selectAllCourses');
+    if (selectAll) {
+        selectAll.checked = adminCourses.length > 0 && selectedCourses.size === adminCourses.length;
+        selectAll.indeterminate = selectedCourses.size > 0 && selectedCourses.size < adminCourses.length;
+    }
+}
+
+async function postCourseOperation(url, body) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(body)
+    });
+    return response.json();
+}
+
+async function bulkUpdateSelected() {
+    const ids = selectedCourseIds();
+    if (ids.length === 0) {
+        alert('請先勾選要修改的課程');
+        return;
+    }
+    const fieldSelect = document.getElementById('bulkField');
+    const value = document.getElementById('bulkValue').value.trim();
+    const label = fieldSelect.options[fieldSelect.selectedIndex].text;
+    if (!confirm(`確定要將 ${ids.length} 門課程的「${label}」改為「${value}」嗎？`)) return;
     
-    courses.forEach(course => {
-        // 解析星期
-        const dayMap = {'1': '一', '2': '二', '3': '三', '4': '四', 
-                       '5': '五', '6': '六', '7': '日'};
-        let weekdayDisplay = '';
-        if (course.weekday) {
-            weekdayDisplay = dayMap[course.weekday] || '';
-        } else if (course.day_time) {
-            const match = course.day_time.match(/週([一二三四五六日])/);
-            if (match) weekdayDisplay = match[1];
-        }
-        
-        // 解析節次
-        let periodDisplay = course.period || '';
-        if (!periodDisplay && course.day_time) {
-            const match = course.day_time.match(/(\d+[-,\d]*)/);
-            if (match) periodDisplay = match[1];
+    try {
+        const result = await postCourseOperation('/api/courses/bulk-update', {
+            ids: ids,
+            fields: {[fieldSelect.value]: value}
+        });
+        alert((result.success ? '✓ ' : '✗ ') + result.message);
+        if (result.success) adminSearchCourses();
+    } catch (error) {
+        console.error('❌ 批次修改失敗:', error);
+        alert('操作失敗，請稍後再試');
+    }
+}
+
+async function bulkDeleteResults() {
+    const filters = Object.fromEntries(buildAdminSearchParams());
+    if (Object.keys(filters).length === 0) {
+        alert('請先設定搜尋條件');
+        return;
+    }
+    
+    try {
+        // 先試算會刪除的筆數，確認後再實際刪除
+        const preview = await postCourseOperation('/api/courses/bulk-delete', {...filters, dry_run: true});
+        if (!preview.success) {
+            alert('✗ ' + preview.message);
+            return;
         }
+        if (!confirm(`${preview.message}，確定要刪除嗎？此操作無法復原！`)) return;
         
-        html += `
-            <tr>
-                <td>${course.semester || ''}</td>
-                <td>${course.department || ''}</td>
-                <td>${course.grade || ''}</td>           
-                <td>${course.course_name || ''}</td>
-                <td>${course.instructor || ''}</td>
-                <td>${course.credits || ''}</td>
-                <td>${course.course_type || ''}</td>
-                <td>${course.classroom || ''}</td>
-                <td>${weekdayDisplay}</td>
-                <td>${periodDisplay}</td>
-                <td>
-                    <button class="btn-icon btn-outline" onclick="showCourseInfo(${course.id})" title="課程資訊">•••</button>
-                </td>
-                <td>
-                    <button class="btn-icon btn-edit" onclick="editCourse(${course.id})" title="編輯">✎</button>
-                </td>
-                <td>
-                    <button class="btn-icon btn-trash" onclick="deleteCourse(${course.id})" title="刪除">🗑</button>
-                </td>
-            </tr>
-        `;
-    });
+        const result = await postCourseOperation('/api/courses/bulk-delete', filters);
+        alert((result.success ? '✓ ' : '✗ ') + result.message);
+        if (result.success) adminSearchCourses();
+    } catch (error) {
+        console.error('❌ 批次刪除失敗:', error);
+        alert('操作失敗，請稍後再試');
+    }
+}
+
+async function cloneSemester() {
+    const source = (prompt('請輸入要複製的來源學期 (例：1142)') || '').trim();
+    if (!source) return;
+    const target = (prompt(`將學期 ${source} 的課程複製到新學期 (例：1151)`) || '').trim();
+    if (!target) return;
     
-    html += '</tbody></table>';
-    container.innerHTML = html;
+    try {
+        const result = await postCourseOperation(`/api/semesters/${encodeURIComponent(target)}/clone`, {source: source});
+        alert((result.success ? '✓ ' : '✗ ') + result.message);
+        if (result.success) loadSemesters();
+    } catch (error) {
+        console.error('❌ 複製學期失敗:', error);
+        alert('操作失敗，請稍後再試');
+    }
 }
 
 // ========================================
@@ -379,8 +515,9 @@ function adminClearSearch() {
     document.getElementById('adminDepartmentSelect').value = '';
     document.getElementById('adminGradeSelect').value = '';
     document.getElementById('adminTypeSelect').value = '';
-    document.getElementById('adminCoursesResults').innerHTML = 
-        '<p class="no-results">請輸入搜尋條件查詢課程</p>';
+    const results = document.getElementById('adminCoursesResults');
+    clearVirtualResults(results);
+    results.innerHTML = '<p class="no-results">請輸入搜尋條件查詢課程</p>';
     console.log('🧹 清除搜尋條件');
 }
 
@@ -558,7 +695,7 @@ function handleFileSelect(e) {
 // ========================================
 // 功能：檔案上傳處理
 // ========================================
-async function handleFileUpload(file) {
+async function handleFileUpload(file, force = false) {
     const statusDiv = document.getElementById('uploadStatus');
     const semesterInput = document.getElementById('importSemester');
     const semester = semesterInput ? semesterInput.value.trim() : '';
@@ -587,6 +724,11 @@ async function handleFileUpload(file) {
         return;
     }
     
+    // 差異匯入: 先試算變更，確認後才寫入
+    if (document.getElementById('importDiffMode').checked) {
+        return handleDiffUpload(file, semester, statusDiv, force);
+    }
+    
     // 顯示上傳中
     statusDiv.className = 'upload-status';
     statusDiv.textContent = '⏳ 正在匯入課程資料...';
@@ -594,6 +736,7 @@ async function handleFileUpload(file) {
     const formData = new FormData();
     formData.append('file', file);
     formData.append('semester', semester);
+    if (force) formData.append('force', '1');
     
     try {
         const response = await fetch('/api/import-courses', {
@@ -612,6 +755,16 @@ async function handleFileUpload(file) {
         
         const result = await response.json();
         
+        // 與上次匯入的檔案相同，伺服器直接回傳上次結果
+        if (result.duplicate) {
+            statusDiv.className = 'upload-status success';
+            statusDiv.textContent = 'ℹ️ ' + result.message;
+            if (confirm(result.message + '\n要強制重新匯入嗎？')) {
+                handleFileUpload(file, true);
+            }
+            return;
+        }
+        
         if (result.success) {
             statusDiv.className = 'upload-status success';
             statusDiv.textContent = `✓ 成功匯入 ${result.count || 0} 筆課程資料！`;
@@ -631,6 +784,92 @@ async function handleFileUpload(file) {
     }
 }
 
+// ========================================
+// 功能：差異匯入 (預覽後確認)
+// ========================================
+async function postCourseImport(file, semester, dryRun, force) {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('semester', semester);
+    formData.append('mode', 'diff');
+    formData.append('dry_run', dryRun ? '1' : '0');
+    if (force) formData.append('force', '1');
+    const response = await fetch('/api/import-courses', {
+        method: 'POST',
+        body: formData
+    });
+    if (!response.ok) {
+        throw new Error(`伺服器錯誤 (${response.status})`);
+    }
+    return response.json();
+}
+
+function describeImportChange(change) {
+    const actionNames = {insert: '新增', update: '更新', delete: '刪除'};
+    let text = `${actionNames[change.action]} ${change.course_code} ${change.course_name}`;
+    if (change.changes) {
+        text += '：' + Object.keys(change.changes).join('、');
+    }
+    return text;
+}
+
+async function handleDiffUpload(file, semester, statusDiv, force = false) {
+    statusDiv.className = 'upload-status';
+    statusDiv.textContent = '⏳ 正在比對課程資料...';
+    
+    try {
+        const preview = await postCourseImport(file, semester, true, force);
+        // 與上次匯入的檔案相同，伺服器直接回傳上次結果
+        if (preview.duplicate) {
+            statusDiv.className = 'upload-status success';
+            statusDiv.textContent = 'ℹ️ ' + preview.message;
+            if (confirm(preview.message + '\n要強制重新比對嗎？')) {
+                handleDiffUpload(file, semester, statusDiv, true);
+            }
+            return;
+        }
+        if (!preview.success) {
+            statusDiv.className = 'upload-status error';
+            statusDiv.textContent = '✗ ' + preview.message;
+            return;
+        }
+        
+        const lines = [preview.message];
+        (preview.changes || []).slice(0, 10).forEach(change => lines.push(describeImportChange(change)));
+        const total = preview.inserted + preview.updated + preview.deleted;
+        if (total > 10) {
+            lines.push(`... 共 ${total} 筆變更`);
+        }
+        statusDiv.textContent = lines.join('\n');
+        
+        if (total === 0) {
+            statusDiv.className = 'upload-status success';
+            statusDiv.textContent = '✓ 課程資料沒有變更';
+            return;
+        }
+        let question = `${preview.message}`;
+        if (preview.deleted_enrollments) {
+            question += `\n刪除的課程有 ${preview.deleted_enrollments} 筆選課記錄會一併刪除`;
+        }
+        if (!confirm(question + '\n確定要寫入嗎？')) {
+            statusDiv.textContent = '已取消匯入\n' + lines.join('\n');
+            return;
+        }
+        
+        statusDiv.textContent = '⏳ 正在寫入變更...';
+        const result = await postCourseImport(file, semester, false, true);
+        statusDiv.className = 'upload-status ' + (result.success ? 'success' : 'error');
+        statusDiv.textContent = (result.success ? '✓ ' : '✗ ') + result.message;
+        if (result.success) {
+            loadSemesters();
+        }
+    } catch (error) {
+        console.error('❌ 差異匯入失敗:', error);
+        statusDiv.className = 'upload-status error';
+        statusDiv.textContent = '✗ ' + error.message;
+    }
+}
+
 // ========================================
 // 功能：載入學期列表
 // ========================================
@@ -665,23 +904,158 @@ async function loadSemesters() {
 }
 
 // ========================================
-// 功能：載入帳號列表
+// 功能：載入帳號列表 (伺服器端分頁、搜尋、排序)
 // ========================================
-async function loadAccounts() {
+const ACCOUNT_PAGE_SIZE = 60;
+let accountPages = {student: 1, admin: 1};
+let accountSearchTimer = null;
+
+function loadAccounts() {
+    loadAccountPage('student');
+    loadAccountPage('admin');
+}
+
+async function loadAccountPage(role) {
+    const params = new URLSearchParams({
+        role: role,
+        q: document.getElementById('accountSearchInput').value.trim(),
+        sort: document.getElementById('accountSortSelect').value,
+        page: accountPages[role],
+        per_page: ACCOUNT_PAGE_SIZE
+    });
+    
     try {
-        const response = await fetch('/api/users');
+        const response = await fetch(`/api/users?${params}`);
         const data = await response.json();
         
         if (data.success) {
-            displayStudents(data.students || []);
-            displayAdmins(data.admins || []);
-            console.log(`✅ 載入 ${(data.students || []).length} 個學生, ${(data.admins || []).length} 個管理員`);
+            // 刪除帳號後目前頁數可能超過總頁數
+            if (data.pages > 0 && data.page > data.pages) {
+                accountPages[role] = data.pages;
+                return loadAccountPage(role);
+            }
+            if (role === 'student') {
+                displayStudents(data.users);
+            } else {
+                displayAdmins(data.users);
+            }
+            renderAccountPager(role, data);
+            console.log(`✅ 載入 ${role} 第 ${data.page} 頁 (${data.users.length} / ${data.total})`);
         }
     } catch (error) {
         console.error('❌ 載入帳號失敗:', error);
     }
 }
 
+function renderAccountPager(role, data) {
+    const prefix = role === 'student' ? 'students' : 'admins';
+    const total = (data.role_counts || {})[role] || 0;
+    document.getElementById(`${prefix}Count`).textContent =
+        data.total === total ? `(${total})` : `(${data.total} / ${total})`;
+    
+    const pager = document.getElementById(`${prefix}Pager`);
+    if (data.pages <= 1) {
+        pager.innerHTML = '';
+        return;
+    }
+    pager.innerHTML = `
+        <button onclick="changeAccountPage('${role}', -1)" ${data.page <= 1 ? 'disabled' : ''}>‹ 上一頁</button>
+        <span>第 ${data.page} / ${data.pages} 頁</span>
+        <button onclick="changeAccountPage('${role}', 1)" ${data.page >= data.pages ? 'disabled' : ''}>下一頁 ›</button>
+    `;
+}
+
+function changeAccountPage(role, delta) {
+    accountPages[role] = Math.max(1, accountPages[role] + delta);
+    loadAccountPage(role);
+}
+
+function searchAccounts() {
+    clearTimeout(accountSearchTimer);
+    accountSearchTimer = setTimeout(() => {
+        accountPages = {student: 1, admin: 1};
+        loadAccounts();
+    }, 300);
+}
+
+// ========================================
+// 功能：匯入帳號名單 (CSV / Excel)
+// ========================================
+function handleAccountImportSelect(e) {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (file) {
+        importAccounts(file);
+    }
+}
+
+async function importAccounts(file) {
+    const statusDiv = document.getElementById('accountImportStatus');
+    const update = confirm('名單中已存在的帳號是否更新資料？\n(確定：更新資料；取消：保留原資料)');
+    
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('mode', update ? 'update' : 'skip');
+    
+    statusDiv.className = 'upload-status';
+    statusDiv.textContent = '⏳ 正在驗證名單...';
+    
+    try {
+        const response = await fetch('/api/users/import', {
+            method: 'POST',
+            body: formData
+        });
+        let result = await response.json();
+        
+        // 大型名單在背景匯入，定期查詢進度
+        if (result.success && result.job_id) {
+            result = await waitForAccountImport(result.status_url, statusDiv);
+        }
+        showAccountImportResult(result, statusDiv);
+        if (result.success) {
+            loadAccounts();
+        }
+    } catch (error) {
+        console.error('❌ 匯入名單失敗:', error);
+        statusDiv.className = 'upload-status error';
+        statusDiv.textContent = '✗ 網路錯誤：' + error.message;
+    }
+}
+
+async function waitForAccountImport(statusUrl, statusDiv) {
+    const stageNames = {queued: '等待中', hashing: '產生密碼', writing: '寫入資料庫'};
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const response = await fetch(statusUrl);
+        const data = await response.json();
+        if (!data.success) {
+            return data;
+        }
+        const job = data.job;
+        if (job.status !== 'running') {
+            return job.result;
+        }
+        const stage = stageNames[job.stage] || job.stage;
+        statusDiv.textContent = job.total ? `⏳ ${stage}... ${job.done || 0} / ${job.total}` : `⏳ ${stage}...`;
+    }
+}
+
+function showAccountImportResult(result, statusDiv) {
+    const lines = [(result.success ? '✓ ' : '✗ ') + result.message];
+    (result.errors || []).slice(0, 10).forEach(err => {
+        lines.push(`第 ${err.row} 列 ${err.username || ''}：${err.message}`);
+    });
+    if ((result.error_count || 0) > 10) {
+        lines.push(`... 共 ${result.error_count} 列錯誤`);
+    }
+    if (result.conflict_count && !result.updated) {
+        const names = (result.conflicts || []).slice(0, 10).map(c => c.username).join('、');
+        lines.push(`已存在的帳號：${names}${result.conflict_count > 10 ? ' ...' : ''}`);
+    }
+    statusDiv.className = 'upload-status ' + (result.success ? 'success' : 'error');
+    statusDiv.textContent = lines.join('\n');
+}
+
 // ========================================
 // 功能：顯示學生帳號卡片
 // ========================================
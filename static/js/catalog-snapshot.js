@@ -0,0 +1,190 @@
+/* ==========================================================
+   北護課程查詢系統 - 學期目錄快照 (學生、訪客頁面共用)
+   指定學期的搜尋與篩選計數改為下載該學期的精簡目錄 (/api/catalog/<學期>/snapshot)
+   後在瀏覽器篩選，篩選規則與伺服器的 build_course_search / Catalog.facets 相同
+   快照網址含目錄版本，可長期快取；每 VERSION_CHECK_MS 最多檢查一次版本，改變時才重新下載
+   未指定學期、依相關度排序或條件含 LIKE 萬用字元 (% _) 時回傳 null，由呼叫端改用伺服器查詢
+   ========================================================== */
+
+const catalogSnapshot = {
+    VERSION_CHECK_MS: 60000,
+    FACET_PARAMS: {
+        department: 'department', grade: 'grade', course_type: 'type',
+        weekday: 'weekday', period: 'period', degree: 'degree', category: 'category'
+    },
+    
+    version: null,
+    checkedAt: 0,
+    versionRequest: null,
+    snapshots: {},   // 學期 -> {version, courses, features, degrees, categories, foldCase}
+    loading: {},     // 學期 -> 下載中的 Promise
+    
+    /** 目前的目錄版本 (VERSION_CHECK_MS 內重複呼叫不會再請求) */
+    async currentVersion() {
+        if (this.version && Date.now() - this.checkedAt < this.VERSION_CHECK_MS) {
+            return this.version;
+        }
+        if (!this.versionRequest) {
+            this.versionRequest = fetch('/api/catalog/version')
+                .then(response => response.json())
+                .then(data => {
+                    this.version = data.version;
+                    this.checkedAt = Date.now();
+                    return data.version;
+                })
+                .finally(() => { this.versionRequest = null; });
+        }
+        return this.versionRequest;
+    },
+    
+    /** 取得學期快照 (版本改變時重新下載)；無法使用時回傳 null */
+    async get(semester) {
+        try {
+            const version = await this.currentVersion();
+            const cached = this.snapshots[semester];
+            if (cached && cached.version === version) return cached;
+            
+            const key = `${semester}@${version}`;
+            if (!this.loading[key]) {
+                this.loading[key] = this.download(semester, version).finally(() => { delete this.loading[key]; });
+            }
+            return await this.loading[key];
+        } catch (error) {
+            console.error('❌ 載入目錄快照失敗:', error);
+            return null;
+        }
+    },
+    
+    async download(semester, version) {
+        const response = await fetch(`/api/catalog/${encodeURIComponent(semester)}/snapshot?v=${encodeURIComponent(version)}`);
+        if (!response.ok) return null;
+        const data = await response.json();
+        
+        const courses = [];
+        const features = [];
+        const last = data.fields.length - 2;
+        data.rows.forEach(row => {
+            const course = {};
+            for (let i = 0; i < last; i++) course[data.fields[i]] = row[i];
+            courses.push(course);
+            features.push({
+                department: course.department,
+                grade: course.grade,
+                course_type: course.course_type,
+                weekday: course.weekday,
+                period: course.period !== null ? course.period.split(',') : [],
+                degree: data.degrees.filter((label, bit) => row[last] & (1 << bit)),
+                category: data.categories.filter((label, bit) => row[last + 1] & (1 << bit)),
+                keywordFields: [course.course_name, course.instructor, course.classroom]
+            });
+        });
+        
+        const snapshot = {
+            version: data.version,
+            courses: courses,
+            features: features,
+            degrees: data.degrees,
+            categories: data.categories,
+            foldCase: data.ascii_case_insensitive
+        };
+        this.snapshots[semester] = snapshot;
+        console.log(`📦 已下載 ${semester} 學期目錄 (${courses.length} 筆課程)`);
+        return snapshot;
+    },
+    
+    /** 此查詢能否在本機處理 */
+    supports(params) {
+        if (!params.get('semester') || params.get('include_archived')) return false;
+        if (params.get('sort') === 'relevance' && params.get('keyword')) return false;
+        return !/[%_]/.test(params.get('keyword') || '') && !/[%_]/.test(params.get('period') || '');
+    },
+    
+    foldAscii(text) {
+        return text.replace(/[A-Z]/g, ch => ch.toLowerCase());
+    },
+    
+    keywordFilter(snapshot, keyword) {
+        const fold = snapshot.foldCase ? this.foldAscii : (text => text);
+        const needle = fold(keyword);
+        return f => f.keywordFields.some(value => value !== null && fold(value).includes(needle));
+    },
+    
+    /** 各篩選欄位的判斷函數 (對應 Catalog._facet_filters) */
+    facetFilters(snapshot, params) {
+        const filters = {};
+        ['department', 'grade', 'course_type'].forEach(field => {
+            const value = params.get(this.FACET_PARAMS[field]);
+            if (value) filters[field] = f => f[field] === value;
+        });
+        
+        const weekday = params.get('weekday');
+        if (weekday) {
+            const weekdays = new Set(weekday.split(','));
+            filters.weekday = f => weekdays.has(f.weekday);
+        }
+        
+        const period = params.get('period');
+        if (period) {
+            const periods = new Set(period.split(','));
+            filters.period = f => f.period.some(p => periods.has(p));
+        }
+        
+        [['degree', snapshot.degrees], ['category', snapshot.categories]].forEach(([field, labels]) => {
+            const value = params.get(field);
+            if (!value) return;
+            const wanted = new Set(value.split(',').filter(label => labels.includes(label)));
+            if (wanted.size > 0) filters[field] = f => f[field].some(label => wanted.has(label));
+        });
+        return filters;
+    },
+    
+    /** 本機搜尋，回傳課程列表 (順序與伺服器相同)；無法在本機處理時回傳 null */
+    async search(params) {
+        if (!this.supports(params)) return null;
+        const snapshot = await this.get(params.get('semester'));
+        if (!snapshot) return null;
+        
+        const keyword = params.get('keyword');
+        const checks = Object.values(this.facetFilters(snapshot, params));
+        if (keyword) checks.push(this.keywordFilter(snapshot, keyword));
+        return snapshot.courses.filter((course, i) => checks.every(check => check(snapshot.features[i])));
+    },
+    
+    /** 本機篩選計數，回傳 {count, facets} (對應 /api/courses/facets)；無法在本機處理時回傳 null */
+    async facets(params) {
+        if (!this.supports(params)) return null;
+        const snapshot = await this.get(params.get('semester'));
+        if (!snapshot) return null;
+        
+        const keyword = params.get('keyword');
+        const keywordFilter = keyword ? this.keywordFilter(snapshot, keyword) : null;
+        const filters = Object.entries(this.facetFilters(snapshot, params));
+        const fields = Object.keys(this.FACET_PARAMS);
+        const counts = Object.fromEntries(fields.map(field => [field, {}]));
+        let total = 0;
+        
+        snapshot.features.forEach(f => {
+            if (keywordFilter && !keywordFilter(f)) return;
+            
+            // 只有一個條件未通過時，該欄位的選項仍計數 (同一面板內可以複選)
+            let failed = null;
+            for (const [field, check] of filters) {
+                if (!check(f)) {
+                    if (failed !== null) return;
+                    failed = field;
+                }
+            }
+            
+            if (failed === null) total++;
+            (failed === null ? fields : [failed]).forEach(field => {
+                const values = Array.isArray(f[field]) ? new Set(f[field]) : [f[field]];
+                values.forEach(value => {
+                    if (value !== null && value !== undefined && value !== '') {
+                        counts[field][value] = (counts[field][value] || 0) + 1;
+                    }
+                });
+            });
+        });
+        return {count: total, facets: counts};
+    }
+};
@@ -48,45 +48,60 @@ let currentFilters = {
 let currentPanel = null;
 
 // ========================================
-// 功能：搜尋課程
+// 功能：依表單與篩選面板建立查詢參數
 // ========================================
-async function searchCourses() {
+function buildSearchParams() {
     const semester = document.getElementById('semesterSelect').value;
     const keyword = document.getElementById('keywordInput').value.trim();
     const department = document.getElementById('departmentSelect').value;
     const grade = document.getElementById('gradeSelect').value;
     const courseType = document.getElementById('typeSelect').value;
     
-    // 驗證必填欄位
-    if (!semester) {
-        alert('請選擇學期');
-        return;
-    }
-    
-    // 建立查詢參數
     let params = new URLSearchParams();
-    params.append('semester', semester);
+    if (semester) params.append('semester', semester);
     if (keyword) params.append('keyword', keyword);
     if (department) params.append('department', department);
     if (grade) params.append('grade', grade);
     if (courseType) params.append('type', courseType);
     
+    // 有關鍵字時可依相關度排序
+    const sort = document.getElementById('sortSelect').value;
+    if (sort && keyword) params.append('sort', sort);
+    
     // 加入篩選條件
-    if (currentFilters.weekday.length > 0) {
-        params.append('weekday', currentFilters.weekday.join(','));
-    }
-    if (currentFilters.period.length > 0) {
-        params.append('period', currentFilters.period.join(','));
-    }
-    if (currentFilters.degree.length > 0) {
-        params.append('degree', currentFilters.degree.join(','));
-    }
-    if (currentFilters.category.length > 0) {
-        params.append('category', currentFilters.category.join(','));
+    ['weekday', 'period', 'degree', 'category'].forEach(type => {
+        if (currentFilters[type].length > 0) {
+            params.append(type, currentFilters[type].join(','));
+        }
+    });
+    return params;
+}
+
+// ========================================
+// 功能：搜尋課程
+// ========================================
+async function searchCourses() {
+    const semester = document.getElementById('semesterSelect').value;
+    
+    // 驗證必填欄位
+    if (!semester) {
+        alert('請選擇學期');
+        return;
     }
     
+    // 建立查詢參數
+    const params = buildSearchParams();
+    
     try {
         console.log('🔍 搜尋課程:', params.toString());
+        // 已下載的學期目錄在本機篩選 (見 catalog-snapshot.js)
+        const local = await catalogSnapshot.search(params);
+        if (local) {
+            console.log(`✅ 找到 ${local.length} 筆課程 (本機目錄)`);
+            displaySearchResults(local);
+            return;
+        }
+        
         const response = await fetch(`/api/courses?${params.toString()}`);
         const data = await response.json();
         
@@ -105,74 +120,70 @@ async function searchCourses() {
 // ========================================
 // 功能：顯示搜尋結果 (訪客版 - 無收藏/預選按鈕)
 // ========================================
+// 大量結果只產生畫面上看得到的列 (見 virtual-list.js)
+const RESULT_HEADER = `
+    <tr>
+        <th>學期</th>
+        <th>系所</th>
+        <th>年級</th>
+        <th>課程名稱</th>
+        <th>授課教師</th>
+        <th>學分</th>
+        <th>課別</th>
+        <th>教室</th>
+        <th>星期</th>
+        <th>節次</th>
+        <th>大綱</th>
+    </tr>
+`;
+
+const RESULT_DAY_MAP = {'1': '一', '2': '二', '3': '三', '4': '四', 
+                        '5': '五', '6': '六', '7': '日'};
+
+function renderResultRow(course) {
+    // 解析星期
+    let weekdayDisplay = '';
+    if (course.weekday) {
+        weekdayDisplay = RESULT_DAY_MAP[course.weekday] || '';
+    } else if (course.day_time) {
+        const match = course.day_time.match(/週([一二三四五六日])/);
+        if (match) weekdayDisplay = match[1];
+    }
+    
+    // 解析節次
+    let periodDisplay = course.period || '';
+    if (!periodDisplay && course.day_time) {
+        const match = course.day_time.match(/(\d+[-,\d]*)/);
+        if (match) periodDisplay = match[1];
+    }
+    
+    return `
+        <td>${course.semester || ''}</td>
+        <td>${course.department || ''}</td>
+        <td>${course.grade || ''}</td>
+        <td>${course.course_name || ''}</td>
+        <td>${course.instructor || ''}</td>
+        <td>${course.credits || ''}</td>
+        <td>${course.course_type || ''}</td>
+        <td><a href="#" class="classroom-link">${course.classroom || ''}</a></td>
+        <td>${weekdayDisplay}</td>
+        <td>${periodDisplay}</td>
+        <td>
+            <button class="btn-icon btn-outline" onclick="showCourseInfo(${course.id})" title="課程資訊">•••</button>
+        </td>
+    `;
+}
+
 function displaySearchResults(courses) {
     const container = document.getElementById('searchResults');
     
     if (!courses || courses.length === 0) {
+        clearVirtualResults(container);
         container.innerHTML = '<p class="no-results">沒有找到符合的課程</p>';
         return;
     }
     
-    let html = `
-        <table class="results-table">
-            <thead>
-                <tr>
-                    <th>學期</th>
-                    <th>系所</th>
-                    <th>年級</th>
-                    <th>課程名稱</th>
-                    <th>授課教師</th>
-                    <th>學分</th>
-                    <th>課別</th>
-                    <th>教室</th>
-                    <th>星期</th>
-                    <th>節次</th>
-                    <th>大綱</th>
-                </tr>
-            </thead>
-            <tbody>
-    `;
-    
-    courses.forEach(course => {
-        // 解析星期
-        const dayMap = {'1': '一', '2': '二', '3': '三', '4': '四', 
-                       '5': '五', '6': '六', '7': '日'};
-        let weekdayDisplay = '';
-        if (course.weekday) {
-            weekdayDisplay = dayMap[course.weekday] || '';
-        } else if (course.day_time) {
-            const match = course.day_time.match(/週([一二三四五六日])/);
-            if (match) weekdayDisplay = match[1];
-        }
-        
-        // 解析節次
-        let periodDisplay = course.period || '';
-        if (!periodDisplay && course.day_time) {
-            const match = course.day_time.match(/(\d+[-,\d]*)/);
-            if (match) periodDisplay = match[1];
-        }
-        
-        html += `
-            <tr>
-                <td>${course.semester || ''}</td>
-                <td>${course.department || ''}</td>
-                <td>${course.grade || ''}</td>
-                <td>${course.course_name || ''}</td>
-                <td>${course.instructor || ''}</td>
-                <td>${course.credits || ''}</td>
-                <td>${course.course_type || ''}</td>
-                <td><a href="#" class="classroom-link">${course.classroom || ''}</a></td>
-                <td>${weekdayDisplay}</td>
-                <td>${periodDisplay}</td>
-                <td>
-                    <button class="btn-icon btn-outline" onclick="showCourseInfo(${course.id})" title="課程資訊">•••</button>
-                </td>
-            </tr>
-        `;
-    });
-    
-    html += '</tbody></table>';
-    container.innerHTML = html;
+    renderVirtualResults(container, courses, RESULT_HEADER, renderResultRow);
 }
 
 // ========================================
@@ -271,6 +282,10 @@ async function showCourseInfo(courseId) {
                                 <span class="info-label">課程備註</span>
                                 <div class="remarks-text">${course.remarks || '無'}</div>
                             </div>
+                            <div class="info-remarks">
+                                <span class="info-label">歷年開課</span>
+                                <div id="courseHistory" class="remarks-text course-history">載入中...</div>
+                            </div>
                         </div>
                         <div class="course-info-footer">
                             <button class="btn-close-green" onclick="closeCourseInfoModal()">關閉</button>
@@ -285,6 +300,7 @@ async function showCourseInfo(courseId) {
             
             // 添加新Modal
             document.body.insertAdjacentHTML('beforeend', modalHTML);
+            loadCourseHistory(course.course_code);
         }
     } catch (error) {
         console.error('❌ 載入課程資訊失敗:', error);
@@ -292,6 +308,31 @@ async function showCourseInfo(courseId) {
     }
 }
 
+// 載入跨學期開課紀錄
+async function loadCourseHistory(courseCode) {
+    const container = document.getElementById('courseHistory');
+    if (!container || !courseCode) return;
+    
+    try {
+        const response = await fetch(`/api/courses/history/${encodeURIComponent(courseCode)}`);
+        const data = await response.json();
+        
+        if (!data.success || data.semesters.length <= 1) {
+            container.textContent = '僅本學期開課';
+            return;
+        }
+        container.innerHTML = data.semesters.map(s => `
+            <div class="history-row">
+                <span class="history-semester">${s.semester}</span>
+                <span>${s.sections.map(c => [c.instructor || '未定', c.day_time, c.classroom].filter(Boolean).join(' ')).join('；')}</span>
+            </div>
+        `).join('');
+    } catch (error) {
+        console.error('❌ 載入歷年開課失敗:', error);
+        container.textContent = '載入失敗';
+    }
+}
+
 // 關閉課程資訊Modal
 function closeCourseInfoModal(event) {
     if (event && event.target.id !== 'courseInfoModal') return;
@@ -308,6 +349,7 @@ function clearSearch() {
     document.getElementById('departmentSelect').value = '';
     document.getElementById('gradeSelect').value = '';
     document.getElementById('typeSelect').value = '';
+    document.getElementById('sortSelect').value = '';
     
     // 清除篩選條件
     currentFilters = {
@@ -322,7 +364,9 @@ function clearSearch() {
     currentPanel = null;
     
     // 清除結果
-    document.getElementById('searchResults').innerHTML = '<p class="no-results">請輸入搜尋條件查詢課程</p>';
+    const results = document.getElementById('searchResults');
+    clearVirtualResults(results);
+    results.innerHTML = '<p class="no-results">請輸入搜尋條件查詢課程</p>';
     
     console.log('✅ 已清除搜尋條件');
 }
@@ -364,6 +408,7 @@ function toggleFilterPanel(panelType) {
     
     // 恢復已選狀態
     restoreFilterState(panelType);
+    refreshFacetCounts();
 }
 
 function restoreFilterState(panelType) {
@@ -383,6 +428,57 @@ function updateFilter(filterType, value, checked) {
         currentFilters[filterType] = currentFilters[filterType].filter(v => v !== value);
     }
     console.log(`篩選更新 - ${filterType}:`, currentFilters[filterType]);
+    refreshFacetCounts();
+}
+
+// ========================================
+// 功能：篩選面板選項顯示課程數
+// ========================================
+let facetRequest = null;
+
+async function refreshFacetCounts() {
+    if (!currentPanel) return;
+    
+    // 連續切換時取消前一次請求
+    if (facetRequest) facetRequest.abort();
+    facetRequest = new AbortController();
+    
+    const request = facetRequest;
+    
+    try {
+        const params = buildSearchParams();
+        const local = await catalogSnapshot.facets(params);
+        if (local) {
+            if (!request.signal.aborted) applyFacetCounts(currentPanel, local.facets[currentPanel] || {});
+            return;
+        }
+        
+        const response = await fetch(`/api/courses/facets?${params}`, {signal: request.signal});
+        const data = await response.json();
+        if (data.success) {
+            applyFacetCounts(currentPanel, data.facets[currentPanel] || {});
+        }
+    } catch (error) {
+        if (error.name !== 'AbortError') console.error('❌ 載入篩選計數失敗:', error);
+    }
+}
+
+function applyFacetCounts(panelType, counts) {
+    document.querySelectorAll('#filterPanelContainer .filter-checkbox-group').forEach(group => {
+        const checkbox = group.querySelector('input[type="checkbox"]');
+        const label = group.querySelector('label');
+        if (!checkbox || !label) return;
+        
+        const count = counts[checkbox.value] || 0;
+        let badge = label.querySelector('.facet-count');
+        if (!badge) {
+            badge = document.createElement('span');
+            badge.className = 'facet-count';
+            label.appendChild(badge);
+        }
+        badge.textContent = ` (${count})`;
+        group.classList.toggle('facet-empty', count === 0 && !checkbox.checked);
+    });
 }
 
 // 建立星期篩選面板
@@ -506,3 +602,48 @@ function createCategoryPanel() {
         </div>
     `;
 }
+
+// ========================================
+// 關鍵字自動完成
+// ========================================
+const SUGGESTION_TYPES = {course: '課程', instructor: '教師', classroom: '教室', code: '課號'};
+let suggestTimer = null;
+let suggestRequest = null;
+
+document.addEventListener('input', function(e) {
+    if (e.target.id !== 'keywordInput') return;
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(() => loadSuggestions(e.target.value.trim()), 150);
+});
+
+async function loadSuggestions(prefix) {
+    const list = document.getElementById('keywordSuggestions');
+    if (!prefix) {
+        list.innerHTML = '';
+        return;
+    }
+    
+    // 持續輸入時取消前一次請求
+    if (suggestRequest) suggestRequest.abort();
+    suggestRequest = new AbortController();
+    
+    const params = new URLSearchParams({q: prefix});
+    const semester = document.getElementById('semesterSelect').value;
+    if (semester) params.append('semester', semester);
+    
+    try {
+        const response = await fetch(`/api/courses/suggest?${params}`, {signal: suggestRequest.signal});
+        const data = await response.json();
+        if (!data.success) return;
+        
+        list.innerHTML = '';
+        data.suggestions.forEach(s => {
+            const option = document.createElement('option');
+            option.value = s.text;
+            option.label = `${SUGGESTION_TYPES[s.type] || ''} · ${s.count} 門`;
+            list.appendChild(option);
+        });
+    } catch (error) {
+        if (error.name !== 'AbortError') console.error('❌ 載入建議失敗:', error);
+    }
+}
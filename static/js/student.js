@@ -15,6 +15,7 @@ window.onload = function() {
     console.log('✅ 學生頁面載入完成');
     loadDepartments();
     loadMyCourses();
+    subscribeSeats([]);
 };
 
 // ========================================
@@ -84,16 +85,15 @@ function showSection(section) {
 }
 
 // ========================================
-// 功能:搜尋課程
+// 功能：依表單與篩選面板建立查詢參數
 // ========================================
-async function searchCourses() {
+function buildSearchParams() {
     const keyword = document.getElementById('keywordInput').value.trim();
     const semester = document.getElementById('semesterSelect').value;
     const department = document.getElementById('departmentSelect').value;
     const grade = document.getElementById('gradeSelect').value;
     const courseType = document.getElementById('typeSelect').value;
     
-    // 建立查詢參數
     let params = new URLSearchParams();
     if (keyword) params.append('keyword', keyword);
     if (semester) params.append('semester', semester);
@@ -101,29 +101,46 @@ async function searchCourses() {
     if (grade) params.append('grade', grade);
     if (courseType) params.append('type', courseType);
     
+    // 有關鍵字時可依相關度排序
+    const sort = document.getElementById('sortSelect').value;
+    if (sort && keyword) params.append('sort', sort);
+    
     // 添加新的篩選條件
-    if (selectedFilters.weekday && selectedFilters.weekday.length > 0) {
-        params.append('weekday', selectedFilters.weekday.join(','));
-    }
-    if (selectedFilters.period && selectedFilters.period.length > 0) {
-        params.append('period', selectedFilters.period.join(','));
-    }
-    if (selectedFilters.degree && selectedFilters.degree.length > 0) {
-        params.append('degree', selectedFilters.degree.join(','));
-    }
-    if (selectedFilters.category && selectedFilters.category.length > 0) {
-        params.append('category', selectedFilters.category.join(','));
-    }
+    ['weekday', 'period', 'degree', 'category'].forEach(type => {
+        if (selectedFilters[type] && selectedFilters[type].length > 0) {
+            params.append(type, selectedFilters[type].join(','));
+        }
+    });
+    return params;
+}
+
+// ========================================
+// 功能:搜尋課程
+// ========================================
+async function searchCourses() {
+    // 建立查詢參數
+    const params = buildSearchParams();
     
     console.log('🔍 搜尋參數:', Object.fromEntries(params));
     
     try {
+        // 已下載的學期目錄在本機篩選 (見 catalog-snapshot.js)
+        const local = await catalogSnapshot.search(params);
+        if (local) {
+            console.log(`✅ 找到 ${local.length} 筆課程 (本機目錄)`);
+            displayResults(local);
+            return;
+        }
+        
         const response = await fetch(`/api/courses?${params}`);
         const data = await response.json();
         
         if (data.success) {
             console.log(`✅ 找到 ${data.count} 筆課程`);
             displayResults(data.items);
+        } else if (response.status === 429) {
+            // 請求過於頻繁或系統忙碌 (保留目前的結果)
+            alert(data.message);
         } else {
             displayResults([]);
         }
@@ -136,83 +153,175 @@ async function searchCourses() {
 // ========================================
 // 功能：顯示搜尋結果
 // ========================================
+// 大量結果只產生畫面上看得到的列 (見 virtual-list.js)
+const RESULT_HEADER = `
+    <tr>
+        <th>學期</th>
+        <th>系所</th>
+        <th>年級</th>
+        <th>課程名稱</th>
+        <th>授課教師</th>
+        <th>學分</th>
+        <th>課別</th>
+        <th>教室</th>
+        <th>星期</th>
+        <th>節次</th>
+        <th>名額</th>
+        <th>大綱</th>
+        <th>收藏</th>
+        <th>預選</th>
+    </tr>
+`;
+
+const RESULT_DAY_MAP = {'1': '一', '2': '二', '3': '三', '4': '四', 
+                        '5': '五', '6': '六', '7': '日'};
+
+function renderResultRow(course) {
+    // 解析星期
+    let weekdayDisplay = '';
+    if (course.weekday) {
+        weekdayDisplay = RESULT_DAY_MAP[course.weekday] || '';
+    } else if (course.day_time) {
+        // 從day_time提取星期
+        const match = course.day_time.match(/週([一二三四五六日])/);
+        if (match) weekdayDisplay = match[1];
+    }
+    
+    // 解析節次
+    let periodDisplay = course.period || '';
+    if (!periodDisplay && course.day_time) {
+        const match = course.day_time.match(/(\d+[-,\d]*)/);
+        if (match) periodDisplay = match[1];
+    }
+    
+    return `
+        <td>${course.semester || ''}</td>
+        <td>${course.department || ''}</td>
+        <td>${course.grade || ''}</td>
+        <td>${course.course_name || ''}</td>
+        <td>${course.instructor || ''}</td>
+        <td>${course.credits || ''}</td>
+        <td>${course.course_type || ''}</td>
+        <td><a href="#" class="classroom-link">${course.classroom || ''}</a></td>
+        <td>${weekdayDisplay}</td>
+        <td>${periodDisplay}</td>
+        ${renderSeatCell(course.id, 'td')}
+        <td>
+            <button class="btn-icon btn-outline" onclick="showCourseInfo(${course.id})" title="課程資訊">•••</button>
+        </td>
+        <td>
+            <button class="btn-icon btn-heart" onclick="addToFavorite(${course.id})" title="收藏">♡</button>
+        </td>
+        <td>
+            <button class="btn-icon btn-add" onclick="addToPreselect(${course.id})" title="加入預選">⊕</button>
+        </td>
+    `;
+}
+
 function displayResults(courses) {
     const container = document.getElementById('searchResults');
     
     if (!courses || courses.length === 0) {
+        clearVirtualResults(container);
         container.innerHTML = '<p class="no-results">沒有找到符合的課程</p>';
         return;
     }
     
-    let html = `
-        <table class="results-table">
-            <thead>
-                <tr>
-                    <th>學期</th>
-                    <th>系所</th>
-                    <th>年級</th>
-                    <th>課程名稱</th>
-                    <th>授課教師</th>
-                    <th>學分</th>
-                    <th>課別</th>
-                    <th>教室</th>
-                    <th>星期</th>
-                    <th>節次</th>
-                    <th>大綱</th>
-                    <th>收藏</th>
-                    <th>預選</th>
-                </tr>
-            </thead>
-            <tbody>
-    `;
+    const table = renderVirtualResults(container, courses, RESULT_HEADER, renderResultRow);
+    // 訂閱畫面上課程的即時名額
+    table.onRangeChange = (start, end) => scheduleSeatSubscription(courses.slice(start, end).map(course => course.id));
+    table.onRangeChange(table.start, table.end);
+}
+
+// ========================================
+// 功能：即時名額 (Server-Sent Events，未啟用推送時定期查詢)
+// ========================================
+// 訂閱結果列表中畫面上的課程 (伺服器另外加入自己收藏與預選的課程)，
+// 捲動停止後才以新的課程清單重新連線；名額異動時伺服器只送出有改變的課程
+// 同步 worker 上伺服器不推送 (data-seat-stream="0" 或 /api/seats/stream 回傳 204)，
+// 改為定期查詢 /api/seats (間隔由伺服器指定)，頁面隱藏時暫停
+const SEAT_RESUBSCRIBE_DELAY = 500;
+const seatCounts = new Map();   // 課程 id -> [已選人數, 容量] 或 null (課程已刪除)
+let seatSource = null;
+let seatCourseIds = [];
+let seatTimer = null;
+let seatPollInterval = 15000;  // 毫秒，伺服器可指定
+let seatPollTimer = null;
+
+function formatSeats(courseId) {
+    const seats = seatCounts.get(courseId);
+    if (seats === undefined) return '';
+    if (seats === null) return '-';
+    return `${seats[0]}/${seats[1]}`;
+}
+
+function isSeatFull(courseId) {
+    const seats = seatCounts.get(courseId);
+    return Boolean(seats && seats[1] > 0 && seats[0] >= seats[1]);
+}
+
+function renderSeatCell(courseId, tag) {
+    const full = isSeatFull(courseId) ? ' seat-full' : '';
+    return `<${tag} class="seat-count${full}" title="已選人數/容量" data-seat-course="${courseId}">${formatSeats(courseId)}</${tag}>`;
+}
+
+function scheduleSeatSubscription(courseIds) {
+    clearTimeout(seatTimer);
+    seatTimer = setTimeout(() => subscribeSeats(courseIds), SEAT_RESUBSCRIBE_DELAY);
+}
+
+function subscribeSeats(courseIds, force = false) {
+    if (document.body.dataset.seatStream !== '1' || !window.EventSource) {
+        seatCourseIds = courseIds;
+        pollSeats();
+        return;
+    }
+    if (seatSource && !force && courseIds.join(',') === seatCourseIds.join(',')) return;
     
-    courses.forEach(course => {
-        // 解析星期
-        const dayMap = {'1': '一', '2': '二', '3': '三', '4': '四', 
-                       '5': '五', '6': '六', '7': '日'};
-        let weekdayDisplay = '';
-        if (course.weekday) {
-            weekdayDisplay = dayMap[course.weekday] || '';
-        } else if (course.day_time) {
-            // 從day_time提取星期
-            const match = course.day_time.match(/週([一二三四五六日])/);
-            if (match) weekdayDisplay = match[1];
-        }
-        
-        // 解析節次
-        let periodDisplay = course.period || '';
-        if (!periodDisplay && course.day_time) {
-            const match = course.day_time.match(/(\d+[-,\d]*)/);
-            if (match) periodDisplay = match[1];
+    if (seatSource) seatSource.close();
+    clearTimeout(seatPollTimer);
+    seatCourseIds = courseIds;
+    const source = new EventSource(`/api/seats/stream?courses=${courseIds.join(',')}`);
+    source.addEventListener('seats', event => applySeatCounts(JSON.parse(event.data)));
+    // 連線被拒 (204 或錯誤狀態碼) 時 EventSource 不會重新連線，改為定期查詢
+    source.onerror = () => {
+        if (source.readyState !== EventSource.CLOSED || seatSource !== source) return;
+        seatSource = null;
+        pollSeats();
+    };
+    seatSource = source;
+}
+
+async function pollSeats() {
+    clearTimeout(seatPollTimer);
+    if (!document.hidden) {
+        try {
+            const response = await fetch(`/api/seats?courses=${seatCourseIds.join(',')}`);
+            if (response.ok) {
+                const data = await response.json();
+                if (data.success) {
+                    applySeatCounts(data.seats);
+                    if (data.interval) seatPollInterval = data.interval * 1000;
+                }
+            }
+        } catch (error) {
+            console.error('❌ 查詢名額失敗:', error);
         }
-        
-        html += `
-            <tr>
-                <td>${course.semester || ''}</td>
-                <td>${course.department || ''}</td>
-                <td>${course.grade || ''}</td>
-                <td>${course.course_name || ''}</td>
-                <td>${course.instructor || ''}</td>
-                <td>${course.credits || ''}</td>
-                <td>${course.course_type || ''}</td>
-                <td><a href="#" class="classroom-link">${course.classroom || ''}</a></td>
-                <td>${weekdayDisplay}</td>
-                <td>${periodDisplay}</td>
-                <td>
-                    <button class="btn-icon btn-outline" onclick="showCourseInfo(${course.id})" title="課程資訊">•••</button>
-                </td>
-                <td>
-                    <button class="btn-icon btn-heart" onclick="addToFavorite(${course.id})" title="收藏">♡</button>
-                </td>
-                <td>
-                    <button class="btn-icon btn-add" onclick="addToPreselect(${course.id})" title="加入預選">⊕</button>
-                </td>
-            </tr>
-        `;
+    }
+    if (seatSource) return;  // 查詢期間已改為推送
+    clearTimeout(seatPollTimer);
+    seatPollTimer = setTimeout(pollSeats, seatPollInterval);
+}
+
+function applySeatCounts(data) {
+    Object.entries(data).forEach(([id, seats]) => {
+        const courseId = Number(id);
+        seatCounts.set(courseId, seats);
+        document.querySelectorAll(`[data-seat-course="${courseId}"]`).forEach(element => {
+            element.textContent = formatSeats(courseId);
+            element.classList.toggle('seat-full', isSeatFull(courseId));
+        });
     });
-    
-    html += '</tbody></table>';
-    container.innerHTML = html;
 }
 
 // ========================================
@@ -311,6 +420,10 @@ async function showCourseInfo(courseId) {
                                 <span class="info-label">課程備註</span>
                                 <div class="remarks-text">${course.remarks || '無'}</div>
                             </div>
+                            <div class="info-remarks">
+                                <span class="info-label">歷年開課</span>
+                                <div id="courseHistory" class="remarks-text course-history">載入中...</div>
+                            </div>
                         </div>
                         <div class="course-info-footer">
                             <button class="btn-close-green" onclick="closeCourseInfoModal()">關閉</button>
@@ -325,6 +438,7 @@ async function showCourseInfo(courseId) {
             
             // 添加新Modal
             document.body.insertAdjacentHTML('beforeend', modalHTML);
+            loadCourseHistory(course.course_code);
         }
     } catch (error) {
         console.error('❌ 載入課程資訊失敗:', error);
@@ -332,6 +446,31 @@ async function showCourseInfo(courseId) {
     }
 }
 
+// 載入跨學期開課紀錄
+async function loadCourseHistory(courseCode) {
+    const container = document.getElementById('courseHistory');
+    if (!container || !courseCode) return;
+    
+    try {
+        const response = await fetch(`/api/courses/history/${encodeURIComponent(courseCode)}`);
+        const data = await response.json();
+        
+        if (!data.success || data.semesters.length <= 1) {
+            container.textContent = '僅本學期開課';
+            return;
+        }
+        container.innerHTML = data.semesters.map(s => `
+            <div class="history-row">
+                <span class="history-semester">${s.semester}</span>
+                <span>${s.sections.map(c => [c.instructor || '未定', c.day_time, c.classroom].filter(Boolean).join(' ')).join('；')}</span>
+            </div>
+        `).join('');
+    } catch (error) {
+        console.error('❌ 載入歷年開課失敗:', error);
+        container.textContent = '載入失敗';
+    }
+}
+
 // 關閉課程資訊Modal
 function closeCourseInfoModal(event) {
     if (event && event.target.id !== 'courseInfoModal') return;
@@ -354,6 +493,7 @@ async function addToFavorite(courseId) {
         if (result.success) {
             alert('✓ ' + result.message);
             console.log('✅ 加入收藏成功');
+            subscribeSeats(seatCourseIds, true);  // 重新連線以加入新收藏的課程
         } else {
             alert('✗ ' + result.message);
         }
@@ -378,6 +518,7 @@ async function addToPreselect(courseId) {
         if (result.success) {
             alert('✓ ' + result.message);
             console.log('✅ 加入預選成功');
+            subscribeSeats(seatCourseIds, true);
         } else {
             alert('✗ ' + result.message);
         }
@@ -443,6 +584,7 @@ function displayFavoritesList(courses) {
                     <span class="favorite-type">${course.course_type || ''}</span>
                     <span class="favorite-name">${course.course_name || ''}</span>
                     <span class="favorite-instructor">${course.instructor || ''}</span>
+                    ${renderSeatCell(course.id, 'span')}
                 </div>
                 <div class="favorite-actions">
                     <button class="btn-add-preselect" onclick="addFavoriteToPreselect(${course.id}, ${course.enrollment_id})" title="加入預選">
@@ -648,7 +790,8 @@ async function removeCourseFromSchedule(enrollmentId) {
 
 // 匯出課表
 function exportSchedule() {
-    alert('匯出功能開發中...');
+    // 伺服器端串流產生 Excel 檔案，直接觸發下載
+    window.location.href = '/api/export/schedule?format=xlsx';
 }
 
 // ========================================
@@ -732,6 +875,7 @@ function clearSearch() {
     document.getElementById('departmentSelect').value = '';
     document.getElementById('gradeSelect').value = '';
     document.getElementById('typeSelect').value = '';
+    document.getElementById('sortSelect').value = '';
     
     // 清除新的篩選條件
     selectedFilters = {
@@ -746,8 +890,9 @@ function clearSearch() {
     if (container) container.innerHTML = '';
     currentFilterPanel = null;
     
-    document.getElementById('searchResults').innerHTML = 
-        '<p class="no-results">請輸入搜尋條件查詢課程</p>';
+    const results = document.getElementById('searchResults');
+    clearVirtualResults(results);
+    results.innerHTML = '<p class="no-results">請輸入搜尋條件查詢課程</p>';
     console.log('🧹 清除搜尋條件');
 }
 
@@ -780,6 +925,51 @@ document.addEventListener('keypress', function(e) {
     }
 });
 
+// ========================================
+// 關鍵字自動完成
+// ========================================
+const SUGGESTION_TYPES = {course: '課程', instructor: '教師', classroom: '教室', code: '課號'};
+let suggestTimer = null;
+let suggestRequest = null;
+
+document.addEventListener('input', function(e) {
+    if (e.target.id !== 'keywordInput') return;
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(() => loadSuggestions(e.target.value.trim()), 150);
+});
+
+async function loadSuggestions(prefix) {
+    const list = document.getElementById('keywordSuggestions');
+    if (!prefix) {
+        list.innerHTML = '';
+        return;
+    }
+    
+    // 持續輸入時取消前一次請求
+    if (suggestRequest) suggestRequest.abort();
+    suggestRequest = new AbortController();
+    
+    const params = new URLSearchParams({q: prefix});
+    const semester = document.getElementById('semesterSelect').value;
+    if (semester) params.append('semester', semester);
+    
+    try {
+        const response = await fetch(`/api/courses/suggest?${params}`, {signal: suggestRequest.signal});
+        const data = await response.json();
+        if (!data.success) return;
+        
+        list.innerHTML = '';
+        data.suggestions.forEach(s => {
+            const option = document.createElement('option');
+            option.value = s.text;
+            option.label = `${SUGGESTION_TYPES[s.type] || ''} · ${s.count} 門`;
+            list.appendChild(option);
+        });
+    } catch (error) {
+        if (error.name !== 'AbortError') console.error('❌ 載入建議失敗:', error);
+    }
+}
+
 console.log('🎉 student.js 載入完成');
 
 // ========================================
@@ -834,6 +1024,7 @@ function toggleFilterPanel(type) {
     
     // 恢復之前的選擇狀態
     restoreFilterSelections(type);
+    refreshFacetCounts();
 }
 
 // 建立星期篩選面板
@@ -968,6 +1159,55 @@ function updateFilter(type, value, checked) {
         selectedFilters[type] = selectedFilters[type].filter(v => v !== value);
     }
     console.log('篩選條件已更新:', selectedFilters);
+    refreshFacetCounts();
+}
+
+// 篩選面板選項顯示課程數
+let facetRequest = null;
+
+async function refreshFacetCounts() {
+    if (!currentFilterPanel) return;
+    
+    // 連續切換時取消前一次請求
+    if (facetRequest) facetRequest.abort();
+    facetRequest = new AbortController();
+    
+    const request = facetRequest;
+    
+    try {
+        const params = buildSearchParams();
+        const local = await catalogSnapshot.facets(params);
+        if (local) {
+            if (!request.signal.aborted) applyFacetCounts(currentFilterPanel, local.facets[currentFilterPanel] || {});
+            return;
+        }
+        
+        const response = await fetch(`/api/courses/facets?${params}`, {signal: request.signal});
+        const data = await response.json();
+        if (data.success) {
+            applyFacetCounts(currentFilterPanel, data.facets[currentFilterPanel] || {});
+        }
+    } catch (error) {
+        if (error.name !== 'AbortError') console.error('❌ 載入篩選計數失敗:', error);
+    }
+}
+
+function applyFacetCounts(panelType, counts) {
+    document.querySelectorAll('#filterPanelContainer .filter-checkbox-group').forEach(group => {
+        const checkbox = group.querySelector('input[type="checkbox"]');
+        const label = group.querySelector('label');
+        if (!checkbox || !label) return;
+        
+        const count = counts[checkbox.value] || 0;
+        let badge = label.querySelector('.facet-count');
+        if (!badge) {
+            badge = document.createElement('span');
+            badge.className = 'facet-count';
+            label.appendChild(badge);
+        }
+        badge.textContent = ` (${count})`;
+        group.classList.toggle('facet-empty', count === 0 && !checkbox.checked);
+    });
 }
 
 // 恢復篩選選擇狀態
@@ -0,0 +1,172 @@
+/* ==========================================================
+   北護課程查詢系統 - 虛擬化結果列表 (學生、訪客、管理者頁面共用)
+   只產生畫面上看得到的列 (加上前後緩衝)，捲動時重複使用離開畫面的 <tr>，
+   其餘高度以上下兩個空白列撐開；每個畫面更新最多處理一次 (requestAnimationFrame)，
+   一次需要改寫的列數與結果總數無關，捲動時不會因為結果很多而卡頓
+   結果表格的儲存格不換行 (white-space: nowrap)，每列高度相同
+   ========================================================== */
+
+class VirtualTable {
+    /**
+     * tbody: 結果表格的 <tbody>
+     * options.renderRow(item, index): 回傳該列 <td> 的 HTML
+     * options.overscan: 可見範圍前後多產生的列數
+     * options.rowHeight: 量到實際列高前使用的估計值 (px)
+     * onRangeChange(start, end): 產生的列範圍改變時呼叫 (可在建立後設定)
+     */
+    constructor(tbody, options) {
+        this.tbody = tbody;
+        this.renderRow = options.renderRow;
+        this.overscan = options.overscan || 10;
+        this.rowHeight = options.rowHeight || 50;
+        this.measured = false;
+        this.items = [];
+        this.rows = new Map();   // 資料索引 -> 目前顯示的 <tr>
+        this.pool = [];          // 可重複使用的 <tr>
+        this.start = 0;
+        this.end = 0;
+        this.frame = null;
+        this.onRangeChange = options.onRangeChange || null;
+        
+        const columns = tbody.closest('table').querySelectorAll('thead th').length || 1;
+        this.topSpacer = this.createSpacer(columns);
+        this.bottomSpacer = this.createSpacer(columns);
+        tbody.replaceChildren(this.topSpacer, this.bottomSpacer);
+        
+        this.scroller = VirtualTable.findScroller(tbody);
+        this.onScroll = () => this.schedule();
+        this.scrollTarget = this.scroller === document.scrollingElement ? window : this.scroller;
+        this.scrollTarget.addEventListener('scroll', this.onScroll, {passive: true});
+        window.addEventListener('resize', this.onScroll, {passive: true});
+    }
+    
+    static findScroller(element) {
+        for (let node = element.parentElement; node && node !== document.body; node = node.parentElement) {
+            const overflowY = getComputedStyle(node).overflowY;
+            if ((overflowY === 'auto' || overflowY === 'scroll') && node.clientHeight > 0) {
+                return node;
+            }
+        }
+        return document.scrollingElement || document.documentElement;
+    }
+    
+    createSpacer(columns) {
+        const tr = document.createElement('tr');
+        tr.className = 'virtual-spacer';
+        tr.setAttribute('aria-hidden', 'true');
+        const td = document.createElement('td');
+        td.colSpan = columns;
+        tr.appendChild(td);
+        return tr;
+    }
+    
+    /** 換成新的資料 (第一個畫面立即產生，不等下一次 requestAnimationFrame) */
+    setItems(items) {
+        this.items = items || [];
+        this.rows.forEach(tr => this.pool.push(tr));
+        this.rows.clear();
+        this.start = this.end = -1;  // 強制重新產生
+        this.update();
+    }
+    
+    schedule() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.update();
+            });
+        }
+    }
+    
+    /** 依捲動位置計算可見範圍，只改寫進入範圍的列 */
+    update() {
+        const scrollerTop = this.scroller === document.scrollingElement ? 0 : this.scroller.getBoundingClientRect().top;
+        const viewportHeight = this.scroller === document.scrollingElement ? window.innerHeight : this.scroller.clientHeight;
+        // 表格內容開頭相對於可見區域頂端的位置 (往上捲出去時為負值)
+        const offset = this.topSpacer.getBoundingClientRect().top - scrollerTop;
+        
+        const total = this.items.length;
+        const first = Math.floor(Math.max(0, -offset) / this.rowHeight);
+        const visible = Math.ceil(viewportHeight / this.rowHeight) + 1;
+        const start = Math.max(0, Math.min(first, total) - this.overscan);
+        const end = Math.min(total, first + visible + this.overscan);
+        
+        if (start !== this.start || end !== this.end) {
+            this.renderRange(start, end);
+        }
+        
+        // 第一次有資料時量測實際列高，與估計值不同時重新計算範圍
+        if (!this.measured && this.rows.size > 0) {
+            const height = this.rows.values().next().value.getBoundingClientRect().height;
+            if (height > 0) {
+                this.measured = true;
+                if (Math.abs(height - this.rowHeight) > 0.5) {
+                    this.rowHeight = height;
+                    this.update();
+                }
+            }
+        }
+    }
+    
+    renderRange(start, end) {
+        // 離開範圍的列放回 pool
+        this.rows.forEach((tr, index) => {
+            if (index < start || index >= end) {
+                this.rows.delete(index);
+                this.pool.push(tr);
+            }
+        });
+        
+        // 依索引順序排列在兩個空白列之間，仍在範圍內的列不改寫也不移動
+        let next = this.topSpacer.nextSibling;
+        for (let index = start; index < end; index++) {
+            let tr = this.rows.get(index);
+            if (!tr) {
+                tr = this.pool.pop() || document.createElement('tr');
+                tr.innerHTML = this.renderRow(this.items[index], index);
+                this.rows.set(index, tr);
+            }
+            if (tr === next) {
+                next = next.nextSibling;
+            } else {
+                this.tbody.insertBefore(tr, next);
+            }
+        }
+        this.pool.forEach(tr => tr.remove());
+        
+        this.topSpacer.firstChild.style.height = `${start * this.rowHeight}px`;
+        this.bottomSpacer.firstChild.style.height = `${(this.items.length - end) * this.rowHeight}px`;
+        this.start = start;
+        this.end = end;
+        if (this.onRangeChange) this.onRangeChange(start, end);
+    }
+    
+    /** 結果被換掉時移除捲動監聽 */
+    destroy() {
+        if (this.frame !== null) cancelAnimationFrame(this.frame);
+        this.scrollTarget.removeEventListener('scroll', this.onScroll);
+        window.removeEventListener('resize', this.onScroll);
+    }
+}
+
+/** 釋放 container 中上一次的 VirtualTable (改顯示其他內容前呼叫) */
+function clearVirtualResults(container) {
+    if (container.virtualTable) {
+        container.virtualTable.destroy();
+        container.virtualTable = null;
+    }
+}
+
+/**
+ * 在 container 中建立結果表格並以 VirtualTable 顯示 items
+ * headerHTML: <thead> 的內容；beforeHTML: 表格前的其他內容 (例如批次操作列)
+ * 回傳 VirtualTable (同一個 container 再次呼叫時會先釋放上一個)
+ */
+function renderVirtualResults(container, items, headerHTML, renderRow, beforeHTML = '') {
+    clearVirtualResults(container);
+    container.innerHTML = `${beforeHTML}<table class="results-table"><thead>${headerHTML}</thead><tbody></tbody></table>`;
+    const table = new VirtualTable(container.querySelector('tbody'), {renderRow: renderRow});
+    table.setItems(items);
+    container.virtualTable = table;
+    return table;
+}
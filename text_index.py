@@ -0,0 +1,164 @@
+# ==========================================================
+# 北護課程查詢系統 - 課程全文索引 (BM25 相關度排序)
+# 中文以連續字元的單字與雙字 (bigram) 建立詞彙，英文與數字以單字為單位
+# 各欄位依權重合併詞頻 (BM25F)，查詢只計算含查詢詞的課程，再取前 K 筆
+# 課程資料重新載入時以 sync() 增量更新，只重新斷詞有變動的課程
+# ==========================================================
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# 欄位權重
+FIELD_BOOSTS = {
+    'course_name': 3.0,
+    'course_name_en': 2.5,
+    'course_code': 2.0,
+    'instructor': 2.0,
+    'classroom': 1.0,
+    'course_summary': 1.0,
+    'remarks': 0.5,
+}
+
+# BM25 參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_CJK = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(rf'[0-9a-z]+|[{_CJK}]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+def tokenize(text, query=False):
+    """
+    斷詞: 全形轉半形、英文轉小寫
+    中文連續字元建立 bigram；索引時另外加入單字，讓單一中文字的查詢也能找到課程
+    查詢時只用 bigram (單字查詢除外)，避免常見字干擾排序
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        word = match.group()
+        if not _CJK_RE.match(word) or len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            if not query:
+                tokens.extend(word)
+    return tokens
+
+class TextIndex:
+    """以課程 id 為文件編號的倒排索引"""
+
+    def __init__(self):
+        self.signatures = {}
+        self.terms = {}
+        self.lengths = {}
+        self.postings = {}
+        self.total_length = 0.0
+        self.version = None
+        self._lock = threading.Lock()
+
+    # ---------- 建立/更新 ----------
+    def _analyze(self, row, cache):
+        """
+        回傳 (各詞的加權詞頻, 加權文件長度)
+        cache: 欄位值 -> 斷詞結果，同一門課在不同學期/班級的課名、摘要通常相同，只需斷詞一次
+        """
+        weights = {}
+        length = 0.0
+        for field, boost in FIELD_BOOSTS.items():
+            value = row.get(field)
+            if not value:
+                continue
+            if value not in cache:
+                tokens = tokenize(value)
+                cache[value] = (Counter(tokens).items(), len(tokens))
+            counts, count = cache[value]
+            length += boost * count
+            for token, n in counts:
+                weights[token] = weights.get(token, 0.0) + boost * n
+        return weights, length
+
+    def _add(self, doc_id, weights, length):
+        for token, weight in weights.items():
+            self.postings.setdefault(token, {})[doc_id] = weight
+        self.terms[doc_id] = weights
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def _remove(self, doc_id):
+        for token in self.terms.pop(doc_id):
+            postings = self.postings[token]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[token]
+        self.total_length -= self.lengths.pop(doc_id)
+        del self.signatures[doc_id]
+
+    def sync(self, rows, version):
+        """
+        與目前的課程資料同步 (新增、變更的課程重新斷詞，刪除的課程移除)
+        回傳 (更新筆數, 移除筆數)
+        """
+        with self._lock:
+            if version == self.version:
+                return 0, 0
+            seen = set()
+            updated = 0
+            cache = {}
+            for row in rows:
+                doc_id = row['id']
+                seen.add(doc_id)
+                signature = tuple(row.get(field) for field in FIELD_BOOSTS)
+                if self.signatures.get(doc_id) == signature:
+                    continue
+                if doc_id in self.signatures:
+                    self._remove(doc_id)
+                self._add(doc_id, *self._analyze(row, cache))
+                self.signatures[doc_id] = signature
+                updated += 1
+
+            removed = [doc_id for doc_id in self.signatures if doc_id not in seen]
+            for doc_id in removed:
+                self._remove(doc_id)
+            self.version = version
+            return updated, len(removed)
+
+    # ---------- 查詢 ----------
+    def search(self, query, accept=None, limit=50):
+        """
+        回傳分數最高的 limit 筆 [(doc_id, score)]
+        accept: 判斷課程是否符合其他篩選條件的函數 (只會對含查詢詞的課程呼叫)
+        """
+        terms = set(tokenize(query, query=True))
+        with self._lock:
+            count = len(self.lengths)
+            if not terms or not count:
+                return []
+            avg_length = self.total_length / count or 1.0
+            scores = {}
+            rejected = set()
+            # 先處理文件數少 (idf 高) 的詞，提早排除不符合篩選條件的課程
+            for term in sorted(terms, key=lambda t: len(self.postings.get(t, ()))):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    if doc_id in rejected:
+                        continue
+                    if doc_id not in scores:
+                        if accept is not None and not accept(doc_id):
+                            rejected.add(doc_id)
+                            continue
+                        scores[doc_id] = 0.0
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        # 同分時以課程 id 排序，結果固定
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))